@@ -9,8 +9,20 @@ MINISHELL = str(PROJECT_ROOT / 'minishell')
 TEST_CSV = str(PACKAGE_DIR / 'cases' / 'test_cases.csv')
 TEST_LOG = str(PACKAGE_DIR / 'logs' / 'test.log')
 TEST_TIMEOUT = 5
+TEST_TIMEOUT_FLOOR = 1.0
+TEST_TIMEOUT_MULTIPLIER = 3.0
+TEST_OUTPUT_WINDOW = 64 * 1024
+TEST_MAX_OUTPUT = 64 * 1024 * 1024
 GENERATED_DIR = str(PACKAGE_DIR / 'generated')
+ORACLE_CACHE_DIR = str(PACKAGE_DIR / '.cache' / 'oracle')
+OUTCOME_STORE = str(PACKAGE_DIR / '.cache' / 'outcomes.sqlite')
+RESULTS_DB = str(PACKAGE_DIR / '.cache' / 'results.sqlite')
+FIXTURES = str(PACKAGE_DIR / 'cases' / 'fixtures.json')
+NORMALIZERS = str(PACKAGE_DIR / 'cases' / 'normalizers.json')
+GRAMMAR = str(PACKAGE_DIR / 'cases' / 'grammar.json')
 
 __all__ = [
-	'MINISHELL', 'TEST_CSV', 'TEST_LOG', 'TEST_TIMEOUT', 'GENERATED_DIR',
+	'MINISHELL', 'TEST_CSV', 'TEST_LOG', 'TEST_TIMEOUT', 'GENERATED_DIR', 'ORACLE_CACHE_DIR',
+	'OUTCOME_STORE', 'TEST_TIMEOUT_FLOOR', 'TEST_TIMEOUT_MULTIPLIER', 'TEST_OUTPUT_WINDOW', 'TEST_MAX_OUTPUT',
+	'RESULTS_DB', 'FIXTURES', 'NORMALIZERS', 'GRAMMAR',
 ]
@@ -2,20 +2,41 @@
 """
 Main entry point for the Minishell Tester.
 
-This script runs the pytest test suite for minishell.
+This script runs the pytest test suite for minishell. ``main.py run ...``
+runs the same cases through the native runner instead, skipping pytest;
+``main.py bench ...`` runs the benchmarks and ``main.py ab ...`` compares the
+speed and memory of two minishell builds.
 """
 
+import importlib
 import sys
 import os
 from pathlib import Path
 import subprocess
 
 
+# Subcommands that run in-process, by the tests/ module implementing them.
+SUBCOMMANDS = {
+    'run': 'native',
+    'bench': 'bench',
+    'ab': 'ab',
+}
+
+
+def run_subcommand(package_dir: Path, name: str, argv):
+    """Run a subcommand in-process, without pytest (see tests/<module>.py)."""
+    sys.path.insert(0, str(package_dir.resolve().parent))
+    module = importlib.import_module(f'minishell_tester.tests.{SUBCOMMANDS[name]}')
+    return module.main(argv)
+
+
 def main():
     """
     Run the minishell test suite using pytest.
     """
     package_dir = Path(__file__).parent
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        sys.exit(run_subcommand(package_dir, sys.argv[1], sys.argv[2:]))
     tests_dir = package_dir / 'tests'
     # Run pytest as subprocess with PYTHONPATH set so imports work
     env = dict(os.environ)
@@ -0,0 +1,358 @@
+"""Streaming reader for the failure log (``logs/test.log``).
+
+The log is a sequence of the reports ``DiffGenerator.report`` writes::
+
+    ========================================
+    FAIL: Command ID 42 [PIPES]
+    INPUT: cat | rev
+    ----------------------------------------
+    Bash Exit: 0 | Minishell Exit: 1
+    ----------------------------------------
+    STDOUT DIFF:
+    <unified diff>
+    ========================================
+    Bash Stderr: ...
+    Mini Stderr: ...
+
+``scan_log`` reads it once, a bounded piece of a line at a time, and yields
+one ``LogRecord`` per report; memory does not grow with the size of the log
+or of a single output. A ``Truncation`` sink sees every piece on the way
+and caps the diff and stderr sections, either rewriting the log in place
+(only from the first cut on) or writing a truncated copy.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+DEFAULT_LOG = Path(__file__).resolve().parent.parent / 'logs' / 'test.log'
+# Lines are read in pieces of at most this many bytes.
+MAX_PIECE = 64 * 1024
+# Characters of a record's INPUT kept on the record.
+INPUT_LIMIT = 4096
+
+SEPARATOR = b'=' * 40
+RULE = b'-' * 40
+_FAIL = re.compile(rb'FAIL: Command ID (\d+) \[(.*)\]\s*$')
+_EXITS = re.compile(rb'Bash Exit: (-?\d+) \| Minishell Exit: (-?\d+)')
+_INPUT = b'INPUT: '
+_DIFF = b'STDOUT DIFF:'
+_BASH_ERR = b'Bash Stderr: '
+_MINI_ERR = b'Mini Stderr: '
+_MARKER = b'... [truncated - '
+
+# Parser states; DIFF and the stderr states are the sections a Truncation caps.
+OUTSIDE, HEADER, INPUT, EXITS, DIFF, AFTER_DIFF, BASH_STDERR, MINI_STDERR = (
+    'outside', 'header', 'input', 'exits', 'diff', 'after diff', 'bash stderr', 'minishell stderr')
+SECTIONS = (DIFF, BASH_STDERR, MINI_STDERR)
+
+
+def classify(command: str) -> str:
+    """Subsystem a failing command most likely exercises, from its first line."""
+    first = command.splitlines()[0] if command else ''
+    if first.startswith('env'):
+        return 'env'
+    if first.startswith('export'):
+        return 'export'
+    if first.startswith('unset'):
+        return 'unset'
+    if first.startswith('echo') or '$' in first:
+        return 'expansion'
+    if any(c in first for c in '*?['):
+        return 'wildcard'
+    if first.startswith('cd'):
+        return 'cd'
+    return 'other'
+
+
+@dataclass
+class LogRecord:
+    """One failure report. ``offset``/``length`` locate it in the log as written."""
+    case_id: int
+    kind: str
+    offset: int
+    length: int = 0
+    input: str = ''
+    bash_exit: Optional[int] = None
+    minishell_exit: Optional[int] = None
+    # Lines the stdout diff adds or removes.
+    diff_lines: int = 0
+    bash_stderr: bool = False
+    minishell_stderr: bool = False
+
+    @property
+    def exit_mismatch(self) -> bool:
+        return self.bash_exit is not None and self.minishell_exit is not None and self.bash_exit != self.minishell_exit
+
+    @property
+    def subsystem(self) -> str:
+        return classify(self.input)
+
+    @property
+    def flags(self) -> List[str]:
+        flags = []
+        if self.diff_lines:
+            flags.append('STDOUT_DIFF')
+        if self.exit_mismatch:
+            flags.append('EXIT_MISMATCH')
+        if self.minishell_stderr:
+            flags.append('STDERR')
+        return flags
+
+
+class Truncation(ABC):
+    """Caps each diff and stderr section at ``max_lines`` lines and ``max_chars`` bytes."""
+
+    def __init__(self, max_lines: Optional[int] = 200, max_chars: Optional[int] = 10000):
+        self.max_lines = max_lines
+        self.max_chars = max_chars
+        self.position = 0
+        self.cuts = 0
+        self._section: Optional[Tuple[int, str]] = None
+        self._lines = self._chars = 0
+        self._cut = False
+
+    def _filter(self, piece: bytes, section: Optional[Tuple[int, str]], line_start: bool) -> bytes:
+        if section != self._section:
+            self._section, self._lines, self._chars, self._cut = section, 0, 0, False
+        if section is None:
+            return piece
+        if self._cut:
+            return b''
+        if line_start:
+            self._lines += 1
+        size = len(piece.rstrip(b'\n'))
+        over_lines = self.max_lines is not None and self._lines > self.max_lines
+        over_chars = self.max_chars is not None and self._chars + size > self.max_chars
+        if not (over_lines or over_chars):
+            self._chars += size
+            return piece
+        self._cut = True
+        if line_start and piece.startswith(_MARKER):
+            # Truncated on an earlier pass: keep the marker as it is.
+            return piece
+        self.cuts += 1
+        if over_lines:
+            return _MARKER + b'exceeded lines limit] ...\n'
+        keep = piece[:self.max_chars - self._chars].decode('utf-8', 'ignore').encode('utf-8')
+        return keep + b'\n' + _MARKER + b'exceeded chars limit] ...\n'
+
+    def feed(self, piece: bytes, section: Optional[Tuple[int, str]], line_start: bool) -> None:
+        out = self._filter(piece, section, line_start)
+        self.position += len(out)
+        self._write(piece, out)
+
+    @abstractmethod
+    def _write(self, piece: bytes, out: bytes) -> None:
+        """Take ``out``, what is left of the log's ``piece`` after the caps."""
+
+    def close(self) -> None:
+        pass
+
+
+class TruncateInPlace(Truncation):
+    """Compacts the log in place: bytes before the first cut are never written."""
+
+    def __init__(self, path: Path, max_lines: Optional[int] = 200, max_chars: Optional[int] = 10000):
+        super().__init__(max_lines, max_chars)
+        self._fd = os.open(path, os.O_WRONLY)
+        self._read = 0
+        self._written = 0
+        self._changed = False
+        # Output that would overwrite bytes not read yet (a marker longer than what it replaced).
+        self._pending = bytearray()
+
+    def _write(self, piece: bytes, out: bytes) -> None:
+        self._read += len(piece)
+        if not self._changed and out is piece:
+            self._written += len(piece)
+            return
+        self._changed = True
+        self._pending += out
+        n = min(len(self._pending), self._read - self._written)
+        if n > 0:
+            os.pwrite(self._fd, self._pending[:n], self._written)
+            del self._pending[:n]
+            self._written += n
+
+    def close(self) -> None:
+        try:
+            if self._changed:
+                # Everything has been read: what is left may go anywhere.
+                os.pwrite(self._fd, self._pending, self._written)
+                os.ftruncate(self._fd, self._written + len(self._pending))
+        finally:
+            os.close(self._fd)
+
+
+class TruncateTo(Truncation):
+    """Writes the truncated log to another file."""
+
+    def __init__(self, dest: Path, max_lines: Optional[int] = 200, max_chars: Optional[int] = 10000):
+        super().__init__(max_lines, max_chars)
+        self._out = open(dest, 'wb')
+
+    def _write(self, piece: bytes, out: bytes) -> None:
+        self._out.write(out)
+
+    def close(self) -> None:
+        self._out.close()
+
+
+def _pieces(f: BinaryIO) -> Iterator[Tuple[int, bytes, bool]]:
+    """``(offset, piece, starts a line)`` for every piece of every line."""
+    offset, line_start = 0, True
+    while True:
+        piece = f.readline(MAX_PIECE)
+        if not piece:
+            return
+        yield offset, piece, line_start
+        offset += len(piece)
+        line_start = piece.endswith(b'\n')
+
+
+def _text(data: bytes) -> str:
+    return data.rstrip(b'\r\n').decode('utf-8', errors='replace')
+
+
+def scan_log(path: Path, truncation: Optional[Truncation] = None) -> Iterator[LogRecord]:
+    """Yield the records of the log at ``path`` in order, feeding every byte to ``truncation``.
+
+    Offsets are positions in the log as ``truncation`` writes it (the
+    input log without one). The sink is closed when the scan completes.
+    """
+    record: Optional[LogRecord] = None
+    state = OUTSIDE
+    # A separator outside a diff either opens the next record or is stderr text.
+    held: Optional[Tuple[int, bytes]] = None
+    end = 0
+
+    def where(offset: int) -> int:
+        return truncation.position if truncation is not None else offset
+
+    def emit(piece: bytes, line_start: bool) -> None:
+        if truncation is not None:
+            section = (record.offset, state) if record is not None and state in SECTIONS else None
+            truncation.feed(piece, section, line_start)
+
+    def body(piece: bytes, line_start: bool) -> None:
+        nonlocal state
+        line = piece.rstrip(b'\r\n') if line_start else None
+        if record is None or line is None:
+            pass
+        elif state == HEADER and line.startswith(_INPUT):
+            record.input = _text(line[len(_INPUT):])[:INPUT_LIMIT]
+            state = INPUT
+        elif state == INPUT:
+            if line == RULE:
+                state = EXITS
+            elif len(record.input) < INPUT_LIMIT:
+                record.input = (record.input + '\n' + _text(line))[:INPUT_LIMIT]
+        elif state == EXITS:
+            m = _EXITS.match(line)
+            if m:
+                record.bash_exit, record.minishell_exit = int(m.group(1)), int(m.group(2))
+            elif line == _DIFF:
+                state = DIFF
+        elif state == DIFF:
+            if line == SEPARATOR:
+                state = AFTER_DIFF
+            elif line[:1] in (b'+', b'-') and not line.startswith((b'+++ ', b'--- ')):
+                record.diff_lines += 1
+        elif state in (AFTER_DIFF, BASH_STDERR, MINI_STDERR):
+            if line.startswith(_BASH_ERR):
+                state = BASH_STDERR
+                emit(piece, line_start)
+                record.bash_stderr = bool(line[len(_BASH_ERR):].strip())
+                return
+            if line.startswith(_MINI_ERR):
+                state = MINI_STDERR
+                emit(piece, line_start)
+                record.minishell_stderr = bool(line[len(_MINI_ERR):].strip())
+                return
+            if line.strip():
+                if state == AFTER_DIFF:
+                    state = BASH_STDERR
+                if state == MINI_STDERR:
+                    record.minishell_stderr = True
+                else:
+                    record.bash_stderr = True
+        emit(piece, line_start)
+
+    with open(path, 'rb') as f:
+        try:
+            for offset, piece, line_start in _pieces(f):
+                end = offset + len(piece)
+                if held is not None:
+                    held_offset, held_piece = held
+                    held = None
+                    m = _FAIL.match(piece) if line_start else None
+                    if m:
+                        start = where(held_offset)
+                        if record is not None:
+                            record.length = start - record.offset
+                            yield record
+                        record = LogRecord(int(m.group(1)), _text(m.group(2)), start)
+                        state = OUTSIDE
+                        emit(held_piece, True)
+                        state = HEADER
+                        emit(piece, True)
+                        continue
+                    body(held_piece, True)
+                if line_start and state != DIFF and piece.rstrip(b'\r\n') == SEPARATOR:
+                    held = (offset, piece)
+                    continue
+                body(piece, line_start)
+            if held is not None:
+                body(held[1], True)
+        finally:
+            if truncation is not None:
+                truncation.close()
+    if record is not None:
+        record.length = where(end) - record.offset
+        yield record
+
+
+def write_index(records: Iterator[LogRecord], index: Path, log: Path) -> Iterator[LogRecord]:
+    """Pass ``records`` through, writing ``case_id offset length`` lines to ``index``.
+
+    The last line stamps the log's size and mtime once the scan is done, so
+    a stale index is detected instead of seeking into the wrong place.
+    """
+    with open(index, 'w', encoding='utf-8') as out:
+        for record in records:
+            out.write(f'{record.case_id}\t{record.offset}\t{record.length}\n')
+            yield record
+        st = os.stat(log)
+        out.write(f'# {st.st_size}\t{st.st_mtime_ns}\n')
+
+
+def lookup(index: Path, log: Path, case_id: int) -> Optional[List[Tuple[int, int]]]:
+    """``(offset, length)`` of ``case_id``'s records, or None when the index does not match the log."""
+    try:
+        st = os.stat(log)
+        found, stamp = [], None
+        with open(index, encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('#'):
+                    stamp = line[1:].split()
+                    continue
+                cid, offset, length = line.split('\t')
+                if int(cid) == case_id:
+                    found.append((int(offset), int(length)))
+    except (OSError, ValueError):
+        return None
+    if stamp != [str(st.st_size), str(st.st_mtime_ns)]:
+        return None
+    return found
+
+
+def read_record(log: Path, offset: int, length: int) -> str:
+    with open(log, 'rb') as f:
+        f.seek(offset)
+        return f.read(length).decode('utf-8', errors='replace')
@@ -3,8 +3,9 @@
 This reduces noise from environment dumps (IDE vars, PATH order, long single-line values)
 before computing diffs or writing to logs.
 """
+import functools
 import re
-from typing import List
+from typing import List, Optional, Tuple
 
 
 DEFAULT_MASK_REGEX = [
@@ -19,6 +20,15 @@ DEFAULT_MASK_REGEX = [
 ]
 
 
+@functools.lru_cache(maxsize=32)
+def _mask_pattern(mask_regex: Tuple[str, ...]) -> 're.Pattern[str]':
+    """One alternation of ``mask_regex``, compiled once per distinct list."""
+    return re.compile('|'.join(f'(?:{r})' for r in mask_regex))
+
+
+_DEFAULT_MASK = _mask_pattern(tuple(DEFAULT_MASK_REGEX))
+
+
 def _is_env_like(text: str) -> bool:
     if not text:
         return False
@@ -30,7 +40,7 @@ def _is_env_like(text: str) -> bool:
 
 
 def canonicalize_env_text(text: str, max_lines: int = 200, max_chars: int = 10000,
-                          mask_regex: List[str] = None, path_keep: int = 5) -> str:
+                          mask_regex: Optional[List[str]] = None, path_keep: int = 5) -> str:
     """Return a canonicalized version of env-like text or a truncated version otherwise.
 
     - If text looks like an environment dump, split into KEY=VAL lines,
@@ -42,16 +52,12 @@ def canonicalize_env_text(text: str, max_lines: int = 200, max_chars: int = 1000
     if text is None:
         return ''
     s = str(text)
-    try:
-        mrs = [re.compile(r) for r in (mask_regex or DEFAULT_MASK_REGEX)]
-    except re.error:
-        mrs = [re.compile(r) for r in DEFAULT_MASK_REGEX]
-
-    def _mask_key(k: str) -> bool:
-        for rx in mrs:
-            if rx.search(k):
-                return True
-        return False
+    mask = _DEFAULT_MASK
+    if mask_regex:
+        try:
+            mask = _mask_pattern(tuple(mask_regex))
+        except re.error:
+            pass
 
     if _is_env_like(s):
         lines = [l for l in s.splitlines() if l.strip()]
@@ -61,7 +67,7 @@ def canonicalize_env_text(text: str, max_lines: int = 200, max_chars: int = 1000
                 continue
             k, v = l.split('=', 1)
             k = k.strip()
-            if _mask_key(k):
+            if mask.search(k):
                 continue
             if k in ('LS_COLORS', 'LSCOLORS'):
                 v = '<LS_COLORS_MASKED>'
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""Merge the outputs of a sharded run (``--shard I/N``) into one report.
+
+Usage: python3 scripts/merge_shards.py --logs LOG... [--out-log FILE]
+       python3 scripts/merge_shards.py --maps MAP... [--out-map FILE] [--cases CSV]
+
+Failure logs (pytest, ``main.py run``) are merged into one log in case id
+order, copying each report's bytes as written; map CSVs
+(``pipeline_run_csv --out``) are merged into one map sorted by id. Prints
+the cases and failures of each shard and of the whole run, and for maps
+the shell time each shard spent, to check the balance. Each shard log
+starts with a ``# shard I/N: ..., plan FP`` line and each sharded map has a
+``plan`` column; the script exits 1 when the fingerprints differ (the
+machines split the cases differently, so some ran twice and others
+nowhere), when a shard's log is missing or given twice, on case ids
+reported by more than one shard, and with ``--cases`` on ids of that case
+file no map has.
+"""
+import argparse
+import csv
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+
+from log_records import scan_log
+
+# Bytes copied at a time from a shard log into the merged one.
+COPY_CHUNK = 1 << 20
+# First line of a shard's failure log (``ShardPlan.header``).
+_HEADER = re.compile(r'# shard (\d+)/(\d+): .*, plan ([0-9a-f]+)$')
+
+
+def _copy(src, dest, offset, length):
+    src.seek(offset)
+    while length > 0:
+        data = src.read(min(length, COPY_CHUNK))
+        if not data:
+            break
+        dest.write(data)
+        length -= len(data)
+
+
+def log_header(log):
+    """``(I, N, fingerprint)`` from the first line of a shard log, or None when it has none."""
+    with open(log, 'rb') as f:
+        m = _HEADER.match(f.readline().decode('utf-8', 'replace').rstrip('\r\n'))
+    return (int(m.group(1)), int(m.group(2)), m.group(3)) if m else None
+
+
+def merge_logs(logs, out):
+    """Print per-shard failure counts; write the merged log to ``out``.
+
+    Returns the duplicated ids and each log's header (see ``log_header``).
+    """
+    spans = []
+    by_kind = Counter()
+    owners = {}
+    duplicated = set()
+    headers = {}
+    for n, log in enumerate(logs):
+        headers[log] = log_header(log)
+        count = 0
+        for record in scan_log(log):
+            count += 1
+            by_kind[record.kind] += 1
+            spans.append((record.case_id, n, record.offset, record.length))
+            if owners.setdefault(record.case_id, n) != n:
+                duplicated.add(record.case_id)
+        print(f'{log}: {count} failed')
+    print('FAILED', len(spans))
+    print('BY_KIND', dict(by_kind))
+    if out is not None:
+        spans.sort()
+        files = [open(log, 'rb') for log in logs]
+        try:
+            with open(out, 'wb') as dest:
+                for _, n, offset, length in spans:
+                    _copy(files[n], dest, offset, length)
+        finally:
+            for f in files:
+                f.close()
+    return duplicated, headers
+
+
+def _shell_time(row, header):
+    total = 0.0
+    for column in ('bash_wall', 'minishell_wall'):
+        if column in header:
+            value = row[header.index(column)]
+            total += float(value) if value else 0.0
+    return total
+
+
+def merge_maps(maps, out, cases):
+    """Print per-shard counts and shell time; write the merged map.
+
+    Returns the duplicated and missing ids and each map's plan fingerprint
+    (None without a ``plan`` column).
+    """
+    header = None
+    rows = {}
+    duplicated = set()
+    loads = []
+    plans = {}
+    for m in maps:
+        with open(m, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            this_header = next(reader, None)
+            if this_header is None:
+                print(f'{m}: empty')
+                continue
+            if header is None:
+                header = this_header
+            elif this_header != header:
+                raise SystemExit(f'{m}: columns differ from {maps[0]}')
+            count = failed = 0
+            load = 0.0
+            seen = set()
+            for row in reader:
+                count += 1
+                if 'plan' in header:
+                    seen.add(row[header.index('plan')])
+                failed += row[header.index('match')] == '0'
+                load += _shell_time(row, header)
+                case_id = int(row[0])
+                if case_id in rows:
+                    duplicated.add(case_id)
+                rows[case_id] = row
+            loads.append(load)
+            plans[m] = ','.join(sorted(seen)) if 'plan' in header else None
+            print(f'{m}: {count} cases, {failed} failed, {load:.1f}s shell time')
+    failed = sum(row[header.index('match')] == '0' for row in rows.values()) if header else 0
+    print(f'TOTAL {len(rows)} cases, {failed} failed')
+    if loads and sum(loads):
+        mean = sum(loads) / len(loads)
+        print(f'BALANCE slowest shard {max(loads):.1f}s, mean {mean:.1f}s ({100 * (max(loads) / mean - 1):.0f}% over)')
+    missing = []
+    if cases is not None:
+        with open(cases, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f, delimiter=';')
+            next(reader, None)
+            missing = sorted(int(row[0]) for row in reader if row and row[0].isdigit() and int(row[0]) not in rows)
+    if out is not None and header is not None:
+        with open(out, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for case_id in sorted(rows):
+                writer.writerow(rows[case_id])
+    return duplicated, missing, plans
+
+
+def _ids(ids, limit=20):
+    ids = sorted(ids)
+    shown = ' '.join(str(i) for i in ids[:limit])
+    return shown + (' ...' if len(ids) > limit else '')
+
+
+def check_plans(plans):
+    """Print the plan of every output unless all have the same one; returns whether they differ."""
+    if len(set(plans.values())) <= 1:
+        return False
+    print('PLANS differ:')
+    for path, plan in plans.items():
+        print(f'  {path}: {plan or "no plan"}')
+    return True
+
+
+def check_shards(headers):
+    """Print shards missing from or repeated in the logs' headers; returns whether there were any."""
+    numbers = Counter((h[0], h[1]) for h in headers.values() if h is not None)
+    counts = {n for _, n in numbers}
+    expected = {(i, n) for n in counts for i in range(1, n + 1)}
+    missing = sorted(expected - set(numbers))
+    repeated = sorted(s for s, c in numbers.items() if c > 1)
+    if missing:
+        print('MISSING SHARDS', ' '.join(f'{i}/{n}' for i, n in missing))
+    if repeated:
+        print('REPEATED SHARDS', ' '.join(f'{i}/{n}' for i, n in repeated))
+    return bool(missing or repeated)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logs', nargs='+', type=Path, default=[], help='failure logs of the shards')
+    parser.add_argument('--out-log', type=Path, help='merged failure log to write')
+    parser.add_argument('--maps', nargs='+', type=Path, default=[], help='map CSVs of the shards')
+    parser.add_argument('--out-map', type=Path, help='merged map CSV to write')
+    parser.add_argument('--cases', type=Path, help='case file the shards split, to report cases no map has')
+    args = parser.parse_args()
+    if not args.logs and not args.maps:
+        parser.error('nothing to merge: give --logs and/or --maps')
+
+    duplicated, missing, plans = set(), [], {}
+    mismatched = False
+    print('SHARDS', max(len(args.logs), len(args.maps)))
+    if args.logs:
+        dup, headers = merge_logs(args.logs, args.out_log)
+        duplicated |= dup
+        plans.update((log, h[2] if h is not None else None) for log, h in headers.items())
+        mismatched |= check_shards(headers)
+    if args.maps:
+        dup, missing, map_plans = merge_maps(args.maps, args.out_map, args.cases)
+        duplicated |= dup
+        plans.update(map_plans)
+    mismatched |= check_plans(plans)
+    if duplicated:
+        print(f'DUPLICATED {len(duplicated)}: {_ids(duplicated)}')
+    if missing:
+        print(f'MISSING {len(missing)}: {_ids(missing)}')
+    return 1 if duplicated or missing or mismatched else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
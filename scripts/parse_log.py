@@ -1,91 +1,96 @@
 #!/usr/bin/env python3
+"""Summarize the failure log in one streaming pass.
+
+Usage: python3 scripts/parse_log.py [log_path] [--limit N] [--index FILE] [--truncate]
+       python3 scripts/parse_log.py [log_path] --show ID [--index FILE]
+
+Prints the number of failures, counts by subsystem and kind, and one line
+per failure (the ``--limit`` lowest case ids). ``--index`` also writes an
+offset index that ``--show`` uses to print a case's report without
+reading the rest of the log; a missing or stale index falls back to a
+scan. ``--truncate`` caps long sections in place during the same pass
+(see truncate_log.py).
+"""
+import argparse
+import heapq
+import os
+import sys
+from collections import Counter
 from pathlib import Path
-p = Path('tests/logs/test.log')
-if not p.exists():
-    print('NO_LOG')
-    raise SystemExit(1)
-text = p.read_text(encoding='utf-8', errors='replace')
-parts = text.split('\n' + '='*80 + '\n')
-summary = []
-for part in parts:
-    lines = part.strip().splitlines()
-    if not lines:
-        continue
-    # find Test #
-    tnum = None
-    for l in lines[:5]:
-        if l.startswith('Test #'):
-            tnum = l.split('#',1)[1].strip()
-            break
-    if not tnum:
-        for l in lines:
-            if l.startswith('Test #'):
-                tnum = l.split('#',1)[1].strip(); break
-    if not tnum:
-        continue
-    # get COMMAND block
-    cmd = ''
+
+from log_records import DEFAULT_LOG, TruncateInPlace, lookup, read_record, scan_log, write_index
+
+
+def _env_int(name, default):
     try:
-        ci = lines.index('COMMAND:')
-        cmd_lines = []
-        for ln in lines[ci+1:ci+10]:
-            if ln.strip().startswith('---'):
-                break
-            cmd_lines.append(ln)
-        cmd = '\n'.join(cmd_lines).strip()
+        return int(os.environ.get(name, str(default)))
     except ValueError:
-        cmd = ''
-    # detect stdout diff
-    has_stdout_diff = ('--- DIFF (stdout) ---' in part) and ('(no stdout diff)' not in part)
-    # detect exit code mismatch
-    be = None; me = None
-    for i,l in enumerate(lines):
-        if l.startswith('--- bash ---'):
-            if i+1 < len(lines) and lines[i+1].startswith('EXIT CODE:'):
-                be = lines[i+1].split(':',1)[1].strip()
-        if l.startswith('--- minishell ---'):
-            if i+1 < len(lines) and lines[i+1].startswith('EXIT CODE:'):
-                me = lines[i+1].split(':',1)[1].strip()
-    exit_mismatch = (be is not None and me is not None and be != me)
-    # detect stderr non-empty for minishell
-    stderr_nonempty = False
-    try:
-        if '--- minishell ---' in lines:
-            idx = lines.index('--- minishell ---')
-            if 'STDERR:' in lines[idx:idx+20]:
-                si = lines.index('STDERR:', idx)
-                se = si+1
-                sblk = []
-                while se < len(lines) and not lines[se].startswith('---') and not lines[se].startswith('='):
-                    sblk.append(lines[se])
-                    se += 1
-                stderr_nonempty = any(l.strip() for l in sblk)
-    except Exception:
-        stderr_nonempty = False
-    # classify subsystem
-    cmd_first = cmd.splitlines()[0] if cmd else ''
-    subsystem = 'other'
-    if cmd_first.startswith('env'):
-        subsystem = 'env'
-    elif cmd_first.startswith('export'):
-        subsystem = 'export'
-    elif cmd_first.startswith('unset'):
-        subsystem = 'unset'
-    elif cmd_first.startswith('echo') or '$' in cmd_first:
-        subsystem = 'expansion'
-    elif any(w in cmd_first for w in ['*','?','[']):
-        subsystem = 'wildcard'
-    elif cmd_first.startswith('cd'):
-        subsystem = 'cd'
-    summary.append((int(tnum), subsystem, has_stdout_diff, exit_mismatch, stderr_nonempty, cmd_first))
-summary.sort()
-print('COUNT', len(summary))
-from collections import Counter
-cnt = Counter(s[1] for s in summary)
-print('BY_SUBSYSTEM', dict(cnt))
-for t,sub,sd,em,se,cf in summary[:200]:
-    flags = []
-    if sd: flags.append('STDOUT_DIFF')
-    if em: flags.append('EXIT_MISMATCH')
-    if se: flags.append('STDERR')
-    print(f'Test#{t}: {sub} {"|".join(flags) if flags else "OK?"} -- cmd: {cf}')
+        return default
+
+
+def show(log, index, case_id):
+    spans = lookup(index, log, case_id) if index else None
+    if spans is None:
+        spans = [(r.offset, r.length) for r in scan_log(log) if r.case_id == case_id]
+    if not spans:
+        print(f'No report for case {case_id}', file=sys.stderr)
+        return 1
+    for offset, length in spans:
+        sys.stdout.write(read_record(log, offset, length))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('log', nargs='?', type=Path, default=DEFAULT_LOG)
+    parser.add_argument('--limit', type=int, default=200, help='failures listed (lowest case ids)')
+    parser.add_argument('--index', type=Path, help='offset index to write (or read with --show)')
+    parser.add_argument('--show', type=int, metavar='ID', help="print case ID's report and exit")
+    parser.add_argument('--truncate', action='store_true',
+                        help='cap long sections in place (TRUNCATE_MAX_LINES / TRUNCATE_MAX_CHARS)')
+    args = parser.parse_args()
+
+    if not args.log.is_file():
+        print('NO_LOG')
+        return 1
+    if args.show is not None:
+        return show(args.log, args.index, args.show)
+
+    truncation = None
+    if args.truncate:
+        truncation = TruncateInPlace(args.log, _env_int('TRUNCATE_MAX_LINES', 200),
+                                     _env_int('TRUNCATE_MAX_CHARS', 10000))
+    records = scan_log(args.log, truncation)
+    if args.index:
+        records = write_index(records, args.index, args.log)
+
+    count = 0
+    by_subsystem, by_kind = Counter(), Counter()
+    # Max-heap (negated ids) of the rows to list, so only --limit rows are held.
+    rows = []
+    for record in records:
+        count += 1
+        subsystem = record.subsystem
+        by_subsystem[subsystem] += 1
+        by_kind[record.kind] += 1
+        if args.limit <= 0:
+            continue
+        row = (-record.case_id, subsystem, '|'.join(record.flags) or 'OK?',
+               record.input.splitlines()[0] if record.input else '')
+        if len(rows) < args.limit:
+            heapq.heappush(rows, row)
+        elif row[0] > rows[0][0]:
+            heapq.heapreplace(rows, row)
+
+    print('COUNT', count)
+    print('BY_SUBSYSTEM', dict(by_subsystem))
+    print('BY_KIND', dict(by_kind))
+    for case_id, subsystem, flags, first in sorted(rows, reverse=True):
+        print(f'Test#{-case_id}: {subsystem} {flags} -- cmd: {first}')
+    if truncation is not None:
+        print(f'TRUNCATED {truncation.cuts} sections')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
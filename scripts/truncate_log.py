@@ -1,62 +1,62 @@
 #!/usr/bin/env python3
 """Truncate long sections in a test log file.
 
-Usage: python3 tests/scripts/truncate_log.py [log_path]
-
-Creates a backup of the original file with a .bak suffix.
+Usage: python3 scripts/truncate_log.py [log_path] [--output FILE] [--backup]
+
+Each STDOUT DIFF, Bash Stderr and Mini Stderr section is capped at
+TRUNCATE_MAX_LINES lines (200) and TRUNCATE_MAX_CHARS bytes (10000). The
+log is read once, in bounded pieces, and compacted in place: nothing
+before the first cut is rewritten, and the file is shortened at the end.
+``--output`` writes the truncated log elsewhere and leaves the original
+alone; ``--backup`` copies the original to ``<log>.bak.<time>`` first.
 """
+import argparse
 import os
-import re
+import shutil
 import sys
 import time
+from pathlib import Path
+
+from log_records import DEFAULT_LOG, TruncateInPlace, TruncateTo, scan_log
 
 
-def truncate_text(text, max_lines=200, max_chars=10000):
-    if text is None:
-        return text
-    s = str(text)
-    if max_chars is not None and len(s) > max_chars:
-        s = s[:max_chars] + '\n... [truncated - exceeded chars limit] ...\n'
-    if max_lines is not None:
-        lines = s.splitlines(True)
-        if len(lines) > max_lines:
-            s = ''.join(lines[:max_lines]) + '\n... [truncated - exceeded lines limit] ...\n'
-    return s
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, str(default)))
+    except ValueError:
+        return default
 
 
 def main():
-    path = sys.argv[1] if len(sys.argv) > 1 else 'tests/logs/test.log'
-    if not os.path.isfile(path):
-        print(f'Log file not found: {path}', file=sys.stderr)
-        sys.exit(2)
-    try:
-        max_lines = int(os.environ.get('TRUNCATE_MAX_LINES', '200'))
-    except Exception:
-        max_lines = 200
-    try:
-        max_chars = int(os.environ.get('TRUNCATE_MAX_CHARS', '10000'))
-    except Exception:
-        max_chars = 10000
-
-    with open(path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    pattern_stdout = re.compile(r'(STDOUT:\n)(.*?)(\nSTDERR:\n)', re.S)
-    content = pattern_stdout.sub(lambda m: m.group(1) + truncate_text(m.group(2), max_lines, max_chars) + m.group(3), content)
-    pattern_stderr = re.compile(r'(STDERR:\n)(.*?)(\n(?:(?:--- )|={80}\n)|$)', re.S)
-    content = pattern_stderr.sub(lambda m: m.group(1) + truncate_text(m.group(2), max_lines, max_chars) + (m.group(3) or ''), content)
-    pattern_diff = re.compile(r'((?:--- DIFF[^\n]*\n))(.*?)(\n={80}\n|$)', re.S)
-    content = pattern_diff.sub(lambda m: m.group(1) + truncate_text(m.group(2), max_lines, max_chars) + (m.group(3) or ''), content)
-    bak = path + f'.bak.{int(time.time())}'
-    try:
-        os.rename(path, bak)
-    except Exception as e:
-        print(f'Failed to create backup: {e}', file=sys.stderr)
-        sys.exit(2)
-    with open(path, 'w', encoding='utf-8') as f:
-        f.write(content)
-    print(f'Log truncated and written to: {path}')
-    print(f'Backup saved as: {bak}')
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('log', nargs='?', type=Path, default=DEFAULT_LOG)
+    parser.add_argument('--output', type=Path, help='write the truncated log here instead')
+    parser.add_argument('--backup', action='store_true', help='copy the original aside before truncating in place')
+    args = parser.parse_args()
+
+    if not args.log.is_file():
+        print(f'Log file not found: {args.log}', file=sys.stderr)
+        return 2
+    max_lines = _env_int('TRUNCATE_MAX_LINES', 200)
+    max_chars = _env_int('TRUNCATE_MAX_CHARS', 10000)
+
+    if args.output:
+        truncation = TruncateTo(args.output, max_lines, max_chars)
+    else:
+        if args.backup:
+            bak = f'{args.log}.bak.{int(time.time())}'
+            try:
+                shutil.copyfile(args.log, bak)
+            except OSError as e:
+                print(f'Failed to create backup: {e}', file=sys.stderr)
+                return 2
+            print(f'Backup saved as: {bak}')
+        truncation = TruncateInPlace(args.log, max_lines, max_chars)
+
+    records = sum(1 for _ in scan_log(args.log, truncation))
+    print(f'{records} reports, {truncation.cuts} sections truncated; written to: {args.output or args.log}')
+    return 0
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
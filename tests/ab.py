@@ -0,0 +1,268 @@
+"""A/B performance gate: a candidate Minishell build against a baseline build.
+
+``main.py ab BASELINE CANDIDATE`` lands here. Both builds run the same
+cases (or, with ``--bench``, the throughput workloads of ``main.py bench``)
+in interleaved rounds: every round shuffles the items and flips a coin for
+which build goes first, so machine drift lands on both sides alike.
+
+Timed runs spawn the shell directly; peak RSS comes from a second run of
+each item through the rusage launcher (``Shell.instrument``, without fork
+tracing), which would otherwise add its own cost to the times. Wall time
+and peak RSS are compared per item and per kind with the Mann-Whitney U
+test (Holm-corrected across items, and across kinds). A
+difference is a regression when it is significant at ``--alpha`` and the
+candidate's median is worse than the baseline's by more than the threshold;
+any regression makes the run exit 1, and a missing build exit 2.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, TextIO, Tuple
+
+from .. import FIXTURES
+from .core import CaseLoader, Command, Minishell, ShellResult
+from .fixtures import FixtureSet
+from .native import DEFAULT_CSV, parse_keyword, select_cases
+from .outcome_store import binary_fingerprint
+from .stats import holm, mann_whitney_u, median
+
+BUILDS = ('baseline', 'candidate')
+# Peak RSS is only compared when both builds have this many sampled values.
+MIN_RSS_SAMPLES = 3
+
+EXIT_OK = 0
+EXIT_REGRESSED = 1
+EXIT_USAGE = 2  # as argparse, for a bad command line
+EXIT_NO_TESTS = 5
+
+
+@dataclass
+class Probe:
+    """One thing to time: a case or a benchmark workload."""
+    name: str
+    kind: str
+    label: str
+    # Runs the probe once in a scratch directory; returns the result and an error ('' when fine).
+    run: Callable[[Minishell, Path], Tuple[ShellResult, str]]
+    times: Dict[str, List[float]] = field(default_factory=lambda: {b: [] for b in BUILDS})
+    rss: Dict[str, List[Optional[int]]] = field(default_factory=lambda: {b: [] for b in BUILDS})
+    error: str = ''
+
+
+@dataclass
+class Comparison:
+    """Candidate against baseline on one metric of one probe or kind."""
+    subject: str
+    metric: str
+    ratio: float
+    p: float
+    threshold: float
+
+    @property
+    def worse(self) -> bool:
+        return self.ratio > 1 + self.threshold
+
+
+def case_probes(cmds: Sequence[Command], fixtures: FixtureSet) -> List[Probe]:
+    def runner(cmd: Command):
+        def run_case(shell: Minishell, work_dir: Path) -> Tuple[ShellResult, str]:
+            fixtures.materialize(cmd, work_dir)
+            return shell.execute(cmd, work_dir), ''
+        return run_case
+    return [Probe(f'cmd{cmd.id}', cmd.kind, cmd.text.replace('\n', '\\n'), runner(cmd)) for cmd in cmds]
+
+
+def bench_probes(args: argparse.Namespace, work_dir: Path) -> List[Probe]:
+    from .bench import INPUT, MB, build_workloads, make_input, run_once
+    size = int(args.size * MB)
+    make_input(work_dir / INPUT, size)
+    workloads = build_workloads(size, stages=10, heredoc_lines=20000, width=200)
+
+    def runner(workload):
+        return lambda shell, _: run_once(shell, workload, work_dir)
+    return [Probe(w.name, 'bench', w.label, runner(w)) for w in workloads.values()]
+
+
+def _run_probe(probe: Probe, shell: Minishell, scratch: Optional[Path]) -> Tuple[ShellResult, str]:
+    work_dir = Path(tempfile.mkdtemp(dir=scratch)) if scratch else None
+    try:
+        return probe.run(shell, work_dir)
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_rounds(probes: List[Probe], shells: Dict[str, Minishell], warmup: int, repeat: int,
+               scratch: Optional[Path], seed: int = 0, sizers: Optional[Dict[str, Minishell]] = None) -> None:
+    """Interleaved rounds; each run of a case gets a fresh directory under ``scratch``.
+
+    ``shells`` are timed; each timed run is followed by one of the
+    instrumented ``sizers``, when given, for its peak RSS.
+    """
+    rng = random.Random(seed)
+    for round_no in range(warmup + repeat):
+        order = list(probes)
+        rng.shuffle(order)
+        for probe in order:
+            builds = list(BUILDS)
+            rng.shuffle(builds)
+            for build in builds:
+                if probe.error:
+                    break
+                res, error = _run_probe(probe, shells[build], scratch)
+                if not error and round_no >= warmup:
+                    probe.times[build].append(res.duration)
+                    if sizers is not None:
+                        res, error = _run_probe(probe, sizers[build], scratch)
+                    probe.rss[build].append(res.max_rss)
+                if error:
+                    probe.error = f'{build}: {error}'
+
+
+def _compare(subject: str, metric: str, base: Sequence[float], cand: Sequence[float],
+             threshold: float) -> Optional[Comparison]:
+    if not base or not cand or median(base) <= 0:
+        return None
+    return Comparison(subject, metric, median(cand) / median(base), mann_whitney_u(base, cand)[1], threshold)
+
+
+def _holm(comparisons: List[Comparison]) -> List[Comparison]:
+    for c, p in zip(comparisons, holm([c.p for c in comparisons])):
+        c.p = p
+    return comparisons
+
+
+def compare_probes(probes: List[Probe], threshold: float, rss_threshold: float) -> List[Comparison]:
+    times, rss = [], []
+    for probe in probes:
+        if probe.error:
+            continue
+        c = _compare(probe.name, 'time', probe.times['baseline'], probe.times['candidate'], threshold)
+        if c:
+            times.append(c)
+        sampled = {b: [v for v in probe.rss[b] if v is not None] for b in BUILDS}
+        if all(len(v) >= MIN_RSS_SAMPLES for v in sampled.values()):
+            c = _compare(probe.name, 'peak RSS', sampled['baseline'], sampled['candidate'], rss_threshold)
+            if c:
+                rss.append(c)
+    return _holm(times) + _holm(rss)
+
+
+def compare_kinds(probes: List[Probe], threshold: float, rss_threshold: float) -> List[Comparison]:
+    """Per kind: the round totals of wall time, and the round medians of measured peak RSS."""
+    by_kind: Dict[str, List[Probe]] = defaultdict(list)
+    for probe in probes:
+        if not probe.error:
+            by_kind[probe.kind].append(probe)
+    times, rss = [], []
+    for kind, members in sorted(by_kind.items()):
+        rounds = min(len(p.times[b]) for p in members for b in BUILDS)
+        totals = {b: [sum(p.times[b][r] for p in members) for r in range(rounds)] for b in BUILDS}
+        c = _compare(kind, 'time', totals['baseline'], totals['candidate'], threshold)
+        if c:
+            times.append(c)
+        peaks = {b: [median(vals) for vals in ([p.rss[b][r] for p in members if p.rss[b][r] is not None]
+                                               for r in range(rounds)) if vals] for b in BUILDS}
+        if all(len(v) >= MIN_RSS_SAMPLES for v in peaks.values()):
+            c = _compare(kind, 'peak RSS', peaks['baseline'], peaks['candidate'], rss_threshold)
+            if c:
+                rss.append(c)
+    return _holm(times) + _holm(rss)
+
+
+def report(out: TextIO, probes: List[Probe], kinds: List[Comparison], items: List[Comparison],
+           alpha: float) -> int:
+    rows: Dict[str, Dict[str, Comparison]] = defaultdict(dict)
+    for c in kinds:
+        rows[c.subject][c.metric] = c
+    out.write(f"\n{'kind':<32} {'time':>7} {'p':>8} {'peak RSS':>9} {'p':>8}\n")
+    for kind, metrics in rows.items():
+        cells = []
+        for metric in ('time', 'peak RSS'):
+            c = metrics.get(metric)
+            cells.append(f'{c.ratio:6.2f}x {c.p:8.3g}' if c else f'{"-":>7} {"-":>8}')
+        out.write(f'{kind:<32} {cells[0]:>16} {cells[1]:>18}\n')
+
+    labels = {p.name: p for p in probes}
+    regressions = [c for c in kinds + items if c.worse and c.p < alpha]
+    failures = [p for p in probes if p.error]
+    if regressions or failures:
+        out.write('\nregressions:\n')
+        for c in regressions:
+            where = (f'{c.subject} [{labels[c.subject].kind}] {labels[c.subject].label[:50]}'
+                     if c.subject in labels else f'kind {c.subject}')
+            out.write(f'  {c.metric} {c.ratio:.2f}x (p={c.p:.3g}, threshold +{c.threshold:.0%})  {where}\n')
+        for p in failures:
+            out.write(f'  failed  {p.name} [{p.kind}] {p.error}\n')
+    improved = sum(1 for c in items if c.ratio < 1 - c.threshold and c.p < alpha)
+    verdict = 'FAIL' if regressions or failures else 'PASS'
+    out.write(f'\n{verdict}: {len(regressions)} regressions, {len(failures)} failures, '
+              f'{improved} significant improvements\n')
+    return EXIT_REGRESSED if regressions or failures else EXIT_OK
+
+
+def run(args: argparse.Namespace, out: TextIO = sys.stdout) -> int:
+    paths = {'baseline': Path(args.baseline), 'candidate': Path(args.candidate)}
+    for build, path in paths.items():
+        if not path.exists():
+            out.write(f'{build} binary not found: {path}\n')
+            return EXIT_USAGE
+    shells = {b: Minishell(p, timeout=args.timeout) for b, p in paths.items()}
+    sizers = None if args.no_rss else {b: Minishell(p, timeout=args.timeout).instrument(forks=False)
+                                       for b, p in paths.items()}
+    for build, path in paths.items():
+        out.write(f'{build:<9} {path} ({binary_fingerprint(path)[:12]})\n')
+    with tempfile.TemporaryDirectory(prefix='minishell-ab-') as tmp:
+        if args.bench:
+            probes, scratch = bench_probes(args, Path(tmp)), None
+        else:
+            loader = CaseLoader(Path(args.csv))
+            cmds = select_cases(loader, os.environ.get('TEST_KIND'), args.keyword)
+            probes, scratch = case_probes(cmds, FixtureSet.load(Path(args.fixtures))), Path(tmp)
+        if not probes:
+            out.write('no cases selected\n')
+            return EXIT_NO_TESTS
+        out.write(f'{len(probes)} {"workloads" if args.bench else "cases"} x {args.repeat} interleaved rounds; '
+                  f'threshold +{args.threshold:.0%} time, +{args.rss_threshold:.0%} peak RSS; '
+                  f'alpha {args.alpha} (Holm)\n')
+        out.flush()
+        run_rounds(probes, shells, args.warmup, args.repeat, scratch, sizers=sizers)
+    kinds = compare_kinds(probes, args.threshold, args.rss_threshold)
+    items = compare_probes(probes, args.threshold, args.rss_threshold)
+    return report(out, probes, kinds, items, args.alpha)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog='main.py ab', description='Compare the speed and memory of two minishell builds.')
+    p.add_argument('baseline', help='minishell binary to compare against')
+    p.add_argument('candidate', help='minishell binary under test')
+    p.add_argument('--csv', default=DEFAULT_CSV, help='case file (default: cases/minishell_tests.csv)')
+    p.add_argument('--fixtures', default=FIXTURES, help='fixture templates by kind (default: cases/fixtures.json)')
+    p.add_argument('-k', dest='keyword', type=parse_keyword, default=None, metavar='EXPR',
+                   help="only the cases named, as 'cmd7 or cmd12' (exact ids)")
+    p.add_argument('--bench', action='store_true', help='compare on the throughput workloads instead of the cases')
+    p.add_argument('--size', type=float, default=16, help='with --bench: input size, in MB')
+    p.add_argument('--warmup', type=int, default=1, help='untimed rounds before measuring')
+    p.add_argument('--repeat', type=int, default=10, help='timed rounds')
+    p.add_argument('--threshold', type=float, default=0.05,
+                   help='allowed slowdown of the median wall time, as a fraction (default: 0.05)')
+    p.add_argument('--rss-threshold', type=float, default=0.10,
+                   help='allowed growth of the median peak RSS, as a fraction (default: 0.10)')
+    p.add_argument('--no-rss', action='store_true',
+                   help='compare wall time only, skipping the instrumented run that measures peak RSS')
+    p.add_argument('--alpha', type=float, default=0.05, help='significance level after Holm correction')
+    p.add_argument('--timeout', type=int, default=5, help='ceiling per run, in seconds')
+    return p
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    return run(build_parser().parse_args(argv))
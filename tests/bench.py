@@ -0,0 +1,285 @@
+"""Throughput benchmarks (pipes, redirections, heredocs, &&/||) and latency microbenchmarks.
+
+``main.py bench`` lands here. Every workload runs in a scratch directory
+holding input generated on the spot, under Bash and Minishell alike (both
+read the script on stdin), after warm-up runs and alternating shells on
+each repeat so drift hits both. Reported per shell: MB/s as a median with
+its bootstrap confidence interval, and wall-time percentiles.
+
+``main.py bench --micro`` times single built-ins, external commands and
+empty input instead, both cold (a fresh process per run) and through a
+persistent ``ShellSession``. Empty input is the baseline of each mode: its
+cold time is start-up, its session time is the session's own marker
+round trip, and the "net" column subtracts it from every other operation.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import string
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, TextIO, Tuple
+
+from .. import MINISHELL
+from .core import Bash, Command, Minishell, Shell, ShellResult
+from .session import ShellSession
+from .stats import DEFAULT_CONFIDENCE, Summary, summarize
+
+MB = 1024 * 1024
+INPUT = 'input.txt'
+OUTPUT = 'out.txt'
+WORKLOADS = ('pipe', 'redirect-in', 'redirect-out', 'append', 'heredoc', 'andor')
+
+# Microbenchmark operations; 'empty' is the baseline and always runs.
+MICRO_OPS = {
+    'empty': '',
+    'echo': 'echo hello',
+    'pwd': 'pwd',
+    'export': 'export MICRO_BENCH=1',
+    'cd': 'cd .',
+    'true': '/bin/true',
+    'ls': 'ls',
+}
+MICRO_MODES = ('cold', 'session')
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+
+
+@dataclass(frozen=True)
+class Workload:
+    """One script and what a correct run of it leaves behind.
+
+    ``size`` is the number of bytes a run moves (0 for latency-only
+    workloads); ``stdout`` is the expected output when there is one, and
+    ``outputs`` are files removed before a run and expected to hold
+    ``size`` bytes after it.
+    """
+    name: str
+    label: str
+    script: str
+    size: int
+    stdout: Optional[str] = None
+    outputs: Tuple[str, ...] = ()
+
+
+@dataclass
+class Measurement:
+    durations: List[float] = field(default_factory=list)
+    error: str = ''
+
+
+def text_lines(rng: random.Random, count: int) -> List[str]:
+    """``count`` printable lines free of quotes, ``$`` and heredoc delimiters."""
+    alphabet = string.ascii_letters + string.digits + ' '
+    return [''.join(rng.choice(alphabet) for _ in range(rng.randint(20, 120))) for _ in range(count)]
+
+
+def make_input(path: Path, size: int, seed: int = 0) -> None:
+    """Write ``size`` bytes of newline-separated text to ``path``."""
+    block = ('\n'.join(text_lines(random.Random(seed), 512)) + '\n').encode()
+    full, rest = divmod(size, len(block))
+    with path.open('wb') as f:
+        for _ in range(full):
+            f.write(block)
+        f.write(block[:rest])
+
+
+def build_workloads(size: int, stages: int, heredoc_lines: int, width: int, seed: int = 0) -> Dict[str, Workload]:
+    mb = f'{size / MB:g}MB'
+    heredoc = text_lines(random.Random(seed), heredoc_lines)
+    heredoc_size = sum(len(line) + 1 for line in heredoc)
+    terms = ['true'] + [('&& true' if i % 2 else '|| false') for i in range(width)]
+    return {w.name: w for w in (
+        Workload('pipe', f'pipe x{stages} {mb}', ' | '.join([f'cat {INPUT}'] + ['cat'] * stages) + ' | wc -c',
+                 size, stdout=str(size)),
+        Workload('redirect-in', f'< {mb}', f'cat < {INPUT} > /dev/null', size),
+        Workload('redirect-out', f'> {mb}', f'cat {INPUT} > {OUTPUT}', size, outputs=(OUTPUT,)),
+        Workload('append', f'>> {mb}', f'cat {INPUT} >> {OUTPUT}', size, outputs=(OUTPUT,)),
+        Workload('heredoc', f'<< {heredoc_lines} lines', '\n'.join([f'cat << EOF > {OUTPUT}'] + heredoc + ['EOF']),
+                 heredoc_size, outputs=(OUTPUT,)),
+        Workload('andor', f'&&/|| x{width}', ' '.join(terms) + ' && echo done', 0, stdout='done'),
+    )}
+
+
+def run_once(shell: Shell, workload: Workload, work_dir: Path) -> Tuple[ShellResult, str]:
+    """One run, and what was wrong with it ('' when nothing)."""
+    for name in workload.outputs:
+        (work_dir / name).unlink(missing_ok=True)
+    res = shell.run_script(workload.script + '\n', work_dir)
+    if res.timed_out:
+        return res, 'timed out'
+    if res.exit_code != 0:
+        return res, f'exit {res.exit_code}: {res.stderr.strip()[:80]}'
+    if workload.stdout is not None and res.stdout.strip() != workload.stdout:
+        return res, f'printed {res.stdout.strip()[:40]!r}, expected {workload.stdout!r}'
+    for name in workload.outputs:
+        path = work_dir / name
+        got = path.stat().st_size if path.exists() else 0
+        if got != workload.size:
+            return res, f'{name} holds {got} bytes, expected {workload.size}'
+    return res, ''
+
+
+def measure(shells: Dict[str, Shell], workload: Workload, work_dir: Path, warmup: int,
+            repeat: int) -> Dict[str, Measurement]:
+    """Warm-up runs, then ``repeat`` timed runs per shell, alternating shells."""
+    results = {name: Measurement() for name in shells}
+    for i in range(warmup + repeat):
+        for name, shell in shells.items():
+            m = results[name]
+            if m.error:
+                continue
+            res, error = run_once(shell, workload, work_dir)
+            if error:
+                m.error = error
+            elif i >= warmup:
+                m.durations.append(res.duration)
+    return results
+
+
+def format_row(label: str, shell: str, workload: Workload, m: Measurement, confidence: float) -> str:
+    if m.error:
+        return f'{label:<20} {shell:<10} FAILED: {m.error}'
+    wall = summarize(m.durations, confidence)
+    if workload.size:
+        rate: Summary = summarize([workload.size / MB / d for d in m.durations], confidence)
+        mbps = f'{rate.median:8.1f} [{rate.ci_low:.1f}, {rate.ci_high:.1f}]'
+    else:
+        mbps = f'{"-":>8}'
+    return (f'{label:<20} {shell:<10} {mbps:<28} {wall.median * 1e3:8.2f} '
+            f'[{wall.ci_low * 1e3:.2f}, {wall.ci_high * 1e3:.2f}] {wall.p90 * 1e3:8.2f} {wall.p99 * 1e3:8.2f}')
+
+
+def micro_cold(shells: Dict[str, Shell], ops: Sequence[str], work_dir: Path, warmup: int,
+               repeat: int) -> Dict[Tuple[str, str], Measurement]:
+    """One fresh process per run; operations and shells interleaved."""
+    results = {(op, name): Measurement() for op in ops for name in shells}
+    for i in range(warmup + repeat):
+        for op in ops:
+            for name, shell in shells.items():
+                m = results[op, name]
+                if m.error:
+                    continue
+                res = shell.execute(Command(0, MICRO_OPS[op]), work_dir)
+                if res.timed_out or res.exit_code != 0:
+                    m.error = 'timed out' if res.timed_out else f'exit {res.exit_code}'
+                elif i >= warmup:
+                    m.durations.append(res.duration)
+    return results
+
+
+def micro_session(shells: Dict[str, Shell], ops: Sequence[str], work_dir: Path, warmup: int,
+                  repeat: int) -> Dict[Tuple[str, str], Measurement]:
+    """Every run of a shell goes through the same long-lived session."""
+    results = {(op, name): Measurement() for op in ops for name in shells}
+    sessions = {name: ShellSession(shell, work_dir) for name, shell in shells.items()}
+    try:
+        for i in range(warmup + repeat):
+            for op in ops:
+                for name, session in sessions.items():
+                    m = results[op, name]
+                    if m.error:
+                        continue
+                    res = session.run(Command(0, MICRO_OPS[op]))
+                    if res is None or res.exit_code != 0:
+                        m.error = 'session died' if res is None else f'exit {res.exit_code}'
+                    elif i >= warmup:
+                        m.durations.append(res.duration)
+    finally:
+        for session in sessions.values():
+            session.close()
+    return results
+
+
+def run_micro(args: argparse.Namespace, shells: Dict[str, Shell], out: TextIO) -> int:
+    ops = ['empty'] + [op for op in (args.op or MICRO_OPS) if op != 'empty']
+    modes = args.mode or list(MICRO_MODES)
+    warmup = 20 if args.warmup is None else args.warmup
+    repeat = 300 if args.repeat is None else args.repeat
+    pct = f'{args.confidence:.0%}'
+    failed = False
+    out.write(f"{'operation':<10} {'mode':<8} {'shell':<10} {f'p50 ms [{pct} CI]':<26}"
+              f"{'p90':>8} {'p99':>8} {'net p50':>9}\n")
+    with tempfile.TemporaryDirectory(prefix='minishell-bench-') as tmp:
+        for mode in modes:
+            runner = micro_cold if mode == 'cold' else micro_session
+            results = runner(shells, ops, Path(tmp), warmup, repeat)
+            for op in ops:
+                for name in shells:
+                    m = results[op, name]
+                    lead = f"{op if name == 'bash' else '':<10} {mode if name == 'bash' else '':<8} {name:<10} "
+                    if m.error:
+                        out.write(f'{lead}FAILED: {m.error}\n')
+                        failed = failed or name == 'minishell'
+                        continue
+                    wall = summarize(m.durations, args.confidence)
+                    base = results['empty', name]
+                    net = (f'{(wall.median - summarize(base.durations).median) * 1e3:9.3f}'
+                           if op != 'empty' and not base.error else f'{"-":>9}')
+                    out.write(f'{lead}{wall.median * 1e3:8.3f} [{wall.ci_low * 1e3:.3f}, {wall.ci_high * 1e3:.3f}]'
+                              f'{"":<3}{wall.p90 * 1e3:8.3f} {wall.p99 * 1e3:8.3f} {net}\n')
+            out.flush()
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def run(args: argparse.Namespace, out: TextIO = sys.stdout) -> int:
+    minishell_path = Path(args.minishell)
+    if not minishell_path.exists():
+        out.write(f'minishell binary not found: {minishell_path}\n')
+        return EXIT_FAILED
+    shells: Dict[str, Shell] = {'bash': Bash(timeout=args.timeout),
+                                'minishell': Minishell(minishell_path, timeout=args.timeout)}
+    if args.micro:
+        return run_micro(args, shells, out)
+    warmup = 1 if args.warmup is None else args.warmup
+    repeat = 10 if args.repeat is None else args.repeat
+    size = int(args.size * MB)
+    workloads = build_workloads(size, args.stages, args.heredoc_lines, args.width)
+    selected = args.workload or list(WORKLOADS)
+    pct = f'{args.confidence:.0%}'
+    failed = False
+    with tempfile.TemporaryDirectory(prefix='minishell-bench-') as tmp:
+        work_dir = Path(tmp)
+        make_input(work_dir / INPUT, size)
+        out.write(f"{'workload':<20} {'shell':<10} {f'MB/s [{pct} CI]':<28} "
+                  f"{f'p50 ms [{pct} CI]':<24}{'p90':>5} {'p99':>8}\n")
+        for name in selected:
+            workload = workloads[name]
+            results = measure(shells, workload, work_dir, warmup, repeat)
+            for shell, m in results.items():
+                out.write(format_row(workload.label if shell == 'bash' else '', shell, workload, m,
+                                     args.confidence) + '\n')
+                failed = failed or (shell == 'minishell' and bool(m.error))
+            out.flush()
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog='main.py bench', description='Benchmark data throughput against bash.')
+    p.add_argument('--minishell', default=MINISHELL)
+    p.add_argument('-w', '--workload', action='append', choices=WORKLOADS,
+                   help='run only this workload (repeatable; default: all)')
+    p.add_argument('--size', type=float, default=16, help='input size for pipes and redirections, in MB')
+    p.add_argument('--stages', type=int, default=10, help='cat stages in the pipe chain')
+    p.add_argument('--heredoc-lines', type=int, default=20000, help='lines in the heredoc')
+    p.add_argument('--width', type=int, default=200, help='operators in the &&/|| chain')
+    p.add_argument('--micro', action='store_true', help='time start-up and single commands instead of throughput')
+    p.add_argument('--op', action='append', choices=list(MICRO_OPS),
+                   help='with --micro: time only this operation (repeatable; default: all)')
+    p.add_argument('--mode', action='append', choices=MICRO_MODES,
+                   help='with --micro: cold processes or one persistent session (default: both)')
+    p.add_argument('--warmup', type=int, default=None,
+                   help='untimed runs per shell before measuring (default: 1, 20 with --micro)')
+    p.add_argument('--repeat', type=int, default=None, help='timed runs per shell (default: 10, 300 with --micro)')
+    p.add_argument('--confidence', type=float, default=DEFAULT_CONFIDENCE, help='confidence level of the intervals')
+    p.add_argument('--timeout', type=int, default=60, help='ceiling per run, in seconds')
+    return p
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    return run(build_parser().parse_args(argv))
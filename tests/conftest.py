@@ -4,7 +4,13 @@ import pytest
 import os
 
 # from minishell_tester import MINISHELL, TEST_CSV, TEST_TIMEOUT, GENERATED_DIR
-from .core import CaseLoader
+from .core import CaptureLimits, CaseLoader, DeadlinePolicy
+from .fixtures import FixtureSet
+from .normalize import NormalizerSet
+from .outcome_store import OutcomeStore
+from .runner import overhead_summary
+from .schedule import load_durations
+from .sharding import durations_file, parse_shard, select_shard
 
 # Resolve package and project locations robustly
 def find_project_root():
@@ -26,15 +32,144 @@ MINISHELL = os.path.join(PROJECT_ROOT, 'minishell')
 TEST_CSV = os.path.join(PACKAGE_DIR, 'cases', 'minishell_tests.csv')
 TEST_LOG = os.path.join(PACKAGE_DIR, 'logs', 'test.log')
 TEST_TIMEOUT = 5
+# Minishell gets TEST_TIMEOUT_MULTIPLIER x the Bash time for a case, at least
+# TEST_TIMEOUT_FLOOR seconds; TEST_TIMEOUT stays the ceiling for both shells.
+TEST_TIMEOUT_FLOOR = 1.0
+TEST_TIMEOUT_MULTIPLIER = 3.0
+# Only the first and last TEST_OUTPUT_WINDOW bytes of a stream are kept for
+# reports; a shell printing more than TEST_MAX_OUTPUT bytes is stopped.
+TEST_OUTPUT_WINDOW = 64 * 1024
+TEST_MAX_OUTPUT = 64 * 1024 * 1024
 GENERATED_DIR = os.path.join(PACKAGE_DIR, 'generated')
+ORACLE_CACHE_DIR = os.path.join(PACKAGE_DIR, '.cache', 'oracle')
+OUTCOME_STORE = os.path.join(PACKAGE_DIR, '.cache', 'outcomes.sqlite')
+FIXTURES = os.path.join(PACKAGE_DIR, 'cases', 'fixtures.json')
+NORMALIZERS = os.path.join(PACKAGE_DIR, 'cases', 'normalizers.json')
+RESULTS_DB = os.path.join(PACKAGE_DIR, '.cache', 'results.sqlite')
+
+# (Command, resource_fields) of every case run this session.
+RESOURCE_ROWS = pytest.StashKey[list]()
+# Schedule of every parallel run this session.
+SCHEDULES = pytest.StashKey[list]()
+# Oracle caches used this session, for their hit counts.
+ORACLE_CACHES = pytest.StashKey[list]()
+# Description of this session's shard, for the collection report.
+SHARD_PLAN = pytest.StashKey[str]()
+# First line of this shard's failure log, carrying the plan fingerprint.
+SHARD_HEADER = pytest.StashKey[str]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('minishell')
+    group.addoption('--jobs', '-J', type=int, default=1,
+                    help='run cases over N parallel workers (0 = one per CPU)')
+    group.addoption('--refresh-oracle', action='store_true', default=False,
+                    help='re-run bash for every case and overwrite its cached result')
+    group.addoption('--no-oracle-cache', action='store_true', default=False,
+                    help='do not read or write the cached bash results')
+    group.addoption('--concurrent', action='store_true', default=False,
+                    help='start bash and minishell for a case at the same time')
+    group.addoption('--session-batch', type=int, default=0, metavar='N',
+                    help='feed up to N independent cases to one shell process')
+    group.addoption('--incremental', action='store_true', default=False,
+                    help='replay recorded verdicts for cases already run against this exact binary')
+    group.addoption('--last-failures', action='store_true', default=False,
+                    help='only run cases that failed on their most recent run')
+    group.addoption('--failures-first', action='store_true', default=False,
+                    help='run cases that failed on their most recent run first')
+    group.addoption('--no-results-db', action='store_true', default=False,
+                    help='do not record this run in the results database')
+    group.addoption('--output-window', type=int, default=TEST_OUTPUT_WINDOW, metavar='BYTES',
+                    help='bytes kept from the start and the end of each output stream for reports')
+    group.addoption('--max-output', type=int, default=TEST_MAX_OUTPUT, metavar='BYTES',
+                    help='stop a shell once one of its output streams exceeds this many bytes')
+    group.addoption('--overhead-top', type=int, default=0, metavar='N',
+                    help='list the N cases where minishell spends the most CPU beyond bash (implies --measure-resources)')
+    group.addoption('--measure-resources', action='store_true', default=False,
+                    help='also record peak RSS and child counts of both shells (slower: every shell runs through '
+                         'a tracing launcher)')
+    group.addoption('--no-longest-first', action='store_true', default=False,
+                    help='run parallel cases in collection order instead of by recorded duration, longest first')
+    group.addoption('--shard', type=parse_shard, default=None, metavar='I/N',
+                    help='only run shard I of N (1-based) of the selected cases')
+    group.addoption('--shard-durations', type=durations_file, default=None, metavar='DB',
+                    help='balance shards on the case durations recorded in this results database '
+                         '(give every machine the same file; default: split by stable hash)')
+
+
+def pytest_configure(config):
+    config.stash[RESOURCE_ROWS] = []
+    config.stash[SCHEDULES] = []
+    config.stash[ORACLE_CACHES] = []
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    for schedule in config.stash.get(SCHEDULES, []):
+        terminalreporter.write_line(schedule.line())
+    for cache in config.stash.get(ORACLE_CACHES, []):
+        terminalreporter.write_line(cache.summary())
+    top = config.getoption('overhead_top')
+    rows = config.stash.get(RESOURCE_ROWS, [])
+    if top <= 0 or not rows:
+        return
+    terminalreporter.write_sep('=', f'top {top} minishell overhead vs bash')
+    for line in overhead_summary(rows, top):
+        terminalreporter.write_line(line)
+
+
+def pytest_collection_modifyitems(config, items):
+    shard = config.getoption('shard')
+    if shard is not None:
+        shard_items(config, items, *shard)
+    only = config.getoption('last_failures')
+    first = config.getoption('failures_first')
+    if not (only or first):
+        return
+    store = OutcomeStore(Path(OUTCOME_STORE))
+    # Only the verdicts already loaded into ``latest`` are needed.
+    store.close()
+
+    def failed(item):
+        callspec = getattr(item, 'callspec', None)
+        return callspec is not None and 'cmd' in callspec.params and store.failed_last(callspec.params['cmd'])
+
+    failing = [item for item in items if failed(item)]
+    if only:
+        deselected = [item for item in items if not failed(item)]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+        items[:] = failing
+    else:
+        items[:] = failing + [item for item in items if not failed(item)]
+
+
+def shard_items(config, items, shard, shards):
+    """Deselect the case items outside ``shard``; other items are left alone."""
+    cases = {}
+    for item in items:
+        callspec = getattr(item, 'callspec', None)
+        if callspec is not None and 'cmd' in callspec.params:
+            cases[item] = callspec.params['cmd']
+    selected, plan = select_shard(list(cases.values()), shard, shards, config.getoption('shard_durations'))
+    config.stash[SHARD_PLAN] = plan.describe(shard)
+    config.stash[SHARD_HEADER] = plan.header(shard)
+    keep = set(selected)
+    deselected = [item for item in items if item in cases and cases[item] not in keep]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = [item for item in items if item not in cases or cases[item] in keep]
+
+
+def pytest_report_collectionfinish(config, start_path, items):
+    return config.stash.get(SHARD_PLAN, None)
 
 
 @pytest.fixture(scope='session', autouse=True)
-def clear_test_log():
-    """Clear the test log at the start of the session."""
+def clear_test_log(pytestconfig):
+    """Clear the test log at the start of the session; a shard's log starts with its plan."""
     os.makedirs(os.path.dirname(TEST_LOG), exist_ok=True)
     with open(TEST_LOG, 'w') as f:
-        f.write("")  # Clear the log
+        f.write(pytestconfig.stash.get(SHARD_HEADER, ''))
 
 
 @pytest.fixture(scope='session')
@@ -74,9 +209,7 @@ def csv_commands():
     kind_filter = os.environ.get('TEST_KIND', None)  # e.g., export TEST_KIND=manual
     # Use the CaseLoader implemented in tests/core.py
     loader = CaseLoader(Path(TEST_CSV))
-    tests = loader.load()
-    if kind_filter:
-        tests = [t for t in tests if t.kind == kind_filter]
+    tests = list(loader.select(kinds=[kind_filter] if kind_filter else None))
     if not tests:
         pytest.skip(f'CSV file not found or empty: {TEST_CSV}')
     return tests
@@ -87,6 +220,58 @@ def timeout():
     return TEST_TIMEOUT
 
 
+@pytest.fixture(scope='session')
+def deadline_policy():
+    return DeadlinePolicy(cap=TEST_TIMEOUT, floor=TEST_TIMEOUT_FLOOR, multiplier=TEST_TIMEOUT_MULTIPLIER)
+
+
+@pytest.fixture(scope='session')
+def resource_rows(request):
+    return request.config.stash[RESOURCE_ROWS]
+
+
+@pytest.fixture(scope='session')
+def schedules(request):
+    return request.config.stash[SCHEDULES]
+
+
+@pytest.fixture(scope='session')
+def oracle_caches(request):
+    return request.config.stash[ORACLE_CACHES]
+
+
+@pytest.fixture(scope='session')
+def measure_resources(request):
+    """Whether shells run through the rusage launcher (``--measure-resources``, ``--overhead-top``)."""
+    return request.config.getoption('measure_resources') or request.config.getoption('overhead_top') > 0
+
+
+@pytest.fixture(scope='session')
+def case_durations(request):
+    """Recorded cost per case key, for longest-first ordering (empty with ``--no-longest-first``)."""
+    if request.config.getoption('no_longest_first'):
+        return {}
+    return load_durations(Path(RESULTS_DB))
+
+
+@pytest.fixture(scope='session')
+def fixture_set():
+    """Directory templates declared in cases/fixtures.json, by case kind."""
+    return FixtureSet.load(Path(FIXTURES))
+
+
+@pytest.fixture(scope='session')
+def normalizer_set():
+    """Output normalizers declared in cases/normalizers.json, by case kind."""
+    return NormalizerSet.load(Path(NORMALIZERS))
+
+
+@pytest.fixture(scope='session')
+def capture_limits(request):
+    return CaptureLimits(window=request.config.getoption('output_window'),
+                         max_bytes=request.config.getoption('max_output'))
+
+
 @pytest.fixture(scope='session')
 def generated_dir_tmp():
     generated = GENERATED_DIR or os.environ.get('GENERATED_DIR')
@@ -1,13 +1,27 @@
 from __future__ import annotations
 
+import asyncio
 import csv
-import difflib
+import hashlib
+import mmap
+import os
+import selectors
 import shutil
+import signal
+import struct
 import subprocess
+import time
 from dataclasses import dataclass
 from pathlib import Path
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import fast_diff
+from .rusage import LaunchReport, launcher
+
+if TYPE_CHECKING:
+    from .normalize import ChainStream, NormalizerSet
+
 
 @dataclass(frozen=True)
 class Command:
@@ -19,17 +33,307 @@ class Command:
 
 @dataclass
 class ShellResult:
-    """Encapsulates the result of a shell execution."""
+    """Encapsulates the result of a shell execution.
+
+    ``stdout`` and ``stderr`` only hold a head and tail window of what the
+    shell printed; ``stdout_digest`` and ``stdout_length`` cover the whole
+    stream and are what results are compared on. ``truncated`` is set when
+    a stream hit the byte cap and the process was stopped.
+
+    ``duration`` is wall time; ``user_time`` and ``sys_time`` come from wait4
+    and include the children the shell waited for. ``max_rss`` (KiB) is the
+    peak of the shell and the children it waited for, and ``children`` the
+    number of processes it and its descendants forked; both are None when
+    they were not measured (see ``rusage``).
+    """
     exit_code: int
     stdout: str
     stderr: str
     timed_out: bool = False
+    duration: float = 0.0
+    stdout_digest: str = ''
+    stdout_length: int = 0
+    truncated: bool = False
+    user_time: float = 0.0
+    sys_time: float = 0.0
+    max_rss: Optional[int] = None
+    children: Optional[int] = None
+
+    def __post_init__(self):
+        if not self.stdout_digest:
+            data = self.stdout.encode('utf-8', 'surrogateescape')
+            self.stdout_digest = hashlib.sha256(data).hexdigest()
+            self.stdout_length = len(data)
 
     def __eq__(self, other):
         if not isinstance(other, ShellResult):
             return NotImplemented
         return (self.exit_code == other.exit_code and
-                self.stdout == other.stdout)
+                self.stdout_length == other.stdout_length and
+                self.stdout_digest == other.stdout_digest)
+
+    @property
+    def cpu_time(self) -> float:
+        return self.user_time + self.sys_time
+
+
+@dataclass(frozen=True)
+class CaptureLimits:
+    """How much of each output stream a run keeps.
+
+    The first and last ``window`` bytes are kept for failure reports; a
+    stream that grows past ``max_bytes`` gets its process group killed.
+    """
+    window: int = 64 * 1024
+    max_bytes: int = 64 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class DeadlinePolicy:
+    """Minishell's time budget for a case, derived from how long Bash took.
+
+    ``multiplier`` times the Bash wall time, never below ``floor`` and never
+    above ``cap`` (the global ``TEST_TIMEOUT``).
+    """
+    cap: float = 5
+    floor: float = 1.0
+    multiplier: float = 3.0
+
+    def for_baseline(self, bash_res: Optional[ShellResult]) -> float:
+        if bash_res is None or bash_res.timed_out:
+            return self.cap
+        return min(self.cap, max(self.floor, bash_res.duration * self.multiplier))
+
+
+class Budget:
+    """A deadline shared with a running async process; it can only be tightened."""
+
+    def __init__(self, seconds: float):
+        self._loop = asyncio.get_running_loop()
+        self.start = self._loop.time()
+        self.expires = self.start + seconds
+        self.changed = asyncio.Event()
+
+    def remaining(self) -> float:
+        return self.expires - self._loop.time()
+
+    def elapsed(self) -> float:
+        return self._loop.time() - self.start
+
+    def tighten(self, seconds: float) -> None:
+        """Make the deadline ``seconds`` after the start, if that is sooner."""
+        expires = self.start + seconds
+        if expires < self.expires:
+            self.expires = expires
+            self.changed.set()
+
+
+# Placeholder written over each shell's private root directory when the two
+# shells run side by side, so ``pwd`` and friends still compare equal.
+ROOT_PLACEHOLDER = '<root>'
+
+
+class StreamCapture:
+    """One output stream, consumed as it arrives.
+
+    Every byte goes through a rolling sha256, but only the first and last
+    ``limits.window`` bytes are stored. Input past ``limits.max_bytes`` is
+    dropped and ``feed`` returns False so the caller can stop the process.
+    With ``rebase``, that path is replaced by ``ROOT_PLACEHOLDER`` before
+    the bytes are hashed, even when it straddles two chunks; a
+    ``normalizer`` (see ``normalize.py``) then filters them line by line.
+    """
+
+    def __init__(self, limits: CaptureLimits, rebase: Optional[Path] = None,
+                 normalizer: Optional['ChainStream'] = None):
+        self.limits = limits
+        self.length = 0
+        self.full = False
+        self._hash = hashlib.sha256()
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._rebase = str(rebase).encode('utf-8', 'surrogateescape') if rebase is not None else None
+        self._pending = b''
+        self._normalizer = normalizer
+
+    def feed(self, chunk: bytes) -> bool:
+        if self._rebase is not None:
+            data = (self._pending + chunk).replace(self._rebase, ROOT_PLACEHOLDER.encode())
+            # Hold back a tail that may be the start of a path split across chunks.
+            keep = len(self._rebase) - 1
+            self._pending = data[-keep:] if keep else b''
+            chunk = data[:len(data) - len(self._pending)]
+        if self._normalizer is not None:
+            chunk = self._normalizer.feed(chunk)
+        self._take(chunk)
+        return not self.full
+
+    def _take(self, data: bytes) -> None:
+        if self.full or not data:
+            return
+        room = self.limits.max_bytes - self.length
+        if len(data) > room:
+            data = data[:room]
+            self.full = True
+        self._hash.update(data)
+        self.length += len(data)
+        window = self.limits.window
+        if len(self._head) < window:
+            n = window - len(self._head)
+            self._head += data[:n]
+            data = data[n:]
+        if data:
+            self._tail += data
+            if len(self._tail) > window:
+                del self._tail[:len(self._tail) - window]
+
+    def close(self) -> None:
+        pending, self._pending = self._pending, b''
+        if self._normalizer is not None:
+            pending = self._normalizer.feed(pending) + self._normalizer.close()
+            self._normalizer = None
+        self._take(pending)
+
+    @property
+    def digest(self) -> str:
+        return self._hash.hexdigest()
+
+    def text(self) -> str:
+        omitted = self.length - len(self._head) - len(self._tail)
+        if not omitted:
+            return _decode(self._head + self._tail)
+        return f"{_decode(self._head)}\n[... {omitted} bytes omitted ...]\n{_decode(self._tail)}"
+
+
+def shell_environment(env: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """``env`` (default: the tester's) without pytest's ``PYTEST_*`` variables, which change from test to test."""
+    return {k: v for k, v in (os.environ if env is None else env).items() if not k.startswith('PYTEST_')}
+
+
+def kill_process_group(pid: int) -> None:
+    """SIGKILL everything in the process group led by ``pid``.
+
+    Shells are started in their own session, so this also reclaims pipeline
+    members and background jobs that would otherwise keep the pipes open.
+    """
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class _ProcessIO:
+    """Pipes, output captures and exit status of one running shell.
+
+    Both ``Shell._run_process`` (with a selector) and its asyncio twin (with
+    loop readers) drive the same handlers. The shell is reaped with wait4 so
+    its rusage, which includes the children it waited for, is kept. When it
+    was started through the ``rusage`` launcher, ``report_fd`` is where the
+    launcher writes the shell's own figures; they are read once it is reaped.
+    """
+
+    # How often to check for the exit where there is no pidfd to wait on.
+    POLL_INTERVAL = 0.005
+
+    def __init__(self, proc: subprocess.Popen, data: bytes, out: StreamCapture, err: StreamCapture,
+                 report_fd: Optional[int] = None):
+        self.proc = proc
+        self.captures = {proc.stdout.fileno(): out, proc.stderr.fileno(): err}
+        for fd in self.captures:
+            os.set_blocking(fd, False)
+        self.pending = memoryview(data)
+        self.stdin_fd: Optional[int] = None
+        if proc.stdin is not None:
+            if self.pending:
+                self.stdin_fd = proc.stdin.fileno()
+                os.set_blocking(self.stdin_fd, False)
+            else:
+                proc.stdin.close()
+        self.pidfd: Optional[int] = None
+        if hasattr(os, 'pidfd_open'):
+            try:
+                self.pidfd = os.pidfd_open(proc.pid)
+            except OSError:
+                pass
+        self.reaped = False
+        self.rusage = None
+        self.report_fd = report_fd
+        self.report: Optional[LaunchReport] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.reaped and not self.captures
+
+    def read(self, fd: int) -> bool:
+        """Consume output waiting on ``fd``; False once the stream is closed."""
+        try:
+            chunk = os.read(fd, 65536)
+        except BlockingIOError:
+            return True
+        if not chunk:
+            del self.captures[fd]
+            return False
+        if not self.captures[fd].feed(chunk):
+            kill_process_group(self.proc.pid)
+        return True
+
+    def write(self) -> bool:
+        """Feed stdin; False once it is all written or the shell stopped reading."""
+        try:
+            self.pending = self.pending[os.write(self.stdin_fd, self.pending[:65536]):]
+        except BlockingIOError:
+            return True
+        except OSError:
+            self.pending = self.pending[:0]
+        return bool(self.pending)
+
+    def close_stdin(self) -> None:
+        self.stdin_fd = None
+        if self.proc.stdin is not None:
+            self.proc.stdin.close()
+
+    def poll(self) -> bool:
+        """Reap the shell if it has exited; True once it has."""
+        if not self.reaped:
+            try:
+                pid, status, rusage = os.wait4(self.proc.pid, os.WNOHANG)
+            except ChildProcessError:
+                pid, status, rusage = self.proc.pid, 0, None
+            if pid:
+                self.reaped = True
+                self.rusage = rusage
+                self.proc.returncode = os.waitstatus_to_exitcode(status)
+                self.read_report()
+        return self.reaped
+
+    def read_report(self) -> None:
+        """Collect the launcher's report; the launcher is gone, so this never blocks."""
+        if self.report_fd is not None:
+            with os.fdopen(self.report_fd, 'rb') as f:
+                self.report = LaunchReport.parse(f.read())
+            self.report_fd = None
+
+    def close_pidfd(self) -> None:
+        if self.pidfd is not None:
+            os.close(self.pidfd)
+            self.pidfd = None
+
+    def stop(self) -> None:
+        """Kill what is left of the process group, reap the shell and close everything."""
+        # Background jobs left behind by the shell must not outlive the case.
+        kill_process_group(self.proc.pid)
+        self.close_stdin()
+        self.close_pidfd()
+        if not self.reaped:
+            try:
+                _, status, self.rusage = os.wait4(self.proc.pid, 0)
+                self.proc.returncode = os.waitstatus_to_exitcode(status)
+            except ChildProcessError:
+                self.proc.returncode = self.proc.returncode if self.proc.returncode is not None else -signal.SIGKILL
+            self.reaped = True
+        self.read_report()
+        self.proc.stdout.close()
+        self.proc.stderr.close()
 
 
 # --- Shell Abstraction ---
@@ -38,45 +342,303 @@ class ShellResult:
 class Shell(ABC):
     """Abstract base class for any shell (Bash, Minishell, etc)."""
 
-    def __init__(self, executable_path: Path, timeout: int = 5):
+    # After a timeout kill, how long to keep reading what is still in the pipes.
+    DRAIN_GRACE = 1.0
+
+    def __init__(self, executable_path: Path, timeout: int = 5, limits: Optional[CaptureLimits] = None,
+                 normalizers: Optional['NormalizerSet'] = None):
         self.path = Path(executable_path)
         self.timeout = timeout
+        self.limits = limits or CaptureLimits()
+        self.normalizers = normalizers
+        # Environment of the piped processes (None: the tester's); see ``environment``.
+        self.env: Optional[Dict[str, str]] = None
+        # Peak RSS through the rusage launcher, and child counts by tracing
+        # forks; see ``instrument``.
+        self.measure_rss = False
+        self.count_forks = False
+
+    def instrument(self, forks: bool = True) -> 'Shell':
+        """Measure peak RSS (and, with ``forks``, child counts) of the piped runs from now on."""
+        self.measure_rss = True
+        self.count_forks = forks
+        return self
+
+    def environment(self) -> Dict[str, str]:
+        """The environment the shell is actually started with."""
+        return shell_environment(self.env)
+
+    def captures(self, cmd: Optional[Command], rebase: Optional[Path] = None) -> Tuple[StreamCapture, StreamCapture]:
+        """Fresh stdout and stderr captures, normalized for ``cmd``'s kind."""
+        if self.normalizers is None or cmd is None:
+            return StreamCapture(self.limits, rebase), StreamCapture(self.limits, rebase)
+        return tuple(StreamCapture(self.limits, rebase, self.normalizers.stream(cmd, stream))
+                     for stream in ('stdout', 'stderr'))
+
+    def result(self, exit_code: int, out: StreamCapture, err: StreamCapture, timed_out: bool,
+               duration: float, io: Optional[_ProcessIO] = None) -> ShellResult:
+        """Turn finished captures (and the reaped process, if any) into a ShellResult."""
+        out.close()
+        err.close()
+        stderr = err.text()
+        truncated = out.full or err.full
+        if timed_out:
+            exit_code = 124
+            stderr += "\nTimeout"
+        elif truncated:
+            stderr += f"\nOutput limit of {self.limits.max_bytes} bytes exceeded"
+        result = ShellResult(exit_code, out.text(), stderr, timed_out=timed_out, duration=duration,
+                             stdout_digest=out.digest, stdout_length=out.length, truncated=truncated)
+        if io is not None:
+            if io.report is not None:
+                result.user_time = io.report.user_time
+                result.sys_time = io.report.sys_time
+                result.max_rss = io.report.max_rss
+                result.children = io.report.forks
+            elif io.rusage is not None:
+                # Without the launcher ru_maxrss starts from the interpreter's
+                # own peak, so only the CPU times mean anything.
+                result.user_time = io.rusage.ru_utime
+                result.sys_time = io.rusage.ru_stime
+        return result
+
+    def _spawn(self, args: List[str], with_stdin: bool, cwd: Optional[Path]) -> Tuple[subprocess.Popen, Optional[int]]:
+        """Start ``args`` in a new session, through the rusage launcher when measuring peak RSS.
 
-    def _run_process(self, args: List[str], input_str: Optional[str] = None) -> ShellResult:
+        Returns the process and the read end of the launcher's report pipe.
+        """
+        report_fd = write_fd = None
+        path = launcher() if self.measure_rss else None
+        if path is not None:
+            report_fd, write_fd = os.pipe()
+            args = [path] + (['-f'] if self.count_forks else []) + [str(write_fd)] + list(args)
         try:
-            proc = subprocess.run(
+            proc = subprocess.Popen(
                 args,
-                input=input_str,
+                stdin=subprocess.PIPE if with_stdin else subprocess.DEVNULL,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
-                timeout=self.timeout,
-                errors='replace'
+                cwd=str(cwd) if cwd is not None else None,
+                env=self.environment(),
+                start_new_session=True,
+                pass_fds=(write_fd,) if write_fd is not None else (),
             )
-            return ShellResult(proc.returncode, proc.stdout, proc.stderr)
-        except subprocess.TimeoutExpired as e:
-            return ShellResult(124, e.stdout or "", (e.stderr or "") + "\nTimeout", timed_out=True)
+        except BaseException:
+            if report_fd is not None:
+                os.close(report_fd)
+            raise
+        finally:
+            if write_fd is not None:
+                os.close(write_fd)
+        return proc, report_fd
+
+    def _pump(self, io: _ProcessIO, deadline: float) -> bool:
+        """Drive ``io`` until the shell is reaped and both streams closed; False on timeout."""
+        timed_out = False
+        with selectors.DefaultSelector() as sel:
+            for fd in io.captures:
+                sel.register(fd, selectors.EVENT_READ, 'read')
+            if io.stdin_fd is not None:
+                sel.register(io.stdin_fd, selectors.EVENT_WRITE, 'write')
+            if io.pidfd is not None:
+                sel.register(io.pidfd, selectors.EVENT_READ, 'exit')
+            while not io.finished:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if timed_out:
+                        break
+                    timed_out = True
+                    kill_process_group(io.proc.pid)
+                    deadline = time.monotonic() + self.DRAIN_GRACE
+                    continue
+                events = sel.select(remaining if io.pidfd is not None else min(remaining, io.POLL_INTERVAL))
+                for key, _ in events:
+                    if key.data == 'read':
+                        if not io.read(key.fd):
+                            sel.unregister(key.fd)
+                    elif key.data == 'write':
+                        if not io.write():
+                            sel.unregister(key.fd)
+                            io.close_stdin()
+                    elif io.poll():
+                        sel.unregister(key.fd)
+                        io.close_pidfd()
+                if io.pidfd is None:
+                    io.poll()
+        return not timed_out
+
+    def _run_process(self, args: List[str], input_str: Optional[str] = None,
+                     cwd: Optional[Path] = None, timeout: Optional[float] = None,
+                     rebase: Optional[Path] = None, cmd: Optional[Command] = None) -> ShellResult:
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        proc, report_fd = self._spawn(args, input_str is not None, cwd)
+        out, err = self.captures(cmd, rebase)
+        data = input_str.encode('utf-8', errors='replace') if input_str is not None else b''
+        io = _ProcessIO(proc, data, out, err, report_fd)
+        try:
+            finished = self._pump(io, start + timeout)
+        finally:
+            io.stop()
+        return self.result(proc.returncode, out, err, not finished, time.monotonic() - start, io)
+
+    async def _run_process_async(self, args: List[str], input_str: Optional[str] = None,
+                                 cwd: Optional[Path] = None, budget: Optional[Budget] = None,
+                                 rebase: Optional[Path] = None, cmd: Optional[Command] = None) -> ShellResult:
+        """Asyncio twin of ``_run_process``: same result, but never blocks the loop.
+
+        ``budget`` may be tightened by the caller while the process runs;
+        ``rebase`` is replaced by ``ROOT_PLACEHOLDER`` in both streams.
+        """
+        if budget is None:
+            budget = Budget(self.timeout)
+        loop = asyncio.get_running_loop()
+        proc, report_fd = self._spawn(args, input_str is not None, cwd)
+        out, err = self.captures(cmd, rebase)
+        data = input_str.encode('utf-8', errors='replace') if input_str is not None else b''
+        io = _ProcessIO(proc, data, out, err, report_fd)
+        done = loop.create_future()
+        readers = set(io.captures)
+        stdin_fd = io.stdin_fd
+
+        def check():
+            if io.finished and not done.done():
+                done.set_result(None)
+
+        def on_read(fd):
+            if not io.read(fd):
+                loop.remove_reader(fd)
+                readers.discard(fd)
+            check()
+
+        def on_write():
+            if not io.write():
+                loop.remove_writer(stdin_fd)
+                io.close_stdin()
+
+        def on_exit():
+            if io.poll():
+                loop.remove_reader(io.pidfd)
+                io.close_pidfd()
+            check()
+
+        def tick():
+            nonlocal ticker
+            io.poll()
+            check()
+            if not done.done():
+                ticker = loop.call_later(io.POLL_INTERVAL, tick)
+
+        for fd in readers:
+            loop.add_reader(fd, on_read, fd)
+        if stdin_fd is not None:
+            loop.add_writer(stdin_fd, on_write)
+        if io.pidfd is not None:
+            loop.add_reader(io.pidfd, on_exit)
+        ticker = None
+        if io.pidfd is None:
+            ticker = loop.call_later(io.POLL_INTERVAL, tick)
+
+        timed_out = False
+        try:
+            while not done.done():
+                remaining = budget.remaining()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+                budget.changed.clear()
+                changed = asyncio.ensure_future(budget.changed.wait())
+                await asyncio.wait({done, changed}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                changed.cancel()
+            if timed_out:
+                kill_process_group(proc.pid)
+                await asyncio.wait({done}, timeout=self.DRAIN_GRACE)
+        finally:
+            if ticker is not None:
+                ticker.cancel()
+            for fd in readers:
+                loop.remove_reader(fd)
+            if io.stdin_fd is not None:
+                loop.remove_writer(io.stdin_fd)
+            if io.pidfd is not None:
+                loop.remove_reader(io.pidfd)
+            io.stop()
+        return self.result(proc.returncode, out, err, timed_out, budget.elapsed(), io)
 
     @abstractmethod
-    def execute(self, cmd: Command, cwd: Path) -> ShellResult:
-        pass
+    def _invocation(self, cmd: Command) -> Tuple[List[str], Optional[str]]:
+        """Return the argv and stdin text used to run ``cmd``."""
+
+    def session_args(self) -> List[str]:
+        """Argv for a long-lived process that reads commands from stdin."""
+        return [str(self.path)]
+
+    def session_line(self, text: str) -> str:
+        """How ``text`` is written into a running session."""
+        return text
+
+    def interactive_args(self) -> List[str]:
+        """Argv for the shell on a terminal, as a user would start it."""
+        return [str(self.path)]
+
+    def execute(self, cmd: Command, cwd: Path, timeout: Optional[float] = None,
+                rebase: Optional[Path] = None) -> ShellResult:
+        """Run ``cmd`` in ``cwd``; ``rebase`` is replaced by ``ROOT_PLACEHOLDER`` in the output."""
+        args, input_str = self._invocation(cmd)
+        return self._run_process(args, input_str=input_str, cwd=cwd, timeout=timeout, rebase=rebase, cmd=cmd)
+
+    def run_script(self, script: str, cwd: Path, timeout: Optional[float] = None) -> ShellResult:
+        """Feed ``script`` on stdin to a shell reading commands from it (no argv size limit)."""
+        return self._run_process(self.session_args(), input_str=script, cwd=cwd, timeout=timeout)
+
+    async def execute_async(self, cmd: Command, cwd: Path, budget: Optional[Budget] = None,
+                            rebase: Optional[Path] = None) -> ShellResult:
+        args, input_str = self._invocation(cmd)
+        return await self._run_process_async(args, input_str=input_str, cwd=cwd, budget=budget, rebase=rebase,
+                                             cmd=cmd)
 
 
 class Bash(Shell):
     """Concrete implementation for Bash execution."""
 
-    def __init__(self, timeout: int = 5):
-        super().__init__(Path('/bin/bash'), timeout)
+    def __init__(self, timeout: int = 5, limits: Optional[CaptureLimits] = None,
+                 normalizers: Optional['NormalizerSet'] = None):
+        super().__init__(Path('/bin/bash'), timeout, limits, normalizers)
+        self._version: Optional[str] = None
+
+    @property
+    def version(self) -> str:
+        """First line of ``bash --version``, queried once per instance."""
+        if self._version is None:
+            try:
+                out = subprocess.run([str(self.path), '--version'], stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL, text=True, timeout=self.timeout).stdout
+                self._version = out.splitlines()[0] if out else 'unknown'
+            except (OSError, subprocess.SubprocessError):
+                self._version = 'unknown'
+        return self._version
 
-    def execute(self, cmd: Command, cwd: Path) -> ShellResult:
-        return self._run_process([str(self.path), '--noprofile', '--norc', '-c', cmd.text], input_str=None)
+    def _invocation(self, cmd: Command) -> Tuple[List[str], Optional[str]]:
+        return [str(self.path), '--noprofile', '--norc', '-c', cmd.text], None
+
+    def session_args(self) -> List[str]:
+        return [str(self.path), '--noprofile', '--norc']
+
+    def interactive_args(self) -> List[str]:
+        return [str(self.path), '--noprofile', '--norc', '-i']
+
+    def session_line(self, text: str) -> str:
+        # A non-interactive bash exits on a syntax error; inside eval it only
+        # sets $? to 2, like -c does for a single line.
+        return "eval '" + text.replace("'", "'\\''") + "'"
 
 
 class Minishell(Shell):
     """Concrete implementation for Minishell execution."""
 
-    def __init__(self, executable_path: Path, timeout: int = 5):
-        super().__init__(Path(executable_path), timeout)
+    def __init__(self, executable_path: Path, timeout: int = 5, limits: Optional[CaptureLimits] = None,
+                 normalizers: Optional['NormalizerSet'] = None):
+        super().__init__(Path(executable_path), timeout, limits, normalizers)
 
     def prepare_binary(self, temp_dir: Path) -> None:
         """Copies and prepares the binary (chmod +x) into temp_dir."""
@@ -105,66 +667,353 @@ class Minishell(Shell):
                     pass
         self.path = dest
 
-    def execute(self, cmd: Command, cwd: Path) -> ShellResult:
-        return self._run_process([str(self.path)], input_str=cmd.text + '\n')
+    def _invocation(self, cmd: Command) -> Tuple[List[str], Optional[str]]:
+        return [str(self.path)], cmd.text + '\n'
+
+
+def _decode(data: bytes) -> str:
+    return bytes(data).decode('utf-8', errors='replace')
+
+
+def pair_workspaces(work_dir: Path) -> Tuple[Path, Path]:
+    """Return the private working directories used by ``execute_pair``."""
+    return Path(work_dir) / 'bash' / 'ws', Path(work_dir) / 'mini' / 'ws'
+
+
+def execute_pair(bash: Shell, minishell: Shell, cmd: Command, work_dir: Path,
+                 bash_result: Optional[ShellResult] = None,
+                 deadlines: Optional[DeadlinePolicy] = None) -> Tuple[ShellResult, ShellResult]:
+    """Run ``cmd`` under both shells at once, each with its own timeout.
+
+    Minishell starts with the full ``deadlines.cap``; as soon as Bash finishes
+    its budget is tightened to what ``deadlines`` allows for that baseline.
+
+    Each shell gets a private root below ``work_dir`` (so even writes to
+    ``..`` stay apart) and works in ``<root>/ws``. The root names have equal
+    length so ``pwd | wc`` agrees, and both roots are replaced by
+    ``ROOT_PLACEHOLDER`` in the captured output. When ``bash_result`` is
+    already known (e.g. from the oracle cache) only Minishell is started.
+    """
+    bash_dir, mini_dir = pair_workspaces(work_dir)
+    bash_dir.mkdir(parents=True, exist_ok=True)
+    mini_dir.mkdir(parents=True, exist_ok=True)
+
+    if deadlines is None:
+        deadlines = DeadlinePolicy(cap=minishell.timeout)
+
+    async def both():
+        if bash_result is not None:
+            budget = Budget(deadlines.for_baseline(bash_result))
+            return bash_result, await minishell.execute_async(cmd, mini_dir, budget, rebase=mini_dir.parent)
+        budget = Budget(deadlines.cap)
+        mini_task = asyncio.ensure_future(minishell.execute_async(cmd, mini_dir, budget, rebase=mini_dir.parent))
+        bash_res = await bash.execute_async(cmd, bash_dir, rebase=bash_dir.parent)
+        budget.tighten(deadlines.for_baseline(bash_res))
+        return bash_res, await mini_task
+
+    return asyncio.run(both())
 
 
 # --- Utilities ---
 
 
+def fixture_fingerprint(directory: Optional[Path]) -> str:
+    """Hash the names, modes and contents of every entry below ``directory``."""
+    h = hashlib.sha256()
+    if directory is None or not Path(directory).is_dir():
+        return h.hexdigest()
+    root = Path(directory)
+    for path in sorted(root.rglob('*')):
+        rel = path.relative_to(root).as_posix()
+        st = path.lstat()
+        h.update(f'{rel}\0{st.st_mode:o}\0'.encode('utf-8', 'surrogateescape'))
+        if path.is_file() and not path.is_symlink():
+            with path.open('rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    h.update(chunk)
+        elif path.is_symlink():
+            h.update(os.readlink(path).encode('utf-8', 'surrogateescape'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def _split_records(data: bytes, quote: int = ord('"'), delimiter: int = ord(';')):
+    """Yield ``(offset, length)`` of every CSV record in ``data``.
+
+    Mirrors the csv module's quoting rules: a field is quoted only when it
+    starts with a quote, and a newline ends the record unless it sits inside
+    a quoted field. Blank lines are records too, exactly as csv.reader
+    reports them.
+    """
+    start = 0
+    pos = 0
+    in_quotes = False
+    field_start = True
+    end = len(data)
+    while pos < end:
+        c = data[pos]
+        if in_quotes:
+            if c == quote:
+                if pos + 1 < end and data[pos + 1] == quote:
+                    pos += 1
+                else:
+                    in_quotes = False
+        elif c == 10:  # \n
+            yield start, pos + 1 - start
+            start = pos + 1
+            field_start = True
+            pos += 1
+            continue
+        elif field_start and c == quote:
+            in_quotes = True
+        field_start = c == delimiter and not in_quotes
+        pos += 1
+    if start < end:
+        yield start, end - start
+
+
+# Compiled case pack layout (little endian):
+#   header   magic, version, csv mtime_ns, csv size, kind count, row count
+#   kinds    per kind: u16 length + utf-8 name (interned once per pack)
+#   rows     per row in file order: id, kind index, text offset, text length
+#   ids      (id, row) pairs sorted by id, for O(log n) lookups
+#   text     normalised command texts, utf-8, back to back
+PACK_MAGIC = b'MSHPACK\0'
+PACK_VERSION = 1
+_PACK_HEADER = struct.Struct('<8sIqqII')
+_PACK_KIND = struct.Struct('<H')
+_PACK_ROW = struct.Struct('<qIII')
+_PACK_ID = struct.Struct('<qI')
+
+
+class CasePack:
+    """Read-only view of a compiled case pack.
+
+    ``buf`` is an mmap of the pack file (or the bytes of a pack that could
+    not be written). Nothing but the header and the kind table is decoded up
+    front; Commands are built from their row on demand.
+    """
+
+    def __init__(self, buf):
+        magic, version, mtime_ns, size, nkinds, nrows = _PACK_HEADER.unpack_from(buf, 0)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise ValueError('not a case pack of the current version')
+        self._buf = buf
+        self.stamp = [mtime_ns, size]
+        pos = _PACK_HEADER.size
+        self.kinds: List[str] = []
+        for _ in range(nkinds):
+            (n,) = _PACK_KIND.unpack_from(buf, pos)
+            pos += _PACK_KIND.size
+            self.kinds.append(bytes(buf[pos:pos + n]).decode('utf-8'))
+            pos += n
+        self._rows_at = pos
+        self._ids_at = pos + nrows * _PACK_ROW.size
+        self._text_at = self._ids_at + nrows * _PACK_ID.size
+        self._nrows = nrows
+
+    @staticmethod
+    def build(commands: Iterable[Command], stamp: List[int]) -> bytes:
+        kinds: dict = {}
+        rows, text = [], bytearray()
+        for cmd in commands:
+            data = cmd.text.encode('utf-8')
+            rows.append((cmd.id, kinds.setdefault(cmd.kind, len(kinds)), len(text), len(data)))
+            text += data
+        out = bytearray(_PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, stamp[0], stamp[1], len(kinds), len(rows)))
+        for kind in kinds:
+            name = kind.encode('utf-8')
+            out += _PACK_KIND.pack(len(name)) + name
+        for row in rows:
+            out += _PACK_ROW.pack(*row)
+        for cid, n in sorted((row[0], n) for n, row in enumerate(rows)):
+            out += _PACK_ID.pack(cid, n)
+        out += text
+        return bytes(out)
+
+    def __len__(self) -> int:
+        return self._nrows
+
+    def _row(self, n: int) -> Tuple[int, int, int, int]:
+        return _PACK_ROW.unpack_from(self._buf, self._rows_at + n * _PACK_ROW.size)
+
+    def command(self, n: int) -> Command:
+        cid, kind, offset, length = self._row(n)
+        start = self._text_at + offset
+        return Command(id=cid, text=bytes(self._buf[start:start + length]).decode('utf-8'), kind=self.kinds[kind])
+
+    def ids(self) -> List[int]:
+        return [self._row(n)[0] for n in range(self._nrows)]
+
+    def rows_for(self, cid: int) -> List[int]:
+        """Row numbers holding id ``cid`` (ids are not guaranteed unique)."""
+        lo, hi = 0, self._nrows
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _PACK_ID.unpack_from(self._buf, self._ids_at + mid * _PACK_ID.size)[0] < cid:
+                lo = mid + 1
+            else:
+                hi = mid
+        rows = []
+        while lo < self._nrows:
+            found, n = _PACK_ID.unpack_from(self._buf, self._ids_at + lo * _PACK_ID.size)
+            if found != cid:
+                break
+            rows.append(n)
+            lo += 1
+        return rows
+
+    def select(self, kinds: Optional[Iterable[str]] = None,
+               ids: Optional[Iterable[int]] = None) -> Iterator[Command]:
+        """Yield the rows matching ``kinds`` and ``ids`` (None = all), in file order."""
+        if ids is not None:
+            rows: Iterable[int] = sorted({n for cid in set(ids) for n in self.rows_for(cid)})
+        else:
+            rows = range(self._nrows)
+        wanted = None
+        if kinds is not None:
+            kinds = set(kinds)
+            wanted = {i for i, kind in enumerate(self.kinds) if kind in kinds}
+        for n in rows:
+            if wanted is not None and self._row(n)[1] not in wanted:
+                continue
+            yield self.command(n)
+
+
 class CaseLoader:
-    """Handles loading and parsing of test definitions from CSV."""
+    """Handles loading and parsing of test definitions from CSV.
+
+    The CSV is compiled once into a binary pack (``<csv>.pack``, keyed on
+    the file's mtime and size, rebuilt whenever the CSV changes) holding the
+    parsed rows: kind and id selections then touch only the rows they need
+    and never re-tokenize the CSV. ``tools/compile_cases.py`` builds packs
+    ahead of time.
+    """
 
     def __init__(self, csv_path: Path):
         self.csv_path = Path(csv_path)
+        self.pack_path = self.csv_path.with_name(self.csv_path.name + '.pack')
+        self._pack: Optional[CasePack] = None
 
-    def load(self) -> List[Command]:
+    def _delimiter(self, first_line: bytes) -> str:
+        return ';' if b';' in first_line else ','
+
+    def _parse(self, record: bytes, delimiter: str, row_no: int) -> Optional[Command]:
+        text = record.decode('utf-8')
+        row = next(csv.reader(text.splitlines(keepends=True), delimiter=delimiter), [])
+        if not row:
+            return None
+        # skip header rows that contain 'test'
+        if row_no == 0 and any('test' in (str(cell).lower()) for cell in row):
+            return None
+        # Accept rows in either of these shapes:
+        # [id, kind, test]  OR  [id, test]
+        if len(row) >= 3:
+            id_str = str(row[0]).strip()
+            kind = str(row[1]).strip() or 'Uncategorized'
+            # Normalize CRLF and strip surrounding whitespace so commands
+            # don't contain stray "\r" characters which break shells
+            test_text = str(row[2]).replace('\r', '').strip()
+        elif len(row) == 2:
+            id_str = str(row[0]).strip()
+            kind = 'generated'
+            test_text = str(row[1]).replace('\r', '').strip()
+        else:
+            return None
+        if not test_text:
+            return None
+        cid = int(id_str) if id_str.isdigit() else row_no
+        return Command(id=cid, text=test_text, kind=kind)
+
+    def _scan(self) -> Iterator[Command]:
+        """Parse every case row of the CSV, streaming it through an mmap."""
+        if self.csv_path.stat().st_size == 0:
+            return
+        with self.csv_path.open('rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            delimiter = self._delimiter(data.readline())
+            for row_no, (offset, length) in enumerate(_split_records(data, delimiter=ord(delimiter))):
+                cmd = self._parse(data[offset:offset + length], delimiter, row_no)
+                if cmd is not None:
+                    yield cmd
+
+    def _stamp(self) -> List[int]:
+        st = self.csv_path.stat()
+        return [st.st_mtime_ns, st.st_size]
+
+    def _open_pack(self) -> Optional[CasePack]:
+        try:
+            with self.pack_path.open('rb') as f:
+                return CasePack(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def compile(self, force: bool = False) -> CasePack:
+        """Return the case pack, (re)building it when missing or stale."""
+        stamp = self._stamp()
+        if not force:
+            if self._pack is not None and self._pack.stamp == stamp:
+                return self._pack
+            pack = self._open_pack()
+            if pack is not None and pack.stamp == stamp:
+                self._pack = pack
+                return pack
+        data = CasePack.build(self._scan(), stamp)
+        try:
+            tmp = self.pack_path.with_name(self.pack_path.name + f'.{os.getpid()}.tmp')
+            tmp.write_bytes(data)
+            os.replace(tmp, self.pack_path)
+            self._pack = self._open_pack()
+        except OSError:
+            self._pack = None
+        if self._pack is None:
+            self._pack = CasePack(data)  # read-only checkout: keep the pack in memory only
+        return self._pack
+
+    def ids(self) -> List[int]:
         if not self.csv_path.exists():
             return []
-        commands: List[Command] = []
-        # Detect delimiter by peeking at the first line
-        with self.csv_path.open(newline='', encoding='utf-8') as f:
-            first = f.readline()
-            if not first:
-                return []
-            delimiter = ';' if ';' in first else ','
-            f.seek(0)
-            reader = csv.reader(f, delimiter=delimiter)
-            for i, row in enumerate(reader):
-                if not row:
-                    continue
-                # skip header rows that contain 'test'
-                if i == 0 and any('test' in (str(cell).lower()) for cell in row):
-                    continue
-                # Accept rows in either of these shapes:
-                # [id, kind, test]  OR  [id, test]
-                if len(row) >= 3:
-                    id_str = str(row[0]).strip()
-                    kind = str(row[1]).strip() or 'Uncategorized'
-                    # Normalize CRLF and strip surrounding whitespace so commands
-                    # don't contain stray "\r" characters which break shells
-                    test_text = str(row[2]).replace('\r', '').strip()
-                elif len(row) == 2:
-                    id_str = str(row[0]).strip()
-                    kind = 'generated'
-                    test_text = str(row[1]).strip()
-                else:
-                    continue
-                if not test_text:
-                    continue
-                cid = int(id_str) if id_str.isdigit() else i
-                commands.append(Command(id=cid, text=test_text, kind=kind))
-        return commands
+        return self.compile().ids()
+
+    def select(self, kinds: Optional[Iterable[str]] = None,
+               ids: Optional[Iterable[int]] = None) -> Iterator[Command]:
+        """Lazily yield the rows matching ``kinds`` and ``ids`` (None = all)."""
+        if not self.csv_path.exists():
+            return iter(())
+        return self.compile().select(kinds, ids)
+
+    def __iter__(self) -> Iterator[Command]:
+        return self.select()
+
+    def __len__(self) -> int:
+        return len(self.compile()) if self.csv_path.exists() else 0
+
+    def load(self) -> List[Command]:
+        return list(self.select())
 
 
 class DiffGenerator:
     """Responsible for formatting failure reports."""
 
+    @staticmethod
+    def report(cmd: Command, bash_res: ShellResult, mini_res: ShellResult) -> str:
+        """Build the failure block written to the test log and shown by pytest."""
+        diff = DiffGenerator.unified_diff(bash_res.stdout, mini_res.stdout)
+        report = [
+            f"\n{'='*40}",
+            f"FAIL: Command ID {cmd.id} [{cmd.kind}]",
+            f"INPUT: {cmd.text}",
+            f"{'-'*40}",
+            f"Bash Exit: {bash_res.exit_code} | Minishell Exit: {mini_res.exit_code}",
+            f"{'-'*40}",
+            "STDOUT DIFF:",
+            diff,
+            f"{'='*40}"
+        ]
+        if bash_res.stderr or mini_res.stderr:
+            report.append(f"Bash Stderr: {bash_res.stderr.strip()}")
+            report.append(f"Mini Stderr: {mini_res.stderr.strip()}")
+        return "\n".join(report)
+
     @staticmethod
     def unified_diff(expected: str, actual: str) -> str:
-        return ''.join(difflib.unified_diff(
-            expected.splitlines(keepends=True),
-            actual.splitlines(keepends=True),
-            fromfile='Bash',
-            tofile='Minishell',
-        ))
+        return fast_diff.unified_diff(expected, actual, fromfile='Bash', tofile='Minishell')
@@ -0,0 +1,249 @@
+"""Unified diffs for failure reports that stay cheap on large outputs.
+
+Small inputs go straight to difflib, so everyday reports are unchanged.
+Larger ones have their common prefix and suffix trimmed, their remaining
+lines interned to integers and diffed with Myers' linear-space algorithm
+under a work budget; when the budget runs out the report falls back to the
+first point of divergence and a short excerpt of each side.
+"""
+
+from __future__ import annotations
+
+import difflib
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+# Up to this many lines (both sides together) difflib is fast enough and its
+# output is what the reports have always shown.
+SMALL_DIFF_LINES = 2000
+# Snake steps the Myers search may take before giving up on a full diff.
+MAX_DIFF_WORK = 500_000
+CONTEXT = 3
+EXCERPT_LINES = 10
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+class _TooExpensive(Exception):
+    pass
+
+
+class _Myers:
+    """Linear-space Myers diff over two integer sequences (Coglan's formulation)."""
+
+    def __init__(self, a: Sequence[int], b: Sequence[int], max_work: int):
+        self.a = a
+        self.b = b
+        self.work = max_work
+
+    def _spend(self, n: int) -> None:
+        self.work -= n
+        if self.work < 0:
+            raise _TooExpensive()
+
+    def _midpoint(self, left: int, top: int, right: int, bottom: int):
+        a, b = self.a, self.b
+        width, height = right - left, bottom - top
+        size = width + height
+        if size == 0:
+            return None
+        delta = width - height
+        limit = (size + 1) // 2
+        vf = [0] * (2 * limit + 3)
+        vb = [0] * (2 * limit + 3)
+        vf[1] = left
+        vb[1] = bottom
+        for d in range(limit + 1):
+            self._spend(d + 1)
+            # Forward pass over diagonals k = x - y (relative to the box).
+            for k in range(d, -d - 1, -2):
+                c = k - delta
+                if k == -d or (k != d and vf[k - 1] < vf[k + 1]):
+                    px = x = vf[k + 1]
+                else:
+                    px = vf[k - 1]
+                    x = px + 1
+                y = top + (x - left) - k
+                py = y if d == 0 or x != px else y - 1
+                while x < right and y < bottom and a[x] == b[y]:
+                    x += 1
+                    y += 1
+                vf[k] = x
+                if delta & 1 and -(d - 1) <= c <= d - 1 and y >= vb[c]:
+                    return (px, py), (x, y)
+            # Backward pass over diagonals c = k - delta.
+            for c in range(d, -d - 1, -2):
+                k = c + delta
+                if c == -d or (c != d and vb[c - 1] > vb[c + 1]):
+                    py = y = vb[c + 1]
+                else:
+                    py = vb[c - 1]
+                    y = py - 1
+                x = left + (y - top) + k
+                px = x if d == 0 or y != py else x + 1
+                while x > left and y > top and a[x - 1] == b[y - 1]:
+                    x -= 1
+                    y -= 1
+                vb[c] = y
+                if not delta & 1 and -d <= k <= d and x <= vf[k]:
+                    return (x, y), (px, py)
+        return None
+
+    def _path(self, left: int, top: int, right: int, bottom: int) -> Optional[List[Tuple[int, int]]]:
+        snake = self._midpoint(left, top, right, bottom)
+        if snake is None:
+            return None
+        start, finish = snake
+        head = self._path(left, top, start[0], start[1])
+        tail = self._path(finish[0], finish[1], right, bottom)
+        return (head or [start]) + (tail or [finish])
+
+    def opcodes(self) -> List[Opcode]:
+        """difflib-style opcodes; runs of deletions and insertions become one 'replace'."""
+        a, b = self.a, self.b
+        path = self._path(0, 0, len(a), len(b)) or [(0, 0)]
+        moves: List[str] = []
+        for (x1, y1), (x2, y2) in zip(path, path[1:]):
+            while x1 < x2 and y1 < y2 and a[x1] == b[y1]:
+                moves.append('=')
+                x1 += 1
+                y1 += 1
+            if x2 - x1 < y2 - y1:
+                moves.append('+')
+                y1 += 1
+            elif x2 - x1 > y2 - y1:
+                moves.append('-')
+                x1 += 1
+            while x1 < x2 and y1 < y2 and a[x1] == b[y1]:
+                moves.append('=')
+                x1 += 1
+                y1 += 1
+        codes: List[Opcode] = []
+        i = j = 0
+        pos = 0
+        while pos < len(moves):
+            if moves[pos] == '=':
+                start = pos
+                while pos < len(moves) and moves[pos] == '=':
+                    pos += 1
+                n = pos - start
+                codes.append(('equal', i, i + n, j, j + n))
+                i += n
+                j += n
+                continue
+            di = dj = 0
+            while pos < len(moves) and moves[pos] != '=':
+                if moves[pos] == '-':
+                    di += 1
+                else:
+                    dj += 1
+                pos += 1
+            tag = 'replace' if di and dj else ('delete' if di else 'insert')
+            codes.append((tag, i, i + di, j, j + dj))
+            i += di
+            j += dj
+        return codes
+
+
+def _grouped(codes: List[Opcode], n: int = CONTEXT) -> Iterator[List[Opcode]]:
+    """Same hunk grouping as ``difflib.SequenceMatcher.get_grouped_opcodes``."""
+    codes = list(codes) or [('equal', 0, 1, 0, 1)]
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+    group: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == 'equal' and i2 - i1 > n + n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+def _range(start: int, stop: int) -> str:
+    beginning, length = start + 1, stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f'{beginning},{length}'
+
+
+def _format(a: List[str], b: List[str], codes: List[Opcode], fromfile: str, tofile: str) -> str:
+    out = []
+    for group in _grouped(codes):
+        if not out:
+            out += [f'--- {fromfile}\n', f'+++ {tofile}\n']
+        first, last = group[0], group[-1]
+        out.append(f'@@ -{_range(first[1], last[2])} +{_range(first[3], last[4])} @@\n')
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                out += [' ' + line for line in a[i1:i2]]
+                continue
+            if tag in ('replace', 'delete'):
+                out += ['-' + line for line in a[i1:i2]]
+            if tag in ('replace', 'insert'):
+                out += ['+' + line for line in b[j1:j2]]
+    return ''.join(out)
+
+
+def first_divergence(a: List[str], b: List[str], fromfile: str, tofile: str, start: int = 0) -> str:
+    """Bounded report: where the outputs first differ, and a few lines of each side from there."""
+    line = start
+    while line < len(a) and line < len(b) and a[line] == b[line]:
+        line += 1
+    offset = sum(len(s.encode('utf-8', 'surrogateescape')) for s in a[:line])
+    if line < len(a) and line < len(b):
+        x, y = a[line], b[line]
+        n = 0
+        while n < len(x) and n < len(y) and x[n] == y[n]:
+            n += 1
+        offset += len(x[:n].encode('utf-8', 'surrogateescape'))
+    out = [f'--- {fromfile}\n', f'+++ {tofile}\n',
+           f'@@ first divergence at byte {offset} (line {line + 1}); '
+           f'{len(a)} vs {len(b)} lines, too different for a full diff @@\n']
+    out += [' ' + s for s in a[max(0, line - CONTEXT):line]]
+    out += ['-' + s for s in a[line:line + EXCERPT_LINES]]
+    out += ['+' + s for s in b[line:line + EXCERPT_LINES]]
+    return ''.join(out)
+
+
+def unified_diff(expected: str, actual: str, fromfile: str = 'a', tofile: str = 'b',
+                 max_work: int = MAX_DIFF_WORK) -> str:
+    """``difflib.unified_diff`` of two texts, joined, with a bounded cost."""
+    a = expected.splitlines(keepends=True)
+    b = actual.splitlines(keepends=True)
+    if len(a) + len(b) <= SMALL_DIFF_LINES:
+        return ''.join(difflib.unified_diff(a, b, fromfile=fromfile, tofile=tofile))
+
+    prefix = 0
+    limit = min(len(a), len(b))
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    if prefix == len(a) == len(b):
+        return ''
+
+    ids: dict = {}
+    xs = [ids.setdefault(line, len(ids)) for line in a[prefix:len(a) - suffix]]
+    ys = [ids.setdefault(line, len(ids)) for line in b[prefix:len(b) - suffix]]
+    try:
+        middle = _Myers(xs, ys, max_work).opcodes()
+    except _TooExpensive:
+        return first_divergence(a, b, fromfile, tofile, prefix)
+
+    codes: List[Opcode] = []
+    if prefix:
+        codes.append(('equal', 0, prefix, 0, prefix))
+    codes += [(tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix) for tag, i1, i2, j1, j2 in middle]
+    if suffix:
+        codes.append(('equal', len(a) - suffix, len(a), len(b) - suffix, len(b)))
+    return _format(a, b, codes, fromfile, tofile)
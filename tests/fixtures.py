@@ -0,0 +1,175 @@
+"""Fixture workspaces: declared directory trees, cloned per case and shell.
+
+Templates are declared in ``cases/fixtures.json`` as relative paths mapped
+to file contents, a trailing ``/`` marking a directory, and attached to
+case kinds::
+
+    {"templates": {"redirections": {"srcs/": null, "Docs/bonjour": "bonjour\\n"}},
+     "kinds": {"REDIRECTIONS": "redirections"}}
+
+A template is written once per run into a snapshot with fixed modes and
+mtimes. Each shell of each case then gets its own copy of the snapshot:
+files are cloned with FICLONE where the filesystem has reflinks (the clone
+shares blocks with the snapshot until one side writes, so it costs a few
+metadata operations) and copied otherwise. Both shells start from
+byte-identical trees and no two cases ever share one.
+"""
+
+from __future__ import annotations
+
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .core import Command, fixture_fingerprint
+
+# ioctl(2) request of FICLONE (linux/fs.h).
+FICLONE = 0x40049409
+# Every entry of a snapshot gets this mtime, so listings sort the same way in every run.
+FIXTURE_MTIME = 1_700_000_000
+_NO_REFLINK = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EPERM)
+
+
+class FixtureTemplate:
+    """A named directory tree: relative path -> file content (None for a directory)."""
+
+    def __init__(self, name: str, entries: Dict[str, Optional[str]]):
+        self.name = name
+        self.entries = dict(entries)
+        for rel in self.entries:
+            parts = Path(rel.rstrip('/')).parts
+            if not parts or Path(rel).is_absolute() or '..' in parts:
+                raise ValueError(f'fixture {name!r}: entry {rel!r} must be a relative path inside the workspace')
+        h = hashlib.sha256()
+        for rel, content in sorted(self.entries.items()):
+            h.update(f'{rel}\0{content}\0'.encode('utf-8', 'surrogateescape'))
+        self.fingerprint = h.hexdigest()
+
+    def build(self, root: Path) -> None:
+        """Write the tree below ``root`` (which must exist)."""
+        for rel, content in sorted(self.entries.items()):
+            path = root / rel.rstrip('/')
+            if rel.endswith('/') or content is None:
+                path.mkdir(parents=True, exist_ok=True)
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content.encode('utf-8', 'surrogateescape'))
+        for path in sorted(root.rglob('*'), reverse=True):
+            os.utime(path, (FIXTURE_MTIME, FIXTURE_MTIME), follow_symlinks=False)
+
+
+class FixtureSet:
+    """The templates of a fixture file, and which kinds of case use them.
+
+    Snapshots are built lazily, one per template, in a private temporary
+    directory removed with the set. ``materialize`` is thread-safe.
+    """
+
+    def __init__(self, templates: Optional[Dict[str, FixtureTemplate]] = None,
+                 kinds: Optional[Dict[str, str]] = None):
+        self.templates = templates or {}
+        self.kinds = kinds or {}
+        for kind, name in self.kinds.items():
+            if name not in self.templates:
+                raise ValueError(f'fixture file: kind {kind!r} uses unknown template {name!r}')
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, Path] = {}
+        # Per template: (relative path, content or None for a directory),
+        # parents first; what the copy fallback writes from.
+        self._manifests: Dict[str, List[Tuple[str, Optional[bytes]]]] = {}
+        self._root: Optional[Path] = None
+        self.reflink = hasattr(fcntl, 'ioctl')
+
+    @classmethod
+    def load(cls, path: Optional[Path]) -> 'FixtureSet':
+        """Read a fixture file; a missing one means no fixtures at all."""
+        if path is None or not Path(path).is_file():
+            return cls()
+        data = json.loads(Path(path).read_text(encoding='utf-8'))
+        templates = {name: FixtureTemplate(name, entries) for name, entries in data.get('templates', {}).items()}
+        return cls(templates, data.get('kinds', {}))
+
+    def template_for(self, cmd: Command) -> Optional[FixtureTemplate]:
+        name = self.kinds.get(cmd.kind)
+        return self.templates[name] if name else None
+
+    def fingerprint(self, cmd: Command) -> str:
+        """What ``cmd`` starts from, for verdict keys: the empty-directory hash without a template."""
+        template = self.template_for(cmd)
+        return template.fingerprint if template else fixture_fingerprint(None)
+
+    def _snapshot(self, template: FixtureTemplate) -> Path:
+        with self._lock:
+            snapshot = self._snapshots.get(template.name)
+            if snapshot is None:
+                if self._root is None:
+                    self._root = Path(tempfile.mkdtemp(prefix='minishell_fixtures_'))
+                    weakref.finalize(self, shutil.rmtree, str(self._root), True)
+                snapshot = self._root / template.name
+                snapshot.mkdir()
+                template.build(snapshot)
+                self._manifests[template.name] = [
+                    (path.relative_to(snapshot).as_posix(), None if path.is_dir() else path.read_bytes())
+                    for path in sorted(snapshot.rglob('*'))]
+                self._snapshots[template.name] = snapshot
+            return snapshot
+
+    def materialize(self, cmd: Command, dest: Path) -> None:
+        """Give ``dest`` (an existing, empty directory) the starting tree of ``cmd``."""
+        template = self.template_for(cmd)
+        if template is None:
+            return
+        snapshot = self._snapshot(template)
+        if self.reflink:
+            self._clone_tree(snapshot, Path(dest))
+        else:
+            self._write_tree(self._manifests[template.name], Path(dest))
+
+    def _clone_file(self, src: Path, dst: Path) -> None:
+        if self.reflink:
+            with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+                try:
+                    fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+                    return
+                except OSError as e:
+                    if e.errno not in _NO_REFLINK:
+                        raise
+                    # Not on this filesystem; stop trying.
+                    self.reflink = False
+        shutil.copyfile(src, dst)
+
+    @staticmethod
+    def _write_tree(manifest: List[Tuple[str, Optional[bytes]]], dst: Path) -> None:
+        for rel, content in manifest:
+            if content is None:
+                os.mkdir(dst / rel)
+            else:
+                fd = os.open(dst / rel, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+                try:
+                    os.write(fd, content)
+                finally:
+                    os.close(fd)
+        for rel, _ in reversed(manifest):
+            os.utime(dst / rel, (FIXTURE_MTIME, FIXTURE_MTIME))
+
+    def _clone_tree(self, src: Path, dst: Path) -> None:
+        for dirpath, dirnames, filenames in os.walk(src):
+            rel = Path(dirpath).relative_to(src)
+            for name in dirnames:
+                (dst / rel / name).mkdir()
+            for name in filenames:
+                self._clone_file(Path(dirpath) / name, dst / rel / name)
+                shutil.copystat(Path(dirpath) / name, dst / rel / name)
+        # Directory mtimes last: filling a directory bumps its mtime.
+        for dirpath, dirnames, _ in os.walk(src):
+            rel = Path(dirpath).relative_to(src)
+            for name in dirnames:
+                shutil.copystat(Path(dirpath) / name, dst / rel / name)
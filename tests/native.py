@@ -0,0 +1,246 @@
+"""Native front end: runs cases straight through the runner, without pytest.
+
+``main.py run`` lands here. It writes the same ``logs/test.log`` and
+returns the same exit codes as the pytest front end (0 all passed,
+1 failures, 2 interrupted, 5 nothing selected), but skips collection, item
+and fixture set-up, so per-case overhead is a dict lookup and a log write.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Set, TextIO
+
+from .. import (FIXTURES, MINISHELL, NORMALIZERS, OUTCOME_STORE, ORACLE_CACHE_DIR, RESULTS_DB, TEST_LOG, TEST_MAX_OUTPUT, TEST_OUTPUT_WINDOW,
+                TEST_TIMEOUT, TEST_TIMEOUT_FLOOR, TEST_TIMEOUT_MULTIPLIER)
+from .core import Bash, CaptureLimits, CaseLoader, Command, DeadlinePolicy, DiffGenerator
+from .fixtures import FixtureSet
+from .normalize import NormalizerSet
+from .oracle_cache import OracleCache
+from .outcome_store import OutcomeStore, binary_fingerprint
+from .results_db import ResultsDB
+from .runner import ParallelRunner, overhead_summary, resource_fields
+from .schedule import load_durations
+from .sharding import durations_file, parse_shard, select_shard
+
+DEFAULT_CSV = str(Path(__file__).resolve().parent.parent / 'cases' / 'minishell_tests.csv')
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_INTERRUPTED = 2
+EXIT_NO_TESTS = 5
+
+
+def parse_keyword(text: str) -> Set[int]:
+    """``-k 'cmd7 or cmd12'`` as the ids it names; each term is one case id, matched exactly.
+
+    Only ``cmdN`` terms joined by ``or`` are understood: the rest of
+    pytest's ``-k`` language (``not``, ``and``, parentheses, substrings) is
+    rejected rather than silently selecting the wrong cases.
+    """
+    ids = set()
+    for term in re.split(r'\s+or\s+', text.strip(), flags=re.IGNORECASE):
+        m = re.fullmatch(r'cmd(\d+)', term, re.IGNORECASE)
+        if m is None:
+            raise argparse.ArgumentTypeError(f"expected 'cmdN or cmdN ...', got {text!r}")
+        ids.add(int(m.group(1)))
+    return ids
+
+
+def select_cases(loader: CaseLoader, kind: Optional[str] = None,
+                 ids: Optional[Set[int]] = None) -> List[Command]:
+    """Cases of ``kind`` (any without one) with one of ``ids`` (any when None)."""
+    return list(loader.select(kinds=[kind] if kind else None, ids=ids))
+
+
+class Reporter:
+    """pytest ``-q`` style progress: one character per case, then a summary."""
+
+    WIDTH = 80
+
+    def __init__(self, out: TextIO = sys.stdout, verbose: bool = False):
+        self.out = out
+        self.verbose = verbose
+        self.passed = 0
+        self.failed: List[Command] = []
+        self._column = 0
+
+    def case(self, cmd: Command, passed: bool, report: str = '') -> None:
+        if passed:
+            self.passed += 1
+        else:
+            self.failed.append(cmd)
+        if self.verbose:
+            self.out.write(f"cmd{cmd.id} {'PASSED' if passed else 'FAILED'}\n")
+            if not passed:
+                self.out.write(report + '\n')
+        else:
+            self.out.write('.' if passed else 'F')
+            self._column += 1
+            if self._column == self.WIDTH:
+                self.out.write('\n')
+                self._column = 0
+        self.out.flush()
+
+    def summary(self, elapsed: float) -> None:
+        if self._column:
+            self.out.write('\n')
+        for cmd in sorted(self.failed, key=lambda c: c.id):
+            self.out.write(f'FAILED cmd{cmd.id}\n')
+        parts = []
+        if self.failed:
+            parts.append(f'{len(self.failed)} failed')
+        if self.passed:
+            parts.append(f'{self.passed} passed')
+        self.out.write(f"{', '.join(parts) or 'no tests ran'} in {elapsed:.2f}s\n")
+
+
+def run(args: argparse.Namespace, out: TextIO = sys.stdout) -> int:
+    started = time.perf_counter()
+    loader = CaseLoader(Path(args.csv))
+    cmds = select_cases(loader, os.environ.get('TEST_KIND'), args.keyword)
+    plan = None
+    if args.shard is not None:
+        cmds, plan = select_shard(cmds, *args.shard, args.shard_durations)
+        out.write(plan.describe(args.shard[0]) + '\n')
+    minishell_path = Path(args.minishell)
+    store = OutcomeStore(Path(OUTCOME_STORE))
+    if args.last_failures:
+        cmds = store.only_failures(cmds)
+    elif args.failures_first:
+        cmds = store.failures_first(cmds)
+    # The runner dispatches longest first; outcomes still come back in case order.
+    durations = {} if args.no_longest_first else load_durations(Path(RESULTS_DB))
+    collected = time.perf_counter()
+    out.write(f'{len(cmds)} cases collected in {collected - started:.2f}s\n')
+
+    log_path = Path(TEST_LOG)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    log_path.write_text(plan.header(args.shard[0]) if plan is not None else '')
+    if args.collect_only or not cmds:
+        store.close()
+        return EXIT_OK if cmds else EXIT_NO_TESTS
+
+    oracle = None if args.no_oracle_cache else OracleCache(Path(ORACLE_CACHE_DIR), refresh=args.refresh_oracle)
+    deadlines = DeadlinePolicy(args.timeout, args.timeout_floor, args.timeout_multiplier)
+    fixtures = FixtureSet.load(Path(args.fixtures))
+    normalizers = NormalizerSet.load(Path(args.normalizers))
+    runner = ParallelRunner(minishell_path, jobs=args.jobs, timeout=args.timeout, oracle=oracle,
+                            concurrent=args.concurrent, session_batch=args.session_batch, deadlines=deadlines,
+                            limits=CaptureLimits(args.output_window, args.max_output), fixtures=fixtures,
+                            normalizers=normalizers, durations=durations,
+                            measure=args.measure_resources or args.overhead_top > 0)
+    binary_hash = binary_fingerprint(minishell_path)
+    reporter = Reporter(out, verbose=args.verbose)
+    resources = []
+    results = None
+    if not args.no_results_db:
+        results = ResultsDB(Path(RESULTS_DB))
+        results.begin_run('native', binary_hash, Bash().version, sys.argv[1:])
+    keys = {cmd: OutcomeStore.key(binary_hash, cmd, fixtures.fingerprint(cmd), normalizers.fingerprint(cmd))
+            for cmd in cmds}
+    replayed = {}
+    if args.incremental:
+        for cmd in cmds:
+            rec = store.get(keys[cmd])
+            if rec is not None:
+                replayed[cmd] = rec
+    # One run over every case; outcomes come back in case order as soon as
+    # they are done, so the log and the progress line advance meanwhile.
+    outcomes = runner.iter_run([c for c in cmds if c not in replayed])
+    try:
+        with log_path.open('a') as log:
+            for cmd in cmds:
+                if cmd in replayed:
+                    rec = replayed[cmd]
+                    passed, report = rec['passed'], rec['report']
+                    if results is not None:
+                        results.record(cmd, passed, bash_exit=rec['bash_exit'],
+                                       minishell_exit=rec['minishell_exit'])
+                else:
+                    outcome = next(outcomes)
+                    passed = outcome.passed
+                    report = '' if passed else DiffGenerator.report(cmd, outcome.bash, outcome.minishell)
+                    store.record(keys[cmd], cmd, passed, report, outcome.bash.exit_code,
+                                 outcome.minishell.exit_code, binary_hash)
+                    if results is not None:
+                        results.record(cmd, passed, outcome.bash, outcome.minishell)
+                    resources.append((cmd, resource_fields(outcome.bash, outcome.minishell)))
+                if not passed:
+                    log.write(report + '\n')
+                    log.flush()
+                reporter.case(cmd, passed, report)
+        # Exhausting the run is what records its schedule.
+        next(outcomes, None)
+    except KeyboardInterrupt:
+        outcomes.close()
+        reporter.summary(time.perf_counter() - started)
+        return EXIT_INTERRUPTED
+    finally:
+        store.save()
+        store.close()
+        if results is not None:
+            results.close()
+    reporter.summary(time.perf_counter() - started)
+    if runner.schedule is not None:
+        out.write(runner.schedule.line() + '\n')
+    if oracle is not None:
+        out.write(oracle.summary() + '\n')
+    if args.overhead_top > 0 and resources:
+        out.write(f'top {args.overhead_top} minishell overhead vs bash:\n')
+        for line in overhead_summary(resources, args.overhead_top):
+            out.write(line + '\n')
+    return EXIT_FAILED if reporter.failed else EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog='main.py run', description='Run the cases without pytest.')
+    p.add_argument('--csv', default=DEFAULT_CSV, help='case file (default: cases/minishell_tests.csv)')
+    p.add_argument('--minishell', default=MINISHELL)
+    p.add_argument('--fixtures', default=FIXTURES, help='fixture templates by kind (default: cases/fixtures.json)')
+    p.add_argument('--normalizers', default=NORMALIZERS,
+                   help='output normalizers by kind (default: cases/normalizers.json)')
+    p.add_argument('-k', dest='keyword', type=parse_keyword, default=None, metavar='EXPR',
+                   help="only the cases named, as 'cmd7 or cmd12' (exact ids)")
+    p.add_argument('-v', '--verbose', action='store_true', help='one line per case, failure reports inline')
+    p.add_argument('--collect-only', action='store_true', help='only report how many cases would run')
+    p.add_argument('--timeout', type=int, default=TEST_TIMEOUT, help='hard ceiling per shell and case, in seconds')
+    p.add_argument('--timeout-floor', type=float, default=TEST_TIMEOUT_FLOOR,
+                   help='minimum minishell deadline, in seconds')
+    p.add_argument('--timeout-multiplier', type=float, default=TEST_TIMEOUT_MULTIPLIER,
+                   help='minishell deadline as a multiple of the bash time')
+    p.add_argument('--output-window', type=int, default=TEST_OUTPUT_WINDOW,
+                   help='bytes kept from the start and the end of each output stream for reports')
+    p.add_argument('--max-output', type=int, default=TEST_MAX_OUTPUT,
+                   help='stop a shell once one of its output streams exceeds this many bytes')
+    p.add_argument('--overhead-top', type=int, default=0, metavar='N',
+                   help='list the N cases where minishell spends the most CPU beyond bash (implies --measure-resources)')
+    p.add_argument('--measure-resources', action='store_true',
+                   help='also record peak RSS and child counts of both shells (slower: every shell runs through '
+                        'a tracing launcher)')
+    p.add_argument('--jobs', '-J', type=int, default=1, help='parallel workers (0 = one per CPU)')
+    p.add_argument('--refresh-oracle', action='store_true', help='re-run bash and overwrite cached results')
+    p.add_argument('--no-oracle-cache', action='store_true', help='always run bash, bypassing the cache')
+    p.add_argument('--concurrent', action='store_true', help='run bash and minishell for a case at the same time')
+    p.add_argument('--session-batch', type=int, default=0, help='feed up to N independent cases to one shell process')
+    p.add_argument('--incremental', action='store_true', help='replay verdicts recorded against this exact binary')
+    p.add_argument('--no-results-db', action='store_true', help='do not record this run in the results database')
+    p.add_argument('--last-failures', action='store_true', help='only run cases that failed on their last run')
+    p.add_argument('--failures-first', action='store_true', help='run cases that failed on their last run first')
+    p.add_argument('--no-longest-first', action='store_true',
+                   help='run cases in file order instead of by recorded duration, longest first')
+    p.add_argument('--shard', type=parse_shard, default=None, metavar='I/N',
+                   help='only run shard I of N (1-based) of the selected cases')
+    p.add_argument('--shard-durations', type=durations_file, default=None, metavar='DB',
+                   help='balance shards on the case durations recorded in this results database '
+                        '(give every machine the same file; default: split by stable hash)')
+    return p
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return run(build_parser().parse_args(argv))
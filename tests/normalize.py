@@ -0,0 +1,189 @@
+"""Output normalizers: line filters applied while a stream is captured.
+
+Chains are declared in ``cases/normalizers.json`` per stream and attached
+to case kinds (``"*"`` applies to every kind without a chain of its own)::
+
+    {"chains": {"env": {"stdout": [{"drop": "^_="}, {"sort": "^[A-Za-z_]\\\\w*="}]}},
+     "kinds": {"ENV": "env"}}
+
+Each step names a registered normalizer and its arguments; patterns are
+compiled once, when the file is loaded. ``StreamCapture`` pushes every
+chunk through the chain before hashing it, so the comparison, the stored
+windows and the failure diffs all see normalized output. The pass is
+streaming: lines go through as soon as they are complete, except runs of
+lines a ``sort`` step is reordering.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .core import Command
+
+STREAMS = ('stdout', 'stderr')
+# A sort step flushes a run once it holds this many lines, so memory stays bounded.
+MAX_SORT_LINES = 100_000
+
+NORMALIZERS: Dict[str, Callable[..., 'Normalizer']] = {}
+
+
+def register(name: str):
+    """Class decorator: make a normalizer available to chains as ``{name: ...}``."""
+    def wrap(cls):
+        NORMALIZERS[name] = cls
+        return cls
+    return wrap
+
+
+class Normalizer:
+    """One stage. ``push`` gets one line (with its newline, if any) and returns the lines to pass on."""
+
+    def push(self, line: bytes) -> List[bytes]:
+        return [line]
+
+    def flush(self) -> List[bytes]:
+        return []
+
+    def fresh(self) -> 'Normalizer':
+        """A copy with no per-stream state; stateless stages return themselves."""
+        return self
+
+
+def _pattern(regex: str) -> 're.Pattern[bytes]':
+    return re.compile(regex.encode('utf-8', 'surrogateescape'))
+
+
+@register('drop')
+class Drop(Normalizer):
+    """Remove lines matching the pattern (e.g. ``^SHLVL=``)."""
+
+    def __init__(self, pattern: str):
+        self.pattern = _pattern(pattern)
+
+    def push(self, line: bytes) -> List[bytes]:
+        return [] if self.pattern.search(line) else [line]
+
+
+@register('replace')
+class Replace(Normalizer):
+    """``re.sub`` on every line (e.g. ``^bash: `` to ``minishell: ``)."""
+
+    def __init__(self, pattern: str, with_: str = ''):
+        self.pattern = _pattern(pattern)
+        self.repl = with_.encode('utf-8', 'surrogateescape')
+
+    def push(self, line: bytes) -> List[bytes]:
+        return [self.pattern.sub(self.repl, line)]
+
+
+@register('sort')
+class SortRuns(Normalizer):
+    """Sort each run of consecutive lines matching the pattern (e.g. ``NAME=value`` lines)."""
+
+    def __init__(self, pattern: str):
+        self.pattern = _pattern(pattern)
+        self.run: List[bytes] = []
+
+    def fresh(self) -> 'SortRuns':
+        clone = SortRuns.__new__(SortRuns)
+        clone.pattern, clone.run = self.pattern, []
+        return clone
+
+    def push(self, line: bytes) -> List[bytes]:
+        if self.pattern.search(line):
+            self.run.append(line)
+            return self.flush() if len(self.run) >= MAX_SORT_LINES else []
+        return self.flush() + [line]
+
+    def flush(self) -> List[bytes]:
+        run, self.run = self.run, []
+        if run and not run[-1].endswith(b'\n'):
+            # Only the last line of a stream can be unterminated; keep it that way after sorting.
+            run = sorted(line.rstrip(b'\n') for line in run)
+            return [line + b'\n' for line in run[:-1]] + run[-1:]
+        return sorted(run)
+
+
+class Chain:
+    """Compiled stages for one stream; ``start`` hands out per-stream state."""
+
+    def __init__(self, steps: Sequence[dict]):
+        self.stages: List[Normalizer] = []
+        for step in steps:
+            names = [k for k in step if k in NORMALIZERS]
+            if len(names) != 1:
+                raise ValueError(f'normalizer step {step!r} must name exactly one of {sorted(NORMALIZERS)}')
+            kwargs = {('with_' if k == 'with' else k): v for k, v in step.items() if k != names[0]}
+            self.stages.append(NORMALIZERS[names[0]](step[names[0]], **kwargs))
+        self.fingerprint = hashlib.sha256(json.dumps(list(steps), sort_keys=True).encode()).hexdigest()
+
+    def start(self) -> 'ChainStream':
+        return ChainStream([stage.fresh() for stage in self.stages])
+
+
+class ChainStream:
+    """Splits a byte stream into lines and runs them through the stages."""
+
+    def __init__(self, stages: List[Normalizer]):
+        self.stages = stages
+        self._partial = b''
+
+    def _run(self, lines: List[bytes], flush: bool = False) -> bytes:
+        for stage in self.stages:
+            out: List[bytes] = []
+            for line in lines:
+                out.extend(stage.push(line))
+            if flush:
+                out.extend(stage.flush())
+            lines = out
+        return b''.join(lines)
+
+    def feed(self, chunk: bytes) -> bytes:
+        data = self._partial + chunk
+        cut = data.rfind(b'\n') + 1
+        self._partial = data[cut:]
+        return self._run(data[:cut].splitlines(keepends=True)) if cut else b''
+
+    def close(self) -> bytes:
+        tail, self._partial = self._partial, b''
+        return self._run([tail] if tail else [], flush=True)
+
+
+class NormalizerSet:
+    """The chains of a normalizer file, by case kind and stream."""
+
+    def __init__(self, chains: Optional[Dict[str, Dict[str, Chain]]] = None,
+                 kinds: Optional[Dict[str, str]] = None):
+        self.chains = chains or {}
+        self.kinds = kinds or {}
+        for kind, name in self.kinds.items():
+            if name not in self.chains:
+                raise ValueError(f'normalizer file: kind {kind!r} uses unknown chain {name!r}')
+
+    @classmethod
+    def load(cls, path: Optional[Path]) -> 'NormalizerSet':
+        """Read a normalizer file; a missing one means output is compared as is."""
+        if path is None or not Path(path).is_file():
+            return cls()
+        data = json.loads(Path(path).read_text(encoding='utf-8'))
+        chains = {name: {stream: Chain(steps) for stream, steps in spec.items() if stream in STREAMS}
+                  for name, spec in data.get('chains', {}).items()}
+        return cls(chains, data.get('kinds', {}))
+
+    def _chains(self, cmd: Command) -> Dict[str, Chain]:
+        name = self.kinds.get(cmd.kind, self.kinds.get('*'))
+        return self.chains.get(name, {}) if name else {}
+
+    def stream(self, cmd: Command, stream: str) -> Optional[ChainStream]:
+        """Fresh per-stream state for ``cmd``'s ``stream``, or None when it is not normalized."""
+        chain = self._chains(cmd).get(stream)
+        return chain.start() if chain else None
+
+    def fingerprint(self, cmd: Command) -> str:
+        """Identifies the chains applied to ``cmd`` ('' when none)."""
+        chains = self._chains(cmd)
+        return ':'.join(f'{s}={chains[s].fingerprint[:16]}' for s in STREAMS if s in chains)
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .core import Bash, Command, ShellResult, fixture_fingerprint
+
+# Bump when the ShellResult layout or the key recipe changes.
+CACHE_FORMAT = 1
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Output that depends on the clock, the pid or state outside the fixture
+# (``/tmp``, redirections to absolute paths) is never cached, nor output of
+# commands that climb above the workspace root (``../..``), whose absolute
+# path is not rebased. ``l?s`` also catches ``ls -l`` assembled from a
+# variable (``l$HOLA`` with ``HOLA="s -la"``).
+_VOLATILE = re.compile(r'\bl?s\s+-\w*l|\bdate\b|\$\$|RANDOM|SECONDS|\bsleep\b|/tmp/|/dev/u?random|\.\./\.\.'
+                       r'|>\s*/(?!dev/)')
+
+
+# Commands that can print the workspace path; rebasing hides the path but
+# not its length (``pwd | wc``), so that length is part of their key.
+_PATH_SIZED = re.compile(r'\b(?:pwd|PWD|env|export)\b')
+
+
+def is_volatile(cmd: Command) -> bool:
+    """Whether ``cmd`` depends on, or writes, state outside its workspace."""
+    return _VOLATILE.search(cmd.text) is not None
+
+
+class OracleCache:
+    """On-disk cache of Bash results, keyed by everything that can change them.
+
+    The key covers the command text, the bash version, a fingerprint of the
+    working-directory fixture, the environment bash is started with (taken
+    at each lookup: pytest changes it from test to test), the output
+    normalizers applied to the command and the capture limits. The
+    workspace path itself is not part of it, only its length for commands
+    that can print it: output is rebased to ``<root>`` before it is stored. Truncated results are not cached, so a
+    run with a larger ``--max-output`` never replays a cut-off digest.
+    Entries are one JSON file each; the least recently used ones are
+    evicted once the cache grows past ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES, refresh: bool = False):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total: Optional[int] = None
+
+    @staticmethod
+    def _digest_env(env) -> str:
+        h = hashlib.sha256()
+        for k in sorted(env):
+            h.update(f'{k}={env[k]}\0'.encode('utf-8', 'surrogateescape'))
+        return h.hexdigest()
+
+    def key(self, bash: Bash, cmd: Command, cwd: Optional[Path]) -> str:
+        parts = [
+            str(CACHE_FORMAT),
+            bash.version,
+            str(bash.path),
+            fixture_fingerprint(cwd),
+            # What this shell is started with now, not when the cache was built.
+            self._digest_env(bash.environment()),
+            f'{bash.limits.window}/{bash.limits.max_bytes}',
+            bash.normalizers.fingerprint(cmd) if bash.normalizers else '',
+            str(len(str(cwd))) if cwd is not None and _PATH_SIZED.search(cmd.text) else '',
+            cmd.text,
+        ]
+        return hashlib.sha256('\0'.join(parts).encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f'{key}.json'
+
+    def get(self, key: str) -> Optional[ShellResult]:
+        path = self._entry(key)
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        try:
+            return ShellResult(**data)
+        except TypeError:
+            return None
+
+    def put(self, key: str, result: ShellResult) -> None:
+        path = self._entry(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = json.dumps(asdict(result)).encode('utf-8')
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            old = path.stat().st_size if path.exists() else 0
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_size()
+            else:
+                self._total += len(payload) - old
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def lookup(self, bash: Bash, cmd: Command, cwd: Optional[Path]) -> Tuple[Optional[str], Optional[ShellResult]]:
+        """Return ``(key, cached result)``; the key is None for uncacheable commands."""
+        if is_volatile(cmd):
+            return None, None
+        key = self.key(bash, cmd, cwd)
+        cached = None if self.refresh else self.get(key)
+        with self._lock:
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return key, cached
+
+    def store(self, key: Optional[str], result: ShellResult) -> None:
+        # A timeout says more about the machine than about bash; never pin it,
+        # nor output cut short by this run's limits.
+        if key is not None and not result.timed_out and not result.truncated:
+            self.put(key, result)
+
+    def execute(self, bash: Bash, cmd: Command, cwd: Optional[Path],
+                rebase: Optional[Path] = None) -> ShellResult:
+        """Return the cached Bash result for ``cmd``, running bash on a miss."""
+        key, cached = self.lookup(bash, cmd, cwd)
+        if cached is not None:
+            return cached
+        result = bash.execute(cmd, cwd, rebase=rebase)
+        self.store(key, result)
+        return result
+
+    def summary(self) -> str:
+        looked_up = self.hits + self.misses
+        rate = f' ({100 * self.hits / looked_up:.0f}% hit rate)' if looked_up else ''
+        return f'oracle cache: {self.hits} hits, {self.misses} misses{rate}'
+
+    def _entries(self) -> Dict[Path, os.stat_result]:
+        entries = {}
+        if self.cache_dir.is_dir():
+            for path in self.cache_dir.glob('*/*.json'):
+                try:
+                    entries[path] = path.stat()
+                except OSError:
+                    pass
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(st.st_size for st in self._entries().values())
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache is under 90% of its bound."""
+        entries = sorted(self._entries().items(), key=lambda kv: kv[1].st_mtime)
+        total = sum(st.st_size for _, st in entries)
+        target = int(self.max_bytes * 0.9)
+        for path, st in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= st.st_size
+            except OSError:
+                pass
+        self._total = total
+
+    def clear(self) -> None:
+        with self._lock:
+            for path in self._entries():
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            self._total = 0
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .core import Command
+
+_binary_cache: Dict[tuple, str] = {}
+
+
+def binary_fingerprint(path: Path) -> str:
+    """sha256 of the binary at ``path``, memoised on (path, size, mtime)."""
+    st = os.stat(path)
+    memo = (str(path), st.st_size, st.st_mtime_ns)
+    digest = _binary_cache.get(memo)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = _binary_cache[memo] = h.hexdigest()
+    return digest
+
+
+def case_key(cmd: Command) -> str:
+    """Identity of a case independent of its row id (ids shift when rows move)."""
+    return hashlib.sha256(f'{cmd.kind}\0{cmd.text}'.encode('utf-8', 'surrogateescape')).hexdigest()
+
+
+# Verdicts are kept for this many binaries, the most recently used ones.
+DEFAULT_KEEP_BINARIES = 5
+# Recorded verdicts are buffered and written in one transaction per batch.
+DEFAULT_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    key TEXT PRIMARY KEY,
+    binary_hash TEXT NOT NULL,
+    case_id INTEGER NOT NULL,
+    passed INTEGER NOT NULL,
+    report TEXT NOT NULL,
+    bash_exit INTEGER,
+    minishell_exit INTEGER,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS verdicts_binary ON verdicts(binary_hash);
+CREATE TABLE IF NOT EXISTS latest (
+    case_key TEXT PRIMARY KEY,
+    passed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS binaries (
+    binary_hash TEXT PRIMARY KEY,
+    used REAL NOT NULL
+);
+"""
+
+
+class OutcomeStore:
+    """Per-case verdicts recorded against the binary they were obtained with.
+
+    ``get`` looks up the verdict and failure report of a (binary hash, case,
+    fixture fingerprint) key, which is what ``--incremental`` replays.
+    ``latest`` remembers the most recent verdict of each case regardless of
+    the binary, for "only last failures" and "failures first" orderings.
+
+    Verdicts live in a SQLite database, so a session reads only the keys it
+    asks for and writes only the rows it records, each batch in one
+    transaction: concurrent sessions never overwrite each other. ``save``
+    also drops the verdicts of all but the ``keep_binaries`` most recently
+    used binaries, so the store does not grow with every rebuild.
+    """
+
+    def __init__(self, path: Path, keep_binaries: int = DEFAULT_KEEP_BINARIES, batch: int = DEFAULT_BATCH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.keep_binaries = keep_binaries
+        self.batch = batch
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._binaries: Dict[str, float] = {}
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+        self.latest: Dict[str, bool] = {key: bool(passed) for key, passed in
+                                        self.conn.execute('SELECT case_key, passed FROM latest')}
+
+    @staticmethod
+    def key(binary_hash: str, cmd: Command, fixture: str, normalization: str = '') -> str:
+        state = f'{fixture}\0{normalization}' if normalization else fixture
+        return hashlib.sha256(f'{binary_hash}\0{case_key(cmd)}\0{state}'.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            self._flush()
+            row = self.conn.execute('SELECT case_id, passed, report, bash_exit, minishell_exit, time '
+                                    'FROM verdicts WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('id', 'passed', 'report', 'bash_exit', 'minishell_exit', 'time'), row),
+                    passed=bool(row[1]))
+
+    def record(self, key: str, cmd: Command, passed: bool, report: str = '',
+               bash_exit: Optional[int] = None, minishell_exit: Optional[int] = None,
+               binary_hash: str = '') -> None:
+        now = time.time()
+        with self._lock:
+            self._pending.append((key, binary_hash, cmd.id, int(passed), '' if passed else report,
+                                  bash_exit, minishell_exit, now, case_key(cmd)))
+            self._binaries[binary_hash] = now
+            self.latest[case_key(cmd)] = passed
+            if len(self._pending) >= self.batch:
+                self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                  [row[:8] for row in rows])
+            self.conn.executemany('INSERT OR REPLACE INTO latest VALUES (?, ?)',
+                                  [(row[8], row[3]) for row in rows])
+            self.conn.executemany('INSERT OR REPLACE INTO binaries VALUES (?, ?)', self._binaries.items())
+        self._binaries = {}
+
+    def failed_last(self, cmd: Command) -> bool:
+        return self.latest.get(case_key(cmd)) is False
+
+    def only_failures(self, cmds: Iterable[Command]) -> List[Command]:
+        return [c for c in cmds if self.failed_last(c)]
+
+    def failures_first(self, cmds: Iterable[Command]) -> List[Command]:
+        cmds = list(cmds)
+        return [c for c in cmds if self.failed_last(c)] + [c for c in cmds if not self.failed_last(c)]
+
+    def save(self) -> None:
+        """Write what is still buffered and prune the verdicts of old binaries."""
+        with self._lock:
+            self._flush()
+            with self.conn:
+                self.conn.execute(
+                    'DELETE FROM verdicts WHERE binary_hash NOT IN '
+                    '(SELECT binary_hash FROM binaries ORDER BY used DESC LIMIT ?)', (self.keep_binaries,))
+                self.conn.execute('DELETE FROM binaries WHERE binary_hash NOT IN '
+                                  '(SELECT binary_hash FROM binaries ORDER BY used DESC LIMIT ?)',
+                                  (self.keep_binaries,))
+
+    def close(self) -> None:
+        """Write what is still buffered and close the database; ``latest`` stays readable."""
+        with self._lock:
+            self._flush()
+            self.conn.close()
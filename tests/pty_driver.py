@@ -0,0 +1,571 @@
+"""Interactive cases: both shells on a pseudo-terminal, many sessions per loop.
+
+``SIGNAUX`` and ``HEREDOC`` rows describe keystrokes (``holaCtlr-C``,
+``cat (faire Ctlr-C apres avoir fait plusieurs fois [ENTREE])``) that only
+mean something on a terminal: Ctrl-C is SIGINT only through the line
+discipline, and a heredoc body is typed after its command line. Each row
+is turned into a script of ``Step``s and played to the shell on its own
+pty; one selector loop drives every session at once.
+
+Sessions never sleep to let a shell catch up. A step waits for output
+(the echo of what was typed, a marker a command prints back), for the
+shell's prompt, or for the terminal to leave the line editor's raw mode,
+i.e. for a command to be running. A control key typed at the prompt is
+held until the line editor has the terminal in raw mode and the shell
+sleeps in its read: bash drops a SIGINT that lands before that read. Only
+a keystroke the row times explicitly ("une seconde apres") is delayed. A
+session ends when the shell answers the final ``echo MARK:$?`` with its
+status, or when it exits.
+
+The transcript is rendered as a screen would show it (backspaces and
+carriage returns applied, escapes dropped), the start-up and the marker
+lines are cut out and the shell's own prompt is removed from the start of
+each line (lines holding nothing else are dropped); that, and the status,
+is what gets compared.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import re
+import secrets
+import selectors
+import shutil
+import signal
+import struct
+import subprocess
+import sys
+import termios
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Pattern, Sequence, Tuple
+
+from .core import Command, Shell, ShellResult, kill_process_group, pair_workspaces, shell_environment
+from .fixtures import FixtureSet
+
+INTERACTIVE_KINDS = ('SIGNAUX', 'HEREDOC')
+CONTROL_KEYS = {'C': b'\x03', 'D': b'\x04', '\\': b'\x1c', 'Z': b'\x1a'}
+# Keys whose signal ends a running command.
+_KILLS = ('C', '\\')
+# "plusieurs fois [ENTREE]"
+ENTER_PRESSES = 3
+# "une seconde apres"
+NOTE_DELAY = 1.0
+# Typed into every heredoc before its delimiter: a plain line and one to expand.
+HEREDOC_BODY = ('hola que tal', '"$USER" \'$HOME\' $?')
+# How a shell asks for the next heredoc line (bash's PS2).
+CONTINUATION_PROMPT = b'> '
+# Wide enough that the line editor never wraps what is typed.
+COLUMNS = 1000
+# How often a session waiting for a command to start looks at the terminal mode.
+POLL_INTERVAL = 0.005
+
+# What a session plays: the shell, the case, its directory and the path shown as the root.
+Job = Tuple[Shell, Command, Path, Optional[Path]]
+
+_KEY = re.compile(r'Ct(?:lr|rl)-(.)')
+_NOTE = re.compile(r'^(.*?)\s*\((.*)\)\s*$', re.S)
+_HEREDOC = re.compile(r'(?<!<)<<(?!<)[ \t]*([^\s|&;<>()]+)')
+_ESCAPE = re.compile(r'\x1b(?:\[[0-9;?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[@-Z\\-_])')
+
+
+@dataclass(frozen=True)
+class Step:
+    """Send ``send`` (after ``delay`` seconds), then wait for what the flags ask."""
+    send: bytes = b''
+    delay: float = 0.0
+    # Output since the send must match before the next step.
+    expect: Optional[Pattern[bytes]] = None
+    # ...and then the prompt must have been drawn again (learnt on first use).
+    prompt: bool = False
+    # ...and then the terminal must be in canonical mode: a command has it.
+    running: bool = False
+    # Send only once the line editor waits for a key (raw mode, shell asleep).
+    editing: bool = False
+
+
+def is_interactive(cmd: Command) -> bool:
+    return cmd.kind.split(' ', 1)[0] in INTERACTIVE_KINDS
+
+
+def _unquote(word: str) -> str:
+    out, i = [], 0
+    while i < len(word):
+        c = word[i]
+        if word[i:i + 2] == '$$':
+            out.append('$$')
+            i += 2
+        elif c == '$' and word[i + 1:i + 2] in ('"', "'"):
+            i += 1
+        elif c in '"\'':
+            end = word.find(c, i + 1)
+            end = len(word) if end < 0 else end
+            out.append(word[i + 1:end])
+            i = end + 1
+        else:
+            out.append(c)
+            i += 1
+    return ''.join(out)
+
+
+def heredoc_delimiters(line: str) -> List[str]:
+    """Delimiters of the heredocs opened on ``line``, quotes removed, in order."""
+    return [_unquote(word) for word in _HEREDOC.findall(line)]
+
+
+def _typed(text: str) -> Step:
+    data = text.encode('utf-8', 'surrogateescape')
+    return Step(send=data, expect=re.compile(re.escape(data)))
+
+
+def _entered(line: str, continued: bool) -> Step:
+    """Type ``line`` and Enter; wait for the continuation prompt, or else for the shell's prompt."""
+    data = line.encode('utf-8', 'surrogateescape')
+    if continued:
+        return Step(send=data + b'\n', expect=re.compile(re.escape(data) + rb'\r?\n[^\n]*' + CONTINUATION_PROMPT))
+    return Step(send=data + b'\n', expect=re.compile(re.escape(data)), prompt=True)
+
+
+def script_for(cmd: Command, mark: str) -> List[Step]:
+    """The keystrokes of ``cmd``, between a start-up sync and the final status query."""
+    sync = f'echo {mark}:$?\n'.encode()
+    steps = [Step(send=sync, expect=re.compile(re.escape(mark.encode()) + rb':\d+'), prompt=True)]
+    text = cmd.text
+    note = _NOTE.match(text) if cmd.kind.startswith('SIGNAUX') else None
+    if cmd.kind.startswith('HEREDOC'):
+        # One line at a time: a body line only once the shell asks for it,
+        # the next command line only once the prompt is back.
+        for line in text.split('\n'):
+            lines = [line]
+            for delimiter in heredoc_delimiters(line):
+                lines += list(HEREDOC_BODY) + [delimiter]
+            for i, typed in enumerate(lines):
+                steps.append(_entered(typed, continued=i < len(lines) - 1))
+    elif note:
+        command, instructions = note.groups()
+        data = command.encode('utf-8', 'surrogateescape')
+        steps.append(Step(send=data + b'\n', expect=re.compile(re.escape(data) + rb'\r?\n'), running=True))
+        if 'ENTREE' in instructions:
+            # Ctrl-C flushes the terminal's output queue: wait until the command echoed the lines back.
+            steps.append(Step(send=b'\n' * ENTER_PRESSES,
+                              expect=re.compile(rb'(?:[^\n]*\n){%d}' % (2 * ENTER_PRESSES))))
+        key = _KEY.search(instructions)
+        if key:
+            # Killing the command brings the prompt back.
+            steps.append(Step(send=CONTROL_KEYS.get(key.group(1), b''), prompt=key.group(1) in _KILLS,
+                              delay=NOTE_DELAY if 'seconde' in instructions else 0.0))
+    else:
+        pos = 0
+        for key in _KEY.finditer(text):
+            if text[pos:key.start()]:
+                steps.append(_typed(text[pos:key.start()]))
+            # At the prompt only Ctrl-C does something (the shell redraws it); typing
+            # on before that would race the shell's own signal handling.
+            steps.append(Step(send=CONTROL_KEYS.get(key.group(1), b''), prompt=key.group(1) == 'C',
+                              editing=True))
+            pos = key.end()
+        if text[pos:]:
+            steps.append(_typed(text[pos:]))
+    # Ctrl-U first: whatever a scenario left on the line must not swallow the query.
+    steps.append(Step(send=b'\x15' + sync, expect=re.compile(re.escape(mark.encode()) + rb':(\d+)')))
+    return steps
+
+
+def render(raw: bytes) -> List[str]:
+    """The lines of a terminal transcript as a screen shows them, trailing blanks stripped."""
+    text = _ESCAPE.sub('', raw.decode('utf-8', errors='replace'))
+    lines: List[str] = []
+    line: List[str] = []
+    col = 0
+    for ch in text:
+        if ch == '\n':
+            lines.append(''.join(line).rstrip())
+            line, col = [], 0
+        elif ch == '\r':
+            col = 0
+        elif ch == '\b':
+            col = max(col - 1, 0)
+        elif ch < ' ' and ch != '\t' or ch == '\x7f':
+            continue
+        else:
+            if col < len(line):
+                line[col] = ch
+            else:
+                line.append(ch)
+            col += 1
+    if line:
+        lines.append(''.join(line).rstrip())
+    return lines
+
+
+def learn_prompt(lines: Sequence[str], mark: str) -> str:
+    """The prompt the shell printed before echoing the start-up sync ('' if it shows none)."""
+    sync = f'echo {mark}:$?'
+    for line in reversed(lines):
+        if sync in line:
+            return line[:line.index(sync)]
+    return ''
+
+
+def transcript(raw: bytes, mark: str, prompt: str) -> str:
+    """What the scenario showed: after the start-up sync, without marker lines and prompts."""
+    lines = render(raw)
+    done = re.compile(re.escape(mark) + r':\d+$')
+    start = next((i + 1 for i, line in enumerate(lines) if done.search(line)), 0)
+    bare = prompt.rstrip()
+    out = []
+    for line in lines[start:]:
+        if mark in line:
+            continue
+        if bare and line.startswith(bare):
+            line = line[len(prompt):] if line.startswith(prompt) else line[len(bare):]
+            if not line:
+                # A prompt and nothing typed at it.
+                continue
+        out.append(line)
+    return ''.join(f'{line}\n' for line in out)
+
+
+# Makes stdin, the pty, the controlling terminal of a new session, then runs argv[1:].
+_TAKE_TERMINAL = ('import fcntl, os, sys, termios; os.setsid(); fcntl.ioctl(0, termios.TIOCSCTTY, 0); '
+                  'os.execvp(sys.argv[1], sys.argv[1:])')
+
+
+def on_terminal(args: List[str]) -> List[str]:
+    """``args`` run in a session of their own, with the pty on stdin as controlling terminal.
+
+    The switch happens in a small program exec'd first (util-linux
+    ``setsid --ctty``, else a Python one-liner), not in a ``preexec_fn``:
+    running Python in a forked child can deadlock while other threads of
+    the tester are starting processes.
+    """
+    setsid = shutil.which('setsid')
+    if setsid is not None and sys.platform.startswith('linux'):
+        return [setsid, '--ctty'] + list(args)
+    return [sys.executable, '-c', _TAKE_TERMINAL] + list(args)
+
+
+class _Session:
+    """One shell on one pty, playing one script."""
+
+    def __init__(self, shell: Shell, cmd: Command, cwd: Path, rebase: Optional[Path], env: dict):
+        self.shell, self.cmd, self.rebase = shell, cmd, rebase
+        self.mark = f'__pty{secrets.token_hex(4)}'
+        self.steps = script_for(cmd, self.mark)
+        master, slave = os.openpty()
+        fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack('HHHH', 24, COLUMNS, 0, 0))
+        self.start = time.monotonic()
+        self.deadline = self.start + shell.timeout
+        try:
+            self.proc = subprocess.Popen(on_terminal(shell.interactive_args()), stdin=slave, stdout=slave,
+                                         stderr=slave, cwd=str(cwd), env=env, close_fds=True)
+        except BaseException:
+            os.close(master)
+            raise
+        finally:
+            os.close(slave)
+        os.set_blocking(master, False)
+        self.fd = master
+        self.output = bytearray()
+        self.prompt: Optional[str] = None
+        self.index = 0
+        self.step_started = self.start
+        self.sent_at: Optional[int] = None
+        self.match: Optional[re.Match] = None
+        self.status: Optional[int] = None
+        self.eof = self.done = self.timed_out = self.full = False
+
+    def read(self) -> None:
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO: every process holding the slave side is gone.
+            data = b''
+        if not data:
+            self.eof = True
+            return
+        room = self.shell.limits.max_bytes - len(self.output)
+        if len(data) > room:
+            data, self.full = data[:room], True
+        self.output += data
+
+    def _write(self, data: bytes) -> None:
+        try:
+            os.write(self.fd, data)
+        except OSError:
+            pass
+
+    def _prompt_shown(self, since: int) -> bool:
+        """Whether a fresh line starting with the prompt was drawn after ``since``."""
+        if self.prompt is None:
+            self.prompt = learn_prompt(render(bytes(self.output[:self.match.start()])), self.mark)
+        bare = self.prompt.rstrip()
+        if not bare:
+            return True
+        tail = render(bytes(self.output[since:]))
+        return len(tail) > 1 and tail[-1].startswith(bare)
+
+    def _running(self) -> bool:
+        try:
+            return bool(termios.tcgetattr(self.fd)[3] & termios.ICANON)
+        except termios.error:
+            return True
+
+    def _reading(self) -> bool:
+        """Whether the line editor waits for a key: raw mode, and the shell asleep in its read."""
+        if self._running():
+            return False
+        try:
+            with open(f'/proc/{self.proc.pid}/stat', 'rb') as stat:
+                # The state follows the parenthesised command name.
+                return stat.read().rpartition(b')')[2].split()[0] == b'S'
+        except (OSError, IndexError):
+            return True
+
+    def advance(self, now: float) -> None:
+        """Play as many steps as the output so far allows."""
+        while not self.done:
+            if self.full:
+                self.done = True
+                return
+            step = self.steps[self.index]
+            if self.sent_at is None:
+                if now < self.step_started + step.delay:
+                    break
+                if step.editing and not self._reading():
+                    break
+                self.sent_at = len(self.output)
+                self._write(step.send)
+            if step.expect is not None:
+                self.match = step.expect.search(self.output, self.sent_at)
+                if self.match is None:
+                    break
+            if step.prompt and not self._prompt_shown(self.match.end() if step.expect else self.sent_at):
+                break
+            if step.running and not self._running():
+                break
+            if self.index == len(self.steps) - 1:
+                self.status = int(self.match.group(1))
+                self.done = True
+                return
+            self.index += 1
+            self.sent_at = None
+            self.step_started = now
+        if not self.done and (self.eof or now >= self.deadline):
+            self.timed_out = not self.eof
+            self.done = True
+
+    def wake(self, now: float) -> float:
+        """When the session needs looking at again without new output."""
+        step = self.steps[self.index]
+        if self.sent_at is None:
+            if step.editing and now >= self.step_started + step.delay:
+                return min(self.deadline, now + POLL_INTERVAL)
+            return min(self.deadline, self.step_started + step.delay)
+        if step.running:
+            return min(self.deadline, now + POLL_INTERVAL)
+        return self.deadline
+
+    def finish(self) -> ShellResult:
+        try:
+            foreground = os.tcgetpgrp(self.fd)
+        except OSError:
+            foreground = None
+        if foreground and foreground != self.proc.pid:
+            try:
+                os.killpg(foreground, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+        kill_process_group(self.proc.pid)
+        os.close(self.fd)
+        self.proc.wait()
+        duration = time.monotonic() - self.start
+        status = self.status if self.status is not None else self.proc.returncode
+        out, err = self.shell.captures(self.cmd, self.rebase)
+        out.feed(transcript(bytes(self.output), self.mark, self.prompt or '').encode('utf-8', 'surrogateescape'))
+        out.full = out.full or self.full
+        return self.shell.result(status, out, err, self.timed_out, duration)
+
+
+class PtyDriver:
+    """Plays interactive cases, up to ``max_sessions`` shells at a time, from one selector loop.
+
+    ``run`` plays a list of jobs on the calling thread. ``start`` moves the
+    loop to a thread of its own instead: ``submit`` then queues a session
+    while others play and returns a Future of its result, until ``close``.
+    Sessions start in submission order.
+    """
+
+    def __init__(self, max_sessions: int = 2, env: Optional[dict] = None):
+        self.max_sessions = max(1, max_sessions)
+        # A dumb terminal keeps line editors from drawing; no history file is written.
+        self.env = dict(shell_environment(env), TERM='dumb', HISTFILE='')
+        self._queue: Deque[Tuple[Future, Job]] = deque()
+        self._lock = threading.Lock()
+        self._closing = self._abort = False
+        self._thread: Optional[threading.Thread] = None
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+
+    def run(self, jobs: Sequence[Job]) -> List[ShellResult]:
+        """``(shell, cmd, cwd, rebase)`` jobs in, results out in the same order."""
+        futures = [self.submit(*job) for job in jobs]
+        self._closing = True
+        self._loop()
+        return [future.result() for future in futures]
+
+    def start(self) -> 'PtyDriver':
+        self._thread = threading.Thread(target=self._loop, name='pty-driver', daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, shell: Shell, cmd: Command, cwd: Path, rebase: Optional[Path] = None) -> 'Future[ShellResult]':
+        future: 'Future[ShellResult]' = Future()
+        with self._lock:
+            if self._closing:
+                raise RuntimeError('submit after close')
+            self._queue.append((future, (shell, cmd, cwd, rebase)))
+        self._wake()
+        return future
+
+    def close(self, cancel: bool = False) -> None:
+        """Let the queued sessions play out and stop the loop; ``cancel`` drops and kills them instead."""
+        with self._lock:
+            self._closing = True
+            if cancel:
+                self._abort = True
+                for future, _ in self._queue:
+                    future.cancel()
+                self._queue.clear()
+        self._wake()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._wake_r, self._wake_w):
+            os.close(fd)
+        self._wake_r = self._wake_w = -1
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            # Already woken and not yet drained.
+            pass
+
+    def _next(self) -> Optional[Tuple[Future, Job]]:
+        with self._lock:
+            while self._queue:
+                future, job = self._queue.popleft()
+                if future.set_running_or_notify_cancel():
+                    return future, job
+        return None
+
+    def _loop(self) -> None:
+        active: Dict[_Session, Future] = {}
+        with selectors.DefaultSelector() as sel:
+            sel.register(self._wake_r, selectors.EVENT_READ, None)
+            try:
+                while not self._abort:
+                    while len(active) < self.max_sessions:
+                        item = self._next()
+                        if item is None:
+                            break
+                        future, (shell, cmd, cwd, rebase) = item
+                        try:
+                            session = _Session(shell, cmd, cwd, rebase, self.env)
+                        except Exception as exc:
+                            future.set_exception(exc)
+                            continue
+                        sel.register(session.fd, selectors.EVENT_READ, session)
+                        active[session] = future
+                    with self._lock:
+                        if not active and not self._queue and self._closing:
+                            break
+                    now = time.monotonic()
+                    wake = min((s.wake(now) for s in active), default=now + 3600)
+                    for key, _ in sel.select(max(0.0, wake - now)):
+                        if key.data is None:
+                            while True:
+                                try:
+                                    if not os.read(self._wake_r, 4096):
+                                        break
+                                except BlockingIOError:
+                                    break
+                            continue
+                        key.data.read()
+                        if key.data.eof:
+                            sel.unregister(key.fd)
+                    now = time.monotonic()
+                    for session in list(active):
+                        session.advance(now)
+                        if session.done:
+                            if not session.eof:
+                                sel.unregister(session.fd)
+                            active.pop(session).set_result(session.finish())
+            finally:
+                for session, future in active.items():
+                    session.status = session.status if session.status is not None else -signal.SIGKILL
+                    future.set_result(session.finish())
+                with self._lock:
+                    # Nothing will play what is still queued.
+                    self._closing = True
+                    for future, _ in self._queue:
+                        future.cancel()
+                    self._queue.clear()
+
+
+def _pair_jobs(bash: Shell, minishell: Shell, cmd: Command, work_dir: Path,
+               fixtures: Optional[FixtureSet]) -> List[Job]:
+    jobs = []
+    for shell, ws in zip((bash, minishell), pair_workspaces(work_dir)):
+        ws.mkdir(parents=True, exist_ok=True)
+        if fixtures is not None:
+            fixtures.materialize(cmd, ws)
+        jobs.append((shell, cmd, ws, ws.parent))
+    return jobs
+
+
+def submit_case(driver: PtyDriver, bash: Shell, minishell: Shell, cmd: Command, work_dir: Path,
+                fixtures: Optional[FixtureSet] = None) -> 'Future[Tuple[ShellResult, ShellResult]]':
+    """Queue ``cmd`` under both shells on a started ``driver``; a Future of the two results."""
+    sessions = [driver.submit(*job) for job in _pair_jobs(bash, minishell, cmd, work_dir, fixtures)]
+    pair: 'Future[Tuple[ShellResult, ShellResult]]' = Future()
+    lock = threading.Lock()
+
+    def settle(_):
+        with lock:
+            if pair.done() or not all(f.done() for f in sessions):
+                return
+            if any(f.cancelled() for f in sessions):
+                pair.cancel()
+            elif any(f.exception() is not None for f in sessions):
+                pair.set_exception(next(f.exception() for f in sessions if f.exception() is not None))
+            else:
+                pair.set_result((sessions[0].result(), sessions[1].result()))
+
+    for future in sessions:
+        future.add_done_callback(settle)
+    return pair
+
+
+def run_interactive(bash: Shell, minishell: Shell, cmds: Sequence[Command], work_dirs: Sequence[Path],
+                    fixtures: Optional[FixtureSet] = None,
+                    max_sessions: int = 2) -> List[Tuple[ShellResult, ShellResult]]:
+    """Play ``cmds`` under both shells at once, each case in the pair workspaces of its work dir."""
+    jobs = []
+    for cmd, work_dir in zip(cmds, work_dirs):
+        jobs += _pair_jobs(bash, minishell, cmd, work_dir, fixtures)
+    driver = PtyDriver(max_sessions)
+    try:
+        results = driver.run(jobs)
+    finally:
+        driver.close()
+    return list(zip(results[::2], results[1::2]))
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import json
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from .core import Command, ShellResult
+from .outcome_store import case_key
+
+SCHEMA_VERSION = 1
+# Rows are buffered and written in one transaction per batch.
+DEFAULT_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    finished REAL,
+    front_end TEXT NOT NULL,
+    binary_hash TEXT NOT NULL,
+    bash_version TEXT,
+    host TEXT,
+    argv TEXT,
+    total INTEGER,
+    passed INTEGER
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    case_key TEXT NOT NULL,
+    case_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    command TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    replayed INTEGER NOT NULL DEFAULT 0,
+    bash_exit INTEGER,
+    minishell_exit INTEGER,
+    bash_duration REAL,
+    minishell_duration REAL,
+    bash_digest TEXT,
+    minishell_digest TEXT,
+    bash_length INTEGER,
+    minishell_length INTEGER,
+    timed_out INTEGER,
+    bash_cpu REAL,
+    minishell_cpu REAL,
+    bash_max_rss INTEGER,
+    minishell_max_rss INTEGER,
+    bash_children INTEGER,
+    minishell_children INTEGER
+);
+CREATE INDEX IF NOT EXISTS results_run ON results(run_id);
+CREATE INDEX IF NOT EXISTS results_case ON results(case_key, run_id);
+"""
+
+
+class ResultsDB:
+    """Every run and every case verdict, in a local SQLite database.
+
+    ``begin_run`` opens a run, ``record`` buffers one case and ``end_run``
+    flushes the buffer and stamps the run's totals. Inserts are batched so
+    recording costs the runner next to nothing; the WAL journal lets the
+    query tool read while a run is writing.
+    """
+
+    def __init__(self, path: Path, batch: int = DEFAULT_BATCH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch = batch
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._totals = [0, 0]
+        self.run_id: Optional[int] = None
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self.conn.executescript(_SCHEMA)
+            self.conn.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+        self.conn.commit()
+
+    def begin_run(self, front_end: str, binary_hash: str, bash_version: str = '',
+                  argv: Sequence[str] = ()) -> int:
+        with self._lock, self.conn:
+            cur = self.conn.execute(
+                'INSERT INTO runs (started, front_end, binary_hash, bash_version, host, argv) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (time.time(), front_end, binary_hash, bash_version, socket.gethostname(), json.dumps(list(argv))))
+            self.run_id = cur.lastrowid
+            self._totals = [0, 0]
+        return self.run_id
+
+    def record(self, cmd: Command, passed: bool, bash: Optional[ShellResult] = None,
+               minishell: Optional[ShellResult] = None, bash_exit: Optional[int] = None,
+               minishell_exit: Optional[int] = None) -> None:
+        """Buffer one verdict; without results it is a replay of a recorded verdict."""
+        if self.run_id is None:
+            return
+        row = (self.run_id, case_key(cmd), cmd.id, cmd.kind, cmd.text, int(passed), int(bash is None),
+               bash.exit_code if bash else bash_exit, minishell.exit_code if minishell else minishell_exit,
+               bash.duration if bash else None, minishell.duration if minishell else None,
+               bash.stdout_digest if bash else None, minishell.stdout_digest if minishell else None,
+               bash.stdout_length if bash else None, minishell.stdout_length if minishell else None,
+               int(minishell.timed_out) if minishell else None,
+               bash.cpu_time if bash else None, minishell.cpu_time if minishell else None,
+               bash.max_rss if bash else None, minishell.max_rss if minishell else None,
+               bash.children if bash else None, minishell.children if minishell else None)
+        with self._lock:
+            self._pending.append(row)
+            self._totals[0] += 1
+            self._totals[1] += int(passed)
+            if len(self._pending) >= self.batch:
+                self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        with self.conn:
+            self.conn.executemany(f"INSERT INTO results VALUES ({', '.join('?' * len(rows[0]))})", rows)
+
+    def end_run(self) -> None:
+        if self.run_id is None:
+            return
+        with self._lock:
+            self._flush()
+            with self.conn:
+                self.conn.execute('UPDATE runs SET finished = ?, total = ?, passed = ? WHERE id = ?',
+                                  (time.time(), self._totals[0], self._totals[1], self.run_id))
+            self.run_id = None
+
+    def close(self) -> None:
+        self.end_run()
+        self.conn.close()
+
+    # --- Queries ---
+
+    def latest_run(self) -> Optional[int]:
+        row = self.conn.execute('SELECT MAX(id) FROM runs').fetchone()
+        return row[0]
+
+    def runs(self, limit: int = 20) -> List[sqlite3.Row]:
+        return self._query('SELECT id, started, finished, front_end, binary_hash, total, passed '
+                           'FROM runs ORDER BY id DESC LIMIT ?', (limit,))
+
+    def regressions(self, since: int, until: Optional[int] = None) -> List[sqlite3.Row]:
+        """Cases that passed in run ``since`` and fail in run ``until`` (default: the latest).
+
+        One row per case key, however many rows of the case file share it:
+        the key must have passed everywhere in ``since``; the row shown is
+        its first failing one in ``until``.
+        """
+        until = until if until is not None else self.latest_run()
+        return self._query(
+            'SELECT MIN(case_id) AS case_id, kind, command, bash_exit, minishell_exit '
+            'FROM results WHERE run_id = ? AND passed = 0 AND case_key IN '
+            '(SELECT case_key FROM results WHERE run_id = ? GROUP BY case_key HAVING MIN(passed) = 1) '
+            'GROUP BY case_key ORDER BY case_id', (until, since))
+
+    def slowest(self, limit: int = 50, run: Optional[int] = None) -> List[sqlite3.Row]:
+        """Cases of ``run`` (default: the latest) by Minishell wall time."""
+        run = run if run is not None else self.latest_run()
+        return self._query(
+            'SELECT case_id, kind, command, minishell_duration, bash_duration, passed '
+            'FROM results WHERE run_id = ? AND minishell_duration IS NOT NULL '
+            'ORDER BY minishell_duration DESC LIMIT ?', (run, limit))
+
+    def overhead(self, limit: int = 20, run: Optional[int] = None) -> List[sqlite3.Row]:
+        """Cases of ``run`` (default: the latest) by Minishell CPU time beyond Bash."""
+        run = run if run is not None else self.latest_run()
+        return self._query(
+            'SELECT case_id, kind, command, minishell_cpu - bash_cpu AS extra_cpu, minishell_cpu, bash_cpu, '
+            'minishell_duration, bash_duration, minishell_max_rss, bash_max_rss, '
+            'minishell_children, bash_children, passed '
+            'FROM results WHERE run_id = ? AND minishell_cpu IS NOT NULL AND bash_cpu IS NOT NULL '
+            'ORDER BY extra_cpu DESC LIMIT ?', (run, limit))
+
+    def pass_rate_by_kind(self, kind: Optional[str] = None, limit: int = 20) -> List[sqlite3.Row]:
+        """Per run (newest first, ``limit`` runs) and kind: cases, passes and the pass rate."""
+        return self._query(
+            'SELECT runs.id AS run_id, runs.started, results.kind, COUNT(*) AS total, '
+            'SUM(results.passed) AS passed, ROUND(100.0 * SUM(results.passed) / COUNT(*), 1) AS rate '
+            'FROM results JOIN runs ON runs.id = results.run_id '
+            'WHERE runs.id IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?) '
+            'AND (? IS NULL OR results.kind = ?) '
+            'GROUP BY runs.id, results.kind ORDER BY runs.id DESC, results.kind', (limit, kind, kind))
+
+    def durations(self, runs: int = 5) -> Dict[str, float]:
+        """Expected Bash plus Minishell wall time of each case key, from its last ``runs`` recorded runs.
+
+        The mean of those runs, or their maximum when Minishell timed out in
+        any of them: a case that hangs now and then costs its timeout.
+        """
+        rows = self._query(
+            'SELECT case_key, bash_duration + minishell_duration AS cost, timed_out FROM results '
+            'WHERE bash_duration IS NOT NULL AND minishell_duration IS NOT NULL ORDER BY run_id DESC', ())
+        recent: Dict[str, List[float]] = {}
+        timed_out = set()
+        for row in rows:
+            costs = recent.setdefault(row['case_key'], [])
+            if len(costs) < runs:
+                costs.append(row['cost'])
+                if row['timed_out']:
+                    timed_out.add(row['case_key'])
+        return {key: max(costs) if key in timed_out else sum(costs) / len(costs) for key, costs in recent.items()}
+
+    def _query(self, sql: str, params: tuple) -> List[sqlite3.Row]:
+        with self._lock:
+            self._flush()
+            cur = self.conn.cursor()
+            cur.row_factory = sqlite3.Row
+            return cur.execute(sql, params).fetchall()
@@ -0,0 +1,479 @@
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .core import (Bash, CaptureLimits, Command, DeadlinePolicy, Minishell, ShellResult, execute_pair,
+                   pair_workspaces)
+from .fixtures import FixtureSet
+from .normalize import NormalizerSet
+from .oracle_cache import OracleCache
+from .pty_driver import PtyDriver, is_interactive, run_interactive, submit_case
+from .schedule import Schedule, estimate_costs
+from .session import needs_isolation, run_in_session
+
+
+@dataclass
+class CaseOutcome:
+    """Result of running one Command under both shells."""
+    cmd: Command
+    bash: ShellResult
+    minishell: ShellResult
+
+    @property
+    def passed(self) -> bool:
+        return self.bash == self.minishell
+
+
+RESOURCE_COLUMNS = ('wall', 'user', 'sys', 'max_rss_kb', 'children')
+
+# Files outside the case workspace: under /tmp, redirection targets other
+# than /dev, and anything above the workspace root (``../..``).
+_OUTSIDE = re.compile(r'/tmp/|>\s*/(?!dev/)|\.\./\.\.')
+# Held while a case that writes outside its workspace runs, by every worker
+# of every runner: scratch directories cannot keep those cases apart.
+_OUTSIDE_LOCK = threading.Lock()
+
+
+def writes_outside(cmd: Command) -> bool:
+    """Whether ``cmd`` may write files that other cases (and the other shell) can see."""
+    return _OUTSIDE.search(cmd.text) is not None
+
+
+def resource_fields(bash: ShellResult, minishell: ShellResult) -> Dict[str, Optional[float]]:
+    """Wall, CPU, peak RSS and child count of both shells, as ``bash_wall``, ``minishell_user``...
+
+    Peak RSS and child count are None where they were not measured.
+    """
+    fields: Dict[str, Optional[float]] = {}
+    for name, res in (('bash', bash), ('minishell', minishell)):
+        values = (round(res.duration, 6), round(res.user_time, 6), round(res.sys_time, 6), res.max_rss, res.children)
+        fields.update((f'{name}_{col}', value) for col, value in zip(RESOURCE_COLUMNS, values))
+    return fields
+
+
+def _ratio(mine: float, theirs: float) -> str:
+    return f'{mine / theirs:5.1f}x' if theirs > 0 else '    -'
+
+
+def _measured(value: Optional[float]) -> str:
+    return '-' if value is None else str(value)
+
+
+def overhead_summary(rows: Iterable[Tuple[Command, Dict[str, float]]], top: int = 10) -> List[str]:
+    """The ``top`` cases where Minishell spends the most CPU beyond Bash, one line each.
+
+    ``rows`` pairs each case with its ``resource_fields``.
+    """
+    def extra_cpu(row):
+        f = row[1]
+        return (f['minishell_user'] + f['minishell_sys']) - (f['bash_user'] + f['bash_sys'])
+
+    ranked = sorted(rows, key=extra_cpu, reverse=True)[:top]
+    lines = []
+    for cmd, f in ranked:
+        rss = f"{_measured(f['minishell_max_rss_kb'])}/{_measured(f['bash_max_rss_kb'])} KiB"
+        children = f"{_measured(f['minishell_children'])}/{_measured(f['bash_children'])}"
+        text = cmd.text.replace('\n', '\\n')
+        lines.append(f"{extra_cpu((cmd, f)) * 1000:+8.1f}ms cpu  wall {_ratio(f['minishell_wall'], f['bash_wall'])}  "
+                     f"rss {rss:<17}  children {children}  "
+                     f"cmd{cmd.id} [{cmd.kind}] {text[:50]}")
+    return lines
+
+
+def run_concurrently(bash: Bash, minishell: Minishell, cmd: Command, work_dir: Path,
+                     oracle: Optional[OracleCache] = None,
+                     deadlines: Optional[DeadlinePolicy] = None) -> Tuple[ShellResult, ShellResult]:
+    """``execute_pair`` that reads and fills the oracle cache for the Bash side."""
+    key = cached = None
+    if oracle is not None:
+        key, cached = oracle.lookup(bash, cmd, pair_workspaces(work_dir)[0])
+    bash_res, mini_res = execute_pair(bash, minishell, cmd, work_dir, bash_result=cached,
+                                      deadlines=deadlines)
+    if oracle is not None and cached is None:
+        oracle.store(key, bash_res)
+    return bash_res, mini_res
+
+
+def run_case(bash: Bash, minishell: Minishell, cmd: Command, work_dir: Path,
+             oracle: Optional[OracleCache] = None, deadlines: Optional[DeadlinePolicy] = None,
+             fixtures: Optional[FixtureSet] = None, concurrent: bool = False) -> Tuple[ShellResult, ShellResult]:
+    """Run ``cmd`` under both shells, each in its own copy of the case's fixture below ``work_dir``.
+
+    Bash goes first (or from the oracle cache) unless ``concurrent``; its
+    time sets Minishell's deadline either way. Cases that write outside
+    their workspace (``writes_outside``) run one shell after the other even
+    then, so the two shells never write the same file at the same time.
+    Interactive cases are played to both shells at once on
+    pseudo-terminals, without the cache.
+    """
+    if is_interactive(cmd):
+        return run_interactive(bash, minishell, [cmd], [work_dir], fixtures)[0]
+    if deadlines is None:
+        deadlines = DeadlinePolicy(cap=minishell.timeout)
+    bash_dir, mini_dir = pair_workspaces(work_dir)
+    for ws in (bash_dir, mini_dir):
+        ws.mkdir(parents=True, exist_ok=True)
+        if fixtures is not None:
+            fixtures.materialize(cmd, ws)
+    if concurrent and not writes_outside(cmd):
+        return run_concurrently(bash, minishell, cmd, work_dir, oracle, deadlines)
+    if oracle is not None:
+        bash_res = oracle.execute(bash, cmd, bash_dir, rebase=bash_dir.parent)
+    else:
+        bash_res = bash.execute(cmd, bash_dir, rebase=bash_dir.parent)
+    return bash_res, minishell.execute(cmd, mini_dir, timeout=deadlines.for_baseline(bash_res),
+                                       rebase=mini_dir.parent)
+
+
+def resolve_jobs(jobs: Optional[int]) -> int:
+    """Translate a ``--jobs`` value into a worker count (0 means one per CPU)."""
+    if jobs is None:
+        return 1
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+class _Worker:
+    """Per-thread state: a private scratch directory and binary copy."""
+
+    def __init__(self, root: Path, minishell_path: Path, timeout: int,
+                 oracle: Optional[OracleCache] = None, concurrent: bool = False,
+                 deadlines: Optional[DeadlinePolicy] = None, limits: Optional[CaptureLimits] = None,
+                 fixtures: Optional[FixtureSet] = None, normalizers: Optional[NormalizerSet] = None,
+                 measure: bool = False):
+        self.oracle = oracle
+        self.concurrent = concurrent
+        self.fixtures = fixtures
+        self.deadlines = deadlines or DeadlinePolicy(cap=timeout)
+        self.scratch = Path(tempfile.mkdtemp(prefix='worker_', dir=str(root)))
+        self.bash = Bash(timeout=timeout, limits=limits, normalizers=normalizers)
+        self.minishell = Minishell(minishell_path, timeout=timeout, limits=limits, normalizers=normalizers)
+        if measure:
+            self.bash.instrument()
+            self.minishell.instrument()
+        self.minishell.prepare_binary(self.scratch)
+        self.counter = 0
+
+    def run(self, cmd: Command) -> CaseOutcome:
+        if writes_outside(cmd):
+            with _OUTSIDE_LOCK:
+                return self._run(cmd)
+        return self._run(cmd)
+
+    def _run(self, cmd: Command) -> CaseOutcome:
+        self.counter += 1
+        work_dir = self.scratch / f'case_{self.counter}'
+        work_dir.mkdir()
+        try:
+            bash_res, mini_res = run_case(self.bash, self.minishell, cmd, work_dir, self.oracle, self.deadlines,
+                                          self.fixtures, self.concurrent)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return CaseOutcome(cmd, bash_res, mini_res)
+
+    def run_batch(self, cmds: List[Command]) -> List[CaseOutcome]:
+        """Run ``cmds`` through one session per shell.
+
+        Commands the sessions could not finish (a crash, a timeout) are re-run
+        one process each, as are all commands after them.
+        """
+        if len(cmds) == 1:
+            return [self.run(cmds[0])]
+        self.counter += 1
+        work_dir = self.scratch / f'batch_{self.counter}'
+        bash_dir, mini_dir = pair_workspaces(work_dir)
+        bash_dir.mkdir(parents=True)
+        mini_dir.mkdir(parents=True)
+        try:
+            keys, bash_results = [], []
+            for cmd in cmds:
+                key, cached = self.oracle.lookup(self.bash, cmd, bash_dir) if self.oracle else (None, None)
+                keys.append(key)
+                bash_results.append(cached)
+            missing = [i for i, res in enumerate(bash_results) if res is None]
+            fresh = run_in_session(self.bash, [cmds[i] for i in missing], bash_dir, rebase=bash_dir.parent)
+            for i, res in zip(missing, fresh):
+                if res is not None and self.oracle is not None:
+                    self.oracle.store(keys[i], res)
+                bash_results[i] = res
+            # Past a dead bash session the remaining deadlines no longer matter:
+            # those cases fall back to one process each anyway.
+            timeouts = [self.deadlines.for_baseline(res) for res in bash_results]
+            mini_results = run_in_session(self.minishell, cmds, mini_dir, timeouts, rebase=mini_dir.parent)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        outcomes = []
+        for cmd, bash_res, mini_res in zip(cmds, bash_results, mini_results):
+            if bash_res is None or mini_res is None:
+                outcomes.append(self.run(cmd))
+            else:
+                outcomes.append(CaseOutcome(cmd, bash_res, mini_res))
+        return outcomes
+
+
+def plan_batches(commands: List[Command], batch_size: int,
+                 fixtures: Optional[FixtureSet] = None) -> List[List[int]]:
+    """Group command indices into session batches.
+
+    Isolated commands, those with a fixture and those writing outside their workspace run alone.
+    """
+    if batch_size <= 1:
+        return [[i] for i in range(len(commands))]
+    tasks: List[List[int]] = []
+    current: List[int] = []
+    for i, cmd in enumerate(commands):
+        if (needs_isolation(cmd) or writes_outside(cmd)
+                or (fixtures is not None and fixtures.template_for(cmd) is not None)):
+            tasks.append([i])
+            continue
+        current.append(i)
+        if len(current) == batch_size:
+            tasks.append(current)
+            current = []
+    if current:
+        tasks.append(current)
+    return tasks
+
+
+def stream_batches(commands: Iterable[Command], batch_size: int,
+                   fixtures: Optional[FixtureSet] = None) -> Iterator[List[Command]]:
+    """``plan_batches`` over a stream: yields each batch as soon as it is full; interactive commands go alone."""
+    current: List[Command] = []
+    for cmd in commands:
+        if (batch_size <= 1 or is_interactive(cmd) or needs_isolation(cmd) or writes_outside(cmd)
+                or (fixtures is not None and fixtures.template_for(cmd) is not None)):
+            yield [cmd]
+            continue
+        current.append(cmd)
+        if len(current) == batch_size:
+            yield current
+            current = []
+    if current:
+        yield current
+
+
+class _PtyCases:
+    """Interactive cases played on a ``PtyDriver`` loop of their own, each in a fresh case directory."""
+
+    def __init__(self, scratch: Path, minishell_path: Path, timeout: int, limits: Optional[CaptureLimits],
+                 normalizers: Optional[NormalizerSet], fixtures: Optional[FixtureSet], max_sessions: int):
+        scratch.mkdir()
+        self.scratch = scratch
+        self.fixtures = fixtures
+        self.bash = Bash(timeout=timeout, limits=limits, normalizers=normalizers)
+        self.minishell = Minishell(minishell_path, timeout=timeout, limits=limits, normalizers=normalizers)
+        self.minishell.prepare_binary(scratch)
+        self.driver = PtyDriver(max_sessions).start()
+        self.counter = 0
+
+    def submit(self, cmd: Command) -> 'Future[Tuple[ShellResult, ShellResult]]':
+        self.counter += 1
+        return submit_case(self.driver, self.bash, self.minishell, cmd, self.scratch / f'case_{self.counter}',
+                           self.fixtures)
+
+    def close(self, cancel: bool = False) -> None:
+        self.driver.close(cancel)
+
+
+class ParallelRunner:
+    """Runs Commands over a pool of workers, returning outcomes in input order.
+
+    The work is almost entirely waiting on child processes, so a thread pool is
+    enough to keep every core busy. Each worker owns its own scratch directory
+    and its own copy of the Minishell binary, so cases never share state
+    there; cases that write outside it (``/tmp``, absolute redirections) run
+    one at a time across all workers (``writes_outside``). With ``session_batch`` > 1, commands that are safe to share a process are
+    fed to one long-lived shell per batch instead of one process per case.
+    Cases whose kind has a fixture template start from a copy of it, and
+    both shells' output goes through the normalizers of the case's kind.
+    Interactive cases (signals, heredocs) are played on pseudo-terminals
+    beside the pool, all from one loop. ``run`` takes a list and
+    returns outcomes in input order, ``iter_run`` yields them in that order
+    as soon as they are done, and ``stream`` consumes an iterable lazily
+    and yields outcomes in completion order.
+
+    Given ``durations`` (case key to recorded cost, see ``schedule.py``),
+    ``run`` dispatches the most expensive tasks first, pty cases included,
+    and either way leaves the makespan against the ideal in ``schedule``.
+    With ``measure``, piped runs also record peak RSS and child counts
+    (``Shell.instrument``).
+    """
+
+    # Per-thread worker type; a subclass can wrap how each case is run.
+    worker_class = _Worker
+
+    def __init__(self, minishell_path: Path, jobs: Optional[int] = 1, timeout: int = 5,
+                 scratch_root: Optional[Path] = None, oracle: Optional[OracleCache] = None,
+                 concurrent: bool = False, session_batch: int = 0,
+                 deadlines: Optional[DeadlinePolicy] = None, limits: Optional[CaptureLimits] = None,
+                 fixtures: Optional[FixtureSet] = None, normalizers: Optional[NormalizerSet] = None,
+                 durations: Optional[Dict[str, float]] = None, measure: bool = False):
+        self.minishell_path = Path(minishell_path)
+        self.jobs = resolve_jobs(jobs)
+        self.timeout = timeout
+        self.scratch_root = scratch_root
+        self.oracle = oracle
+        self.concurrent = concurrent
+        self.session_batch = session_batch
+        self.deadlines = deadlines or DeadlinePolicy(cap=timeout)
+        self.limits = limits
+        self.fixtures = fixtures
+        self.normalizers = normalizers
+        self.durations = durations
+        self.measure = measure
+        self.schedule: Optional[Schedule] = None
+        self._local = threading.local()
+
+    def _worker(self, root: Path) -> _Worker:
+        worker = getattr(self._local, 'worker', None)
+        if worker is None:
+            worker = self.worker_class(root, self.minishell_path, self.timeout, self.oracle, self.concurrent,
+                             self.deadlines, self.limits, self.fixtures, self.normalizers, self.measure)
+            self._local.worker = worker
+        return worker
+
+    def run(self, commands: Iterable[Command]) -> List[CaseOutcome]:
+        commands = list(commands)
+        outcomes: List[Optional[CaseOutcome]] = [None] * len(commands)
+        for i, outcome in self._completed(commands):
+            outcomes[i] = outcome
+        return outcomes
+
+    def iter_run(self, commands: Iterable[Command]) -> Iterator[CaseOutcome]:
+        """``run`` as a generator: outcomes in input order, each as soon as it and all before it are done."""
+        done: Dict[int, CaseOutcome] = {}
+        following = 0
+        for i, outcome in self._completed(list(commands)):
+            done[i] = outcome
+            while following in done:
+                yield done.pop(following)
+                following += 1
+
+    def _completed(self, commands: List[Command]) -> Iterator[Tuple[int, CaseOutcome]]:
+        """``(index, outcome)`` of every command, in completion order; sets ``schedule`` at the end."""
+        self.schedule = None
+        if not commands:
+            return
+        if not self.minishell_path.exists():
+            raise FileNotFoundError(f"Minishell binary not found at {self.minishell_path}")
+        root = Path(tempfile.mkdtemp(prefix='minishell_parallel_', dir=self.scratch_root))
+        # A fresh thread-local per run so stale workers from a previous run
+        # (whose scratch root is gone) are never reused.
+        self._local = threading.local()
+        interactive = [i for i, cmd in enumerate(commands) if is_interactive(cmd)]
+        piped = [i for i, cmd in enumerate(commands) if not is_interactive(cmd)]
+        schedule = Schedule(self.jobs, longest_first=bool(self.durations), cases=len(commands))
+        costs = None
+        if self.durations:
+            costs = estimate_costs(commands, self.durations)
+            # Stable sorts: cases of equal cost keep their input order.
+            interactive.sort(key=lambda i: -costs[commands[i]])
+            piped.sort(key=lambda i: -costs[commands[i]])
+        tasks = [[piped[j] for j in task]
+                 for task in plan_batches([commands[i] for i in piped], self.session_batch, self.fixtures)]
+        if costs is not None:
+            tasks.sort(key=lambda task: -sum(costs[commands[i]] for i in task))
+        elapsed: List[float] = []
+
+        def run_task(indices: List[int]) -> List[CaseOutcome]:
+            started = time.perf_counter()
+            try:
+                return self._worker(root).run_batch([commands[i] for i in indices])
+            finally:
+                elapsed.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        # Both queues are FIFO: tasks start in the order they are submitted.
+        pool = ThreadPoolExecutor(max_workers=self.jobs)
+        pty = self._pty(root) if interactive else None
+        try:
+            futures = {pool.submit(run_task, task): task for task in tasks}
+            played = {pty.submit(commands[i]): i for i in interactive}
+            for future in as_completed(list(futures) + list(played)):
+                if future in futures:
+                    yield from zip(futures[future], future.result())
+                    continue
+                bash_res, mini_res = future.result()
+                schedule.pty_work += max(bash_res.duration, mini_res.duration)
+                schedule.pty_longest = max(schedule.pty_longest, bash_res.duration, mini_res.duration)
+                yield played[future], CaseOutcome(commands[played[future]], bash_res, mini_res)
+        finally:
+            # Stopped early (an interrupt): drop the tasks that have not started.
+            pool.shutdown(wait=True, cancel_futures=True)
+            if pty is not None:
+                pty.close(cancel=True)
+            shutil.rmtree(root, ignore_errors=True)
+        schedule.makespan = time.perf_counter() - started
+        schedule.work = sum(elapsed)
+        schedule.longest = max(elapsed, default=0.0)
+        self.schedule = schedule
+
+    def stream(self, commands: Iterable[Command], queue_size: int = 0) -> Iterator[CaseOutcome]:
+        """Run ``commands`` as they are produced, yielding outcomes as they complete.
+
+        Only ``queue_size`` tasks (default: four per worker) are pulled ahead
+        of the workers, so a generator behind ``commands`` is advanced no
+        faster than cases finish and memory does not depend on how many it
+        produces. Interactive commands count against the same bound and play
+        on pseudo-terminals beside the pool as soon as they arrive.
+        """
+        if not self.minishell_path.exists():
+            raise FileNotFoundError(f"Minishell binary not found at {self.minishell_path}")
+        queue_size = queue_size or 4 * self.jobs
+        root = Path(tempfile.mkdtemp(prefix='minishell_stream_', dir=self.scratch_root))
+        self._local = threading.local()
+        pool = ThreadPoolExecutor(max_workers=self.jobs)
+        pty: Optional[_PtyCases] = None
+        # Each pending future and the commands it runs; a pty future yields one (bash, minishell) pair.
+        pending: Dict[Future, List[Command]] = {}
+        played = set()
+
+        def run_task(cmds: List[Command]) -> List[CaseOutcome]:
+            return self._worker(root).run_batch(cmds)
+
+        def outcomes(future: Future) -> List[CaseOutcome]:
+            cmds = pending.pop(future)
+            if future in played:
+                played.discard(future)
+                return [CaseOutcome(cmds[0], *future.result())]
+            return future.result()
+
+        try:
+            for task in stream_batches(commands, self.session_batch, self.fixtures):
+                if is_interactive(task[0]):
+                    pty = pty or self._pty(root)
+                    future = pty.submit(task[0])
+                    played.add(future)
+                else:
+                    future = pool.submit(run_task, task)
+                pending[future] = task
+                if len(pending) >= queue_size:
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from outcomes(future)
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from outcomes(future)
+        finally:
+            # Stopped early (an interrupt): drop what has not started.
+            pool.shutdown(wait=True, cancel_futures=True)
+            if pty is not None:
+                pty.close(cancel=True)
+            shutil.rmtree(root, ignore_errors=True)
+
+    def _pty(self, root: Path) -> '_PtyCases':
+        """A started pty loop for this run's interactive cases, two sessions per worker."""
+        return _PtyCases(root / 'pty', self.minishell_path, self.timeout, self.limits, self.normalizers,
+                         self.fixtures, max_sessions=2 * self.jobs)
@@ -0,0 +1,92 @@
+"""Peak RSS and CPU time of one shell run, measured by a small exec launcher.
+
+Linux carries a process's high-water RSS across exec, so ``ru_maxrss`` of
+a shell forked from the tester starts from the interpreter's own resident
+size: forked from a pytest session, ``/bin/true`` reports hundreds of MB.
+Sampling /proc instead misses most shells, which exit within milliseconds.
+Shells whose resources are measured (``Shell.instrument``) are therefore
+started through ``rusage_exec.c``, which forks them from a process of a
+few hundred KiB and reports what wait4 says about the shell (and the
+children it waited for) on a pipe; with ``-f`` it also counts the
+processes they fork, by tracing them. The extra process costs a
+millisecond or two per run and tracing stops the shell at every fork, so
+both are opt-in: other shells are spawned directly and only their CPU
+times, from ``os.wait4``, are known. The launcher is compiled once per
+source version into ``.cache/bin`` with the system C compiler (``$CC``,
+else ``cc``); without one ``launcher()`` is None and peak RSS and child
+counts stay unmeasured.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+SOURCE = Path(__file__).resolve().parent / 'rusage_exec.c'
+BIN_DIR = Path(__file__).resolve().parent.parent / '.cache' / 'bin'
+
+_lock = threading.Lock()
+# Path of the compiled launcher; '' once building it failed.
+_launcher: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class LaunchReport:
+    """What the launcher reported about the shell it ran."""
+    pid: int
+    max_rss: int
+    user_time: float
+    sys_time: float
+    # Processes forked by the shell and its descendants; None when untraced.
+    forks: Optional[int]
+
+    @classmethod
+    def parse(cls, data: bytes) -> Optional['LaunchReport']:
+        try:
+            pid, max_rss, user, system, forks = data.split()
+            # ru_maxrss is in KiB on Linux but in bytes on macOS.
+            return cls(int(pid), int(max_rss) // (1024 if sys.platform == 'darwin' else 1),
+                       float(user), float(system), int(forks) if int(forks) >= 0 else None)
+        except ValueError:
+            return None
+
+
+def _build() -> str:
+    source = SOURCE.read_bytes()
+    target = BIN_DIR / f'rusage_exec-{hashlib.sha256(source).hexdigest()[:12]}'
+    if os.access(target, os.X_OK):
+        return str(target)
+    compiler = os.environ.get('CC') or shutil.which('cc') or shutil.which('gcc') or shutil.which('clang')
+    if not compiler:
+        return ''
+    BIN_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(BIN_DIR), prefix='.rusage_exec')
+    os.close(fd)
+    try:
+        subprocess.run([compiler, '-O2', '-o', tmp, str(SOURCE)], check=True, timeout=120,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # Concurrent sessions may build it too; the rename is atomic either way.
+        os.replace(tmp, target)
+    except (OSError, subprocess.SubprocessError):
+        return ''
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return str(target)
+
+
+def launcher() -> Optional[str]:
+    """Path of the compiled launcher, built on first use; None when it cannot be built."""
+    global _launcher
+    with _lock:
+        if _launcher is None:
+            _launcher = _build()
+    return _launcher or None
@@ -0,0 +1,153 @@
+/*
+ * rusage_exec [-f] FD PROGRAM [ARG...]
+ *
+ * Runs PROGRAM as a child of this small process and writes to FD, once it
+ * is reaped, "PID MAXRSS UTIME STIME FORKS\n": its pid, the peak RSS and
+ * CPU times wait4 reports for it and the children it waited for, and with
+ * -f how many processes it and its descendants forked (-1 without -f or
+ * when they could not be traced). Forked from here rather than from the
+ * tester, PROGRAM's peak RSS does not start from the interpreter's. Forks
+ * are counted by tracing fork events only: every signal is passed on and
+ * job-control stops are kept, but each fork still costs the shell a stop.
+ * Exits with PROGRAM's status, or dies of its signal.
+ */
+#include <errno.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/resource.h>
+#include <sys/time.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+#include <unistd.h>
+#ifdef __linux__
+# include <sys/ptrace.h>
+#endif
+
+#ifdef __linux__
+
+static int	is_stop_signal(int sig)
+{
+	return sig == SIGSTOP || sig == SIGTSTP || sig == SIGTTIN || sig == SIGTTOU;
+}
+
+/* Seize the stopped child; 0 when tracing is not permitted here. */
+static int	seize(pid_t pid)
+{
+	long	options;
+
+	options = PTRACE_O_TRACEFORK | PTRACE_O_TRACEVFORK | PTRACE_O_TRACECLONE;
+	return ptrace(PTRACE_SEIZE, pid, 0, options) == 0;
+}
+
+/* Resume a traced process from whatever stop waitpid reported. */
+static void	resume(pid_t pid, int status, long *forks)
+{
+	int	event;
+	int	sig;
+
+	event = (unsigned)status >> 16;
+	sig = WSTOPSIG(status);
+	if (event == PTRACE_EVENT_FORK || event == PTRACE_EVENT_VFORK)
+		++*forks;
+	if (event == PTRACE_EVENT_STOP && is_stop_signal(sig))
+		ptrace(PTRACE_LISTEN, pid, 0, 0);
+	else
+		ptrace(PTRACE_CONT, pid, 0, (void *)(long)(event ? 0 : sig));
+}
+#endif
+
+int	main(int argc, char **argv)
+{
+	int				fd;
+	int				trace;
+	pid_t			pid;
+	pid_t			got;
+	int				status;
+	int				traced;
+	long			forks;
+	struct rusage	ru;
+	char			line[160];
+	int				len;
+
+	trace = argc > 1 && strcmp(argv[1], "-f") == 0;
+	argv += trace;
+	argc -= trace;
+	if (argc < 3)
+	{
+		fprintf(stderr, "usage: rusage_exec [-f] FD PROGRAM [ARG...]\n");
+		return 2;
+	}
+	fd = atoi(argv[1]);
+	pid = fork();
+	if (pid < 0)
+	{
+		perror("fork");
+		return 126;
+	}
+	if (pid == 0)
+	{
+		close(fd);
+#ifdef __linux__
+		/* Wait here until the parent has seized us. */
+		if (trace)
+			raise(SIGSTOP);
+#endif
+		execvp(argv[2], argv + 2);
+		fprintf(stderr, "%s: %s\n", argv[2], strerror(errno));
+		_exit(errno == ENOENT ? 127 : 126);
+	}
+	/* Only the child reads and writes the shell's streams. */
+	close(0);
+	close(1);
+	close(2);
+	traced = 0;
+	forks = 0;
+#ifdef __linux__
+	if (trace)
+	{
+		while (waitpid(pid, &status, WUNTRACED) < 0)
+			if (errno != EINTR)
+				return 126;
+		traced = seize(pid);
+		kill(pid, SIGCONT);
+	}
+#endif
+	for (;;)
+	{
+#ifdef __linux__
+		got = wait4(-1, &status, __WALL, &ru);
+#else
+		got = wait4(pid, &status, 0, &ru);
+#endif
+		if (got < 0)
+		{
+			if (errno == EINTR)
+				continue;
+			return 126;
+		}
+#ifdef __linux__
+		if (WIFSTOPPED(status))
+		{
+			if (traced)
+				resume(got, status, &forks);
+			continue;
+		}
+#endif
+		if (got == pid)
+			break;
+	}
+	len = snprintf(line, sizeof line, "%ld %ld %ld.%06ld %ld.%06ld %ld\n", (long)pid, (long)ru.ru_maxrss,
+			(long)ru.ru_utime.tv_sec, (long)ru.ru_utime.tv_usec,
+			(long)ru.ru_stime.tv_sec, (long)ru.ru_stime.tv_usec, traced ? forks : -1L);
+	if (write(fd, line, len) < 0)
+		return 126;
+	close(fd);
+	if (WIFSIGNALED(status))
+	{
+		signal(WTERMSIG(status), SIG_DFL);
+		kill(getpid(), WTERMSIG(status));
+	}
+	return WIFEXITED(status) ? WEXITSTATUS(status) : 126;
+}
@@ -0,0 +1,84 @@
+"""Expected case costs, longest-first ordering and the makespan of a run.
+
+Costs come from the results database (``ResultsDB.durations``): what a
+case took over its last runs, or its worst run if it timed out in one. A
+case without history costs the median of its kind, else of every known
+case. ``ParallelRunner.run`` dispatches the most expensive tasks first, so
+a few slow cases do not start last and hold the run open while the other
+workers idle, and records a ``Schedule`` comparing the makespan (the run's
+wall time) with the ideal for the work it did.
+"""
+
+from __future__ import annotations
+
+import statistics
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from .core import Command
+from .outcome_store import case_key
+from .results_db import ResultsDB
+
+
+def load_durations(path: Optional[Path]) -> Dict[str, float]:
+    """Recorded cost of each case key in the results database at ``path`` (empty if there is none)."""
+    if path is None or not Path(path).is_file():
+        return {}
+    db = ResultsDB(Path(path))
+    try:
+        return db.durations()
+    finally:
+        db.close()
+
+
+def estimate_costs(cmds: Sequence[Command], durations: Dict[str, float]) -> Dict[Command, float]:
+    """Recorded cost of each case, or the median of its kind's (else of all) recorded costs."""
+    known: Dict[str, List[float]] = {}
+    for cmd in cmds:
+        cost = durations.get(case_key(cmd))
+        if cost is not None:
+            known.setdefault(cmd.kind, []).append(cost)
+    every = [c for costs in known.values() for c in costs]
+    fallback = statistics.median(every) if every else 1.0
+    by_kind = {kind: statistics.median(costs) for kind, costs in known.items()}
+    return {cmd: durations.get(case_key(cmd), by_kind.get(cmd.kind, fallback)) for cmd in cmds}
+
+
+@dataclass
+class Schedule:
+    """Wall time of one or more runs against the best any order could do with the same work.
+
+    ``work`` is the summed wall time of the pool's tasks, ``pty_work`` that
+    of the interactive cases, which play beside the pool, two sessions per
+    worker. The ideal spreads each side perfectly over its workers, but is
+    never shorter than the side's longest task, and is the longer side.
+    """
+    workers: int
+    longest_first: bool = False
+    cases: int = 0
+    makespan: float = 0.0
+    work: float = 0.0
+    longest: float = 0.0
+    pty_work: float = 0.0
+    pty_longest: float = 0.0
+
+    @property
+    def ideal(self) -> float:
+        pool = max(self.work / self.workers, self.longest)
+        return max(pool, self.pty_work / (2 * self.workers), self.pty_longest)
+
+    def add(self, other: 'Schedule') -> None:
+        """Fold in a later run; the ideal stays that of all the work in one run."""
+        self.cases += other.cases
+        self.makespan += other.makespan
+        self.work += other.work
+        self.longest = max(self.longest, other.longest)
+        self.pty_work += other.pty_work
+        self.pty_longest = max(self.pty_longest, other.pty_longest)
+
+    def line(self) -> str:
+        over = f' (+{100 * (self.makespan / self.ideal - 1):.0f}%)' if self.ideal else ''
+        order = 'longest first' if self.longest_first else 'in input order'
+        return (f'makespan {self.makespan:.2f}s, ideal {self.ideal:.2f}s{over}: '
+                f'{self.cases} cases on {self.workers} workers, {order}')
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import os
+import re
+import secrets
+import selectors
+import subprocess
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from .core import Command, Shell, ShellResult, kill_process_group
+
+# Commands that change shell state, read stdin, touch the filesystem or span
+# several lines would leak into (or be eaten by) the next command of a
+# session; they always get a process of their own.
+_ISOLATE = re.compile(
+    r'''
+    \n                                                   # multi-line input
+    | [<>]                                               # redirection, heredoc
+    | \$_ | \$\$ | SHLVL                                 # per-process values
+    | (?:^|[\s;&|(])(?:\w+=)                             # assignment
+    | \b(?:exit|cd|export|unset|source|exec|alias|unalias|set|shopt|trap|
+           ulimit|umask|readonly|declare|local|typeset|history|kill|wait|
+           cat|read|head|tail|wc|grep|sort|uniq|rev|tr|sed|awk|tee|more|less|
+           cut|xargs|od|hexdump|base64|bash|sh|minishell|
+           touch|rm|mkdir|rmdir|mv|cp|ln|chmod)\b
+    | (?:^|[\s;&|(])\.\s                                 # ". file"
+    ''',
+    re.VERBOSE,
+)
+
+
+def needs_isolation(cmd: Command) -> bool:
+    """True when ``cmd`` must not share a process with other commands."""
+    return bool(_ISOLATE.search(cmd.text))
+
+
+class ShellSession:
+    """One long-lived shell process that runs commands one at a time.
+
+    After each command the session prints a unique marker followed by ``$?``
+    on stdout and a second marker on stderr, which splits the streams back
+    into per-command results. A command that kills the shell, eats the
+    markers, overruns ``timeout`` or prints more than the shell's byte cap
+    ends the session; ``run`` then returns None for it and for every later
+    command. ``rebase`` is replaced by ``ROOT_PLACEHOLDER`` in the output.
+    """
+
+    def __init__(self, shell: Shell, cwd: Path, timeout: Optional[float] = None,
+                 rebase: Optional[Path] = None):
+        self.shell = shell
+        self.timeout = shell.timeout if timeout is None else timeout
+        self.rebase = rebase
+        self._prefix = f'__MSH_{secrets.token_hex(4)}_'
+        self._count = 0
+        self._out = bytearray()
+        self._err = bytearray()
+        self.proc = subprocess.Popen(
+            shell.session_args(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=str(cwd),
+            env=shell.environment(),
+            bufsize=0,
+            start_new_session=True,
+        )
+        self._sel = selectors.DefaultSelector()
+        self._sel.register(self.proc.stdout, selectors.EVENT_READ, self._out)
+        self._sel.register(self.proc.stderr, selectors.EVENT_READ, self._err)
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None
+
+    def run(self, cmd: Command, timeout: Optional[float] = None) -> Optional[ShellResult]:
+        if not self.alive:
+            return None
+        self._count += 1
+        mark = f'{self._prefix}{self._count}__'
+        script = (f"{self.shell.session_line(cmd.text)}\n"
+                  f"printf '{mark}:%d\\n' $?\n"
+                  f"printf '{mark}\\n' > /dev/stderr\n")
+        try:
+            self.proc.stdin.write(script.encode('utf-8', errors='replace'))
+        except OSError:
+            self.close()
+            return None
+
+        out_mark = f'{mark}:'.encode()
+        err_mark = f'{mark}\n'.encode()
+        status = stdout = stderr = None
+        start = time.monotonic()
+        deadline = start + (self.timeout if timeout is None else timeout)
+        while stdout is None or stderr is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.close()
+                return None
+            for key, _ in self._sel.select(remaining):
+                chunk = os.read(key.fd, 65536)
+                if not chunk:
+                    self.close()
+                    return None
+                key.data.extend(chunk)
+                if len(key.data) > self.shell.limits.max_bytes + len(out_mark) + 16:
+                    # Too big to split here; the single-process rerun caps it properly.
+                    self.close()
+                    return None
+            if stdout is None:
+                i = self._out.find(out_mark)
+                j = self._out.find(b'\n', i) if i >= 0 else -1
+                if j >= 0:
+                    try:
+                        status = int(self._out[i + len(out_mark):j])
+                    except ValueError:
+                        self.close()
+                        return None
+                    stdout = bytes(self._out[:i])
+                    del self._out[:j + 1]
+            if stderr is None:
+                i = self._err.find(err_mark)
+                if i >= 0:
+                    stderr = bytes(self._err[:i])
+                    del self._err[:i + len(err_mark)]
+        out, err = self.shell.captures(cmd, self.rebase)
+        out.feed(stdout)
+        err.feed(stderr)
+        return self.shell.result(status, out, err, False, time.monotonic() - start)
+
+    def close(self) -> None:
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        self._sel.close()
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        kill_process_group(proc.pid)
+        proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+    def __enter__(self) -> 'ShellSession':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def run_in_session(shell: Shell, cmds: List[Command], cwd: Path,
+                   timeouts: Optional[List[float]] = None,
+                   rebase: Optional[Path] = None) -> List[Optional[ShellResult]]:
+    """Run ``cmds`` through one session; entries after a session death are None.
+
+    ``timeouts`` optionally gives each command its own deadline.
+    """
+    results: List[Optional[ShellResult]] = []
+    with ShellSession(shell, cwd, rebase=rebase) as session:
+        for i, cmd in enumerate(cmds):
+            results.append(session.run(cmd, timeouts[i] if timeouts else None))
+    return results
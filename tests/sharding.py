@@ -0,0 +1,108 @@
+"""Splitting the selected cases into N shards for N machines.
+
+A case goes to shard ``hash % N``, where the hash is its case key (kind
+and text, not the row id): every machine computes the same split without
+coordination, and a case stays in its shard when rows move. Only when a
+results database is named explicitly (``--shard-durations``) are cases
+bin-packed instead, longest first onto the least-loaded shard (LPT), so
+shards finish at about the same time; costs are estimated as in
+``schedule.py``. Each machine's own ``.cache/results.sqlite`` is never used
+for this: local histories differ, and so would the plans, running some
+cases twice and others nowhere. Every machine must be given the same file.
+Each plan has a fingerprint, written at the top of the shard's failure log
+(``header``) and in the ``plan`` column of its map CSV;
+``scripts/merge_shards.py`` refuses shards whose fingerprints differ.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import heapq
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .core import Command
+from .outcome_store import case_key
+from .schedule import estimate_costs, load_durations
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """``'I/N'`` (1-based, as on the command line) as ``(I - 1, N)``."""
+    try:
+        i, n = (int(x) for x in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected I/N, got {text!r}') from None
+    if not 1 <= i <= n:
+        raise argparse.ArgumentTypeError(f'shard {i} is not in 1..{n}')
+    return i - 1, n
+
+
+def durations_file(text: str) -> Path:
+    """``--shard-durations``: a results database that must exist, so no machine silently falls back to hashing."""
+    path = Path(text)
+    if not path.is_file():
+        raise argparse.ArgumentTypeError(f'no results database at {text}')
+    return path
+
+
+def stable_shard(cmd: Command, shards: int) -> int:
+    return int(case_key(cmd)[:16], 16) % shards
+
+
+class ShardPlan:
+    """Which of ``shards`` shards each case runs in.
+
+    ``balanced`` is set when ``durations`` knew at least one of the cases;
+    ``loads`` is then the estimated seconds of work per shard.
+    """
+
+    def __init__(self, cmds: Sequence[Command], shards: int, durations: Optional[Dict[str, float]] = None):
+        self.shards = shards
+        self.total = len(cmds)
+        self.assignment: Dict[Command, int] = {}
+        self.loads: List[float] = [0.0] * shards
+        self.balanced = bool(durations) and any(case_key(c) in durations for c in cmds)
+        if not self.balanced:
+            self.assignment = {cmd: stable_shard(cmd, shards) for cmd in cmds}
+            return
+        costs = estimate_costs(cmds, durations)
+        # Ties broken by case key and id, so every machine packs the same way.
+        order = sorted(cmds, key=lambda c: (-costs[c], case_key(c), c.id))
+        heap = [(0.0, i) for i in range(shards)]
+        for cmd in order:
+            load, i = heapq.heappop(heap)
+            self.assignment[cmd] = i
+            self.loads[i] = load + costs[cmd]
+            heapq.heappush(heap, (self.loads[i], i))
+
+    def select(self, cmds: Sequence[Command], shard: int) -> List[Command]:
+        """The cases of ``cmds`` in ``shard``, in their original order."""
+        return [cmd for cmd in cmds if self.assignment[cmd] == shard]
+
+    def fingerprint(self) -> str:
+        h = hashlib.sha256()
+        for key, shard in sorted((f'{case_key(c)}:{c.id}', s) for c, s in self.assignment.items()):
+            h.update(f'{key}={shard}\n'.encode())
+        return h.hexdigest()[:12]
+
+    def describe(self, shard: int) -> str:
+        mine = sum(1 for s in self.assignment.values() if s == shard)
+        line = f'shard {shard + 1}/{self.shards}: {mine} of {self.total} cases'
+        if self.balanced:
+            line += (f', ~{self.loads[shard]:.1f}s of ~{sum(self.loads):.1f}s estimated work '
+                     f'(balanced on recorded durations)')
+        else:
+            line += ' (by stable hash)'
+        return f'{line}, plan {self.fingerprint()}'
+
+    def header(self, shard: int) -> str:
+        """First line of the shard's failure log; outside every report, so log readers skip it."""
+        return f'# {self.describe(shard)}\n'
+
+
+def select_shard(cmds: Sequence[Command], shard: int, shards: int,
+                 durations: Optional[Path] = None) -> Tuple[List[Command], ShardPlan]:
+    """The cases of ``cmds`` in ``shard``: by stable hash, or balanced on the results database ``durations`` if given."""
+    plan = ShardPlan(cmds, shards, load_durations(durations))
+    return plan.select(cmds, shard), plan
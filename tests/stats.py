@@ -0,0 +1,134 @@
+"""Summary statistics for the benchmarks.
+
+Timings are skewed and few, so everything here is distribution-free:
+interpolated percentiles, percentile-bootstrap confidence intervals and
+the Mann-Whitney U test, with Holm's correction for many comparisons.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Sequence, Tuple
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_RESAMPLES = 2000
+# Up to this many values per side (and without ties) p-values are exact.
+EXACT_MANN_WHITNEY = 30
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """``q``-th percentile (0-100) of ``values``, interpolating between closest ranks."""
+    xs = sorted(values)
+    if not xs:
+        raise ValueError('percentile of an empty sample')
+    pos = (len(xs) - 1) * q / 100
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (pos - lo)
+
+
+def median(values: Sequence[float]) -> float:
+    return percentile(values, 50)
+
+
+def bootstrap_ci(values: Sequence[float], stat: Callable[[Sequence[float]], float] = median,
+                 confidence: float = DEFAULT_CONFIDENCE, resamples: int = DEFAULT_RESAMPLES,
+                 seed: int = 0) -> Tuple[float, float]:
+    """Percentile-bootstrap confidence interval of ``stat`` over ``values``."""
+    values = list(values)
+    if len(values) < 2:
+        point = stat(values)
+        return point, point
+    rng = random.Random(seed)
+    estimates = [stat(rng.choices(values, k=len(values))) for _ in range(resamples)]
+    tail = (1 - confidence) / 2 * 100
+    return percentile(estimates, tail), percentile(estimates, 100 - tail)
+
+
+@dataclass(frozen=True)
+class Summary:
+    """Median with its confidence interval, plus the tail percentiles."""
+    n: int
+    median: float
+    ci_low: float
+    ci_high: float
+    p90: float
+    p99: float
+
+
+def summarize(values: Sequence[float], confidence: float = DEFAULT_CONFIDENCE) -> Summary:
+    low, high = bootstrap_ci(values, median, confidence)
+    return Summary(len(values), median(values), low, high, percentile(values, 90), percentile(values, 99))
+
+
+def _ranks(values: Sequence[float]) -> Tuple[List[float], List[int]]:
+    """Average ranks (1-based) of ``values``, and the sizes of their tie groups."""
+    order = sorted(range(len(values)), key=values.__getitem__)
+    ranks = [0.0] * len(values)
+    ties = []
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        ties.append(j - i + 1)
+        i = j + 1
+    return ranks, ties
+
+
+def _u_distribution(n1: int, n2: int) -> List[int]:
+    """How many arrangements of ``n1`` + ``n2`` distinct values give each U."""
+    table: Dict[Tuple[int, int], List[int]] = {}
+    for i in range(n1 + 1):
+        for j in range(n2 + 1):
+            if i == 0 or j == 0:
+                table[i, j] = [1]
+                continue
+            # The largest value is either one of the i (it beats all j) or one of the j.
+            with_a, with_b = table[i - 1, j], table[i, j - 1]
+            counts = [0] * (i * j + 1)
+            for u, c in enumerate(with_a):
+                counts[u + j] += c
+            for u, c in enumerate(with_b):
+                counts[u] += c
+            table[i, j] = counts
+    return table[n1, n2]
+
+
+def mann_whitney_u(a: Sequence[float], b: Sequence[float]) -> Tuple[float, float]:
+    """U statistic of ``a`` against ``b`` and its two-sided p-value.
+
+    Exact for small samples without ties, otherwise the normal
+    approximation with tie and continuity corrections.
+    """
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        raise ValueError('Mann-Whitney U needs two non-empty samples')
+    ranks, ties = _ranks(list(a) + list(b))
+    u = sum(ranks[:n1]) - n1 * (n1 + 1) / 2
+    extreme = min(u, n1 * n2 - u)
+    if max(ties) == 1 and n1 <= EXACT_MANN_WHITNEY and n2 <= EXACT_MANN_WHITNEY:
+        counts = _u_distribution(n1, n2)
+        tail = sum(counts[:int(extreme) + 1]) / sum(counts)
+        return u, min(1.0, 2 * tail)
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - sum(t ** 3 - t for t in ties) / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return u, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+
+def holm(pvalues: Sequence[float]) -> List[float]:
+    """Holm-Bonferroni adjusted p-values, in the order given."""
+    order = sorted(range(len(pvalues)), key=pvalues.__getitem__)
+    adjusted = [0.0] * len(pvalues)
+    running = 0.0
+    for rank, i in enumerate(order):
+        running = max(running, min(1.0, (len(pvalues) - rank) * pvalues[i]))
+        adjusted[i] = running
+    return adjusted
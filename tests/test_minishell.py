@@ -1,25 +1,101 @@
 import pytest
 from pathlib import Path
 import os
-from .core import Bash, Minishell, CaseLoader, Command, DiffGenerator, ShellResult
+import re
+from .core import Bash, Minishell, CaseLoader, Command, DeadlinePolicy, DiffGenerator, ShellResult
+from .fixtures import FixtureSet
+from .oracle_cache import OracleCache
+from .outcome_store import OutcomeStore, binary_fingerprint
+from .results_db import ResultsDB
+from .runner import ParallelRunner, resource_fields, run_case
 
 
 # Constants
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 MINISHELL_PATH = PROJECT_ROOT / "minishell"
+ORACLE_CACHE_DIR = Path(__file__).resolve().parent.parent / ".cache" / "oracle"
+OUTCOME_STORE = Path(__file__).resolve().parent.parent / ".cache" / "outcomes.sqlite"
+RESULTS_DB = Path(__file__).resolve().parent.parent / ".cache" / "results.sqlite"
 
 
 @pytest.fixture(scope="session")
-def bash_shell():
-    return Bash()
+def bash_shell(capture_limits, normalizer_set, measure_resources):
+    shell = Bash(limits=capture_limits, normalizers=normalizer_set)
+    return shell.instrument() if measure_resources else shell
 
 
 @pytest.fixture(scope="session")
-def minishell_binary(tmp_path_factory):
+def minishell_binary(tmp_path_factory, capture_limits, normalizer_set, measure_resources):
     bin_dir = tmp_path_factory.mktemp("bin")
-    shell = Minishell(MINISHELL_PATH)
+    shell = Minishell(MINISHELL_PATH, limits=capture_limits, normalizers=normalizer_set)
     shell.prepare_binary(bin_dir)
-    return shell
+    return shell.instrument() if measure_resources else shell
+
+
+@pytest.fixture(scope="session")
+def oracle_cache(request, oracle_caches):
+    """Cached bash results, unless disabled with ``--no-oracle-cache``."""
+    if request.config.getoption("no_oracle_cache"):
+        return None
+    cache = OracleCache(ORACLE_CACHE_DIR, refresh=request.config.getoption("refresh_oracle"))
+    oracle_caches.append(cache)
+    return cache
+
+
+@pytest.fixture(scope="session")
+def outcome_store():
+    """Recorded verdicts, written back when the session ends."""
+    store = OutcomeStore(OUTCOME_STORE)
+    yield store
+    store.save()
+    store.close()
+
+
+@pytest.fixture(scope="session")
+def binary_hash():
+    return binary_fingerprint(MINISHELL_PATH)
+
+
+@pytest.fixture(scope="session")
+def results_db(request, binary_hash, bash_shell):
+    """This session as a run in the results database, unless ``--no-results-db``."""
+    if request.config.getoption("no_results_db"):
+        yield None
+        return
+    db = ResultsDB(RESULTS_DB)
+    db.begin_run("pytest", binary_hash, bash_shell.version, request.config.invocation_params.args)
+    yield db
+    db.close()
+
+
+@pytest.fixture(scope="session")
+def parallel_outcomes(request, oracle_cache, outcome_store, binary_hash, deadline_policy, capture_limits,
+                      fixture_set, normalizer_set, case_durations, schedules, measure_resources):
+    """Run every collected case up front for ``--jobs`` or ``--session-batch``.
+
+    Cases run longest first when durations are recorded; tests then only
+    look up their outcome, so reporting and the log keep the serial order.
+    Returns None for a plain serial run.
+    """
+    jobs = request.config.getoption("jobs")
+    session_batch = request.config.getoption("session_batch")
+    if jobs == 1 and session_batch <= 1:
+        return None
+    cmds = [item.callspec.params["cmd"] for item in request.session.items
+            if hasattr(item, "callspec") and "cmd" in item.callspec.params]
+    if request.config.getoption("incremental"):
+        cmds = [c for c in cmds
+                if outcome_store.get(OutcomeStore.key(binary_hash, c, fixture_set.fingerprint(c),
+                                                      normalizer_set.fingerprint(c))) is None]
+    runner = ParallelRunner(MINISHELL_PATH, jobs=jobs, oracle=oracle_cache,
+                            concurrent=request.config.getoption("concurrent"),
+                            session_batch=session_batch, deadlines=deadline_policy, limits=capture_limits,
+                            fixtures=fixture_set, normalizers=normalizer_set, durations=case_durations,
+                            measure=measure_resources)
+    outcomes = {outcome.cmd: outcome for outcome in runner.run(cmds)}
+    if runner.schedule is not None:
+        schedules.append(runner.schedule)
+    return outcomes
 
 
 def pytest_generate_tests(metafunc):
@@ -42,41 +118,69 @@ def pytest_generate_tests(metafunc):
         TEST_CSV = os.path.join(PACKAGE_DIR, 'cases', 'minishell_tests.csv')
         kind_filter = os.environ.get('TEST_KIND', None)
         loader = CaseLoader(Path(TEST_CSV))
-        tests = loader.load()
-        if kind_filter:
-            tests = [t for t in tests if t.kind == kind_filter]
-        metafunc.parametrize("cmd", tests)
+        ids = keyword_ids(metafunc.config.getoption("keyword"), loader)
+        tests = list(loader.select(kinds=[kind_filter] if kind_filter else None, ids=ids))
+        metafunc.parametrize("cmd", tests, ids=[f"cmd{t.id}" for t in tests])
+
+
+def keyword_ids(keyword: str, loader: CaseLoader):
+    """Ids a ``-k cmd7 or cmd12`` expression can match, or None for anything else.
+
+    pytest still applies the expression itself; this only lets collection
+    skip rows that cannot possibly match (``cmd7`` also matches ``cmd70``).
+    """
+    terms = [t for t in re.split(r"\s+or\s+", (keyword or "").strip().lower()) if t]
+    if not terms or not all(re.fullmatch(r"cmd\d+", t) for t in terms):
+        return None
+    return {i for i in loader.ids() if any(t in f"cmd{i}" for t in terms)}
 
 
 class TestMinishellSuite:
-    def fail_with_report(self, cmd: Command, bash_res: ShellResult, mini_res: ShellResult):
-        diff = DiffGenerator.unified_diff(bash_res.stdout, mini_res.stdout)
-        report = [
-            f"\n{'='*40}",
-            f"FAIL: Command ID {cmd.id} [{cmd.kind}]",
-            f"INPUT: {cmd.text}",
-            f"{'-'*40}",
-            f"Bash Exit: {bash_res.exit_code} | Minishell Exit: {mini_res.exit_code}",
-            f"{'-'*40}",
-            "STDOUT DIFF:",
-            diff,
-            f"{'='*40}"
-        ]
-        if bash_res.stderr or mini_res.stderr:
-            report.append(f"Bash Stderr: {bash_res.stderr.strip()}")
-            report.append(f"Mini Stderr: {mini_res.stderr.strip()}")
+    def log_failure(self, report: str):
         # Log to file
         import os
         log_path = os.path.join(os.path.dirname(__file__), '..', 'logs', 'test.log')
         with open(log_path, 'a') as f:
-            f.write("\n".join(report) + "\n")
-        pytest.fail("\n".join(report), pytrace=False)
+            f.write(report + "\n")
+        pytest.fail(report, pytrace=False)
+
+    def fail_with_report(self, cmd: Command, bash_res: ShellResult, mini_res: ShellResult):
+        self.log_failure(DiffGenerator.report(cmd, bash_res, mini_res))
 
-    def run_comparison(self, cmd: Command, bash: Bash, minishell: Minishell, work_dir: Path):
-        bash_res = bash.execute(cmd, work_dir)
-        mini_res = minishell.execute(cmd, work_dir)
-        if bash_res != mini_res:
-            self.fail_with_report(cmd, bash_res, mini_res)
+    def run_comparison(self, cmd: Command, bash: Bash, minishell: Minishell, work_dir: Path,
+                       oracle: OracleCache = None, concurrent: bool = False,
+                       deadlines: DeadlinePolicy = None, fixtures: FixtureSet = None):
+        return run_case(bash, minishell, cmd, work_dir, oracle, deadlines, fixtures, concurrent)
 
-    def test_command_execution(self, cmd: Command, bash_shell: Bash, minishell_binary: Minishell, tmp_path: Path):
-        self.run_comparison(cmd, bash_shell, minishell_binary, tmp_path)
+    def test_command_execution(self, cmd: Command, bash_shell: Bash, minishell_binary: Minishell,
+                               oracle_cache, parallel_outcomes, outcome_store, binary_hash,
+                               deadline_policy, results_db, resource_rows, record_property, fixture_set,
+                               normalizer_set, request, tmp_path: Path):
+        key = OutcomeStore.key(binary_hash, cmd, fixture_set.fingerprint(cmd), normalizer_set.fingerprint(cmd))
+        if request.config.getoption("incremental"):
+            recorded = outcome_store.get(key)
+            if recorded is not None:
+                if results_db is not None:
+                    results_db.record(cmd, recorded["passed"], bash_exit=recorded["bash_exit"],
+                                      minishell_exit=recorded["minishell_exit"])
+                if not recorded["passed"]:
+                    self.log_failure(recorded["report"])
+                return
+        if parallel_outcomes is not None:
+            outcome = parallel_outcomes[cmd]
+            bash_res, mini_res = outcome.bash, outcome.minishell
+        else:
+            bash_res, mini_res = self.run_comparison(cmd, bash_shell, minishell_binary, tmp_path, oracle_cache,
+                                                     request.config.getoption("concurrent"), deadline_policy,
+                                                     fixture_set)
+        passed = bash_res == mini_res
+        resources = resource_fields(bash_res, mini_res)
+        for name, value in resources.items():
+            record_property(name, value)
+        resource_rows.append((cmd, resources))
+        report = "" if passed else DiffGenerator.report(cmd, bash_res, mini_res)
+        outcome_store.record(key, cmd, passed, report, bash_res.exit_code, mini_res.exit_code, binary_hash)
+        if results_db is not None:
+            results_db.record(cmd, passed, bash_res, mini_res)
+        if not passed:
+            self.log_failure(report)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""Compile case CSVs into binary packs (``<csv>.pack``) for fast collection.
+
+Packs are rebuilt on demand whenever their CSV changes, so running this is
+optional; it just moves the one-off compile cost out of the first test run.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+import sys
+
+from minishell_tester import TEST_CSV
+from minishell_tester.tests.core import CaseLoader
+
+
+def compile_cases(paths, force: bool = False) -> int:
+    for path in paths:
+        loader = CaseLoader(path)
+        if not path.is_file():
+            print(f'{path}: no such file', file=sys.stderr)
+            return 2
+        pack = loader.compile(force=force)
+        size = loader.pack_path.stat().st_size if loader.pack_path.exists() else 0
+        print(f'{loader.pack_path}: {len(pack)} cases, {len(pack.kinds)} kinds, {size} bytes')
+    return 0
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('csv', nargs='*', help='CSV files to compile (default: every CSV in cases/)')
+    p.add_argument('--force', action='store_true', help='rebuild even when the pack is up to date')
+    args = p.parse_args()
+
+    paths = [Path(c) for c in args.csv] or sorted(Path(TEST_CSV).parent.glob('*.csv'))
+    sys.exit(compile_cases(paths, force=args.force))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""Coverage-guided command generation.
+
+Instead of drawing every command afresh from ``test_generator``, the fuzzer
+keeps a corpus of seeds (commands that reached something no earlier
+command did) and derives most new commands from them: replacing, splicing,
+inserting or dropping pipeline parts, changing operators, grouping parts in
+subshells, adding redirections and crossing two seeds. Seeds that found
+more are picked more often, and mutations that pay off are used more.
+
+Feedback comes from gcov when Minishell was built with ``--coverage``: each
+worker points ``GCOV_PREFIX`` at a private directory, and the arcs a case
+takes there (by hit-count class) are its features. Whether or not coverage
+is available, the mismatch signature of a failing case (exit codes, stdout,
+the shape of Minishell's first stderr line, with the command's own words
+masked) and the shape of Bash's error are features too, so inputs reaching
+new error paths or new kinds of mismatch count as new. The first case of
+each signature is written to the failure log; ``--random`` turns the
+feedback off, as a baseline for signatures per CPU-hour.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import csv
+import itertools
+import os
+import random
+import re
+import struct
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterator, List, Optional, Set, Tuple
+
+from minishell_tester import (GENERATED_DIR, MINISHELL, NORMALIZERS, ORACLE_CACHE_DIR, TEST_LOG, TEST_TIMEOUT,
+                              TEST_TIMEOUT_FLOOR, TEST_TIMEOUT_MULTIPLIER)
+from minishell_tester.tests.core import CaseLoader, Command, DeadlinePolicy, DiffGenerator
+from minishell_tester.tests.fixtures import FixtureSet, FixtureTemplate
+from minishell_tester.tests.normalize import NormalizerSet
+from minishell_tester.tests.oracle_cache import OracleCache
+from minishell_tester.tests.runner import CaseOutcome, ParallelRunner, _Worker
+from minishell_tester.tools.test_generator import attach_redirection, gen_command, gen_simple_command, make_sample_files
+
+# Kind of every candidate; its cases start from a copy of the sample files.
+GENERATED_KIND = 'generated'
+OPERATORS = ('|', '&&', '||', ';')
+REDIRECTIONS = ('>', '>>', '2>', '2>>', '<')
+# Share of candidates generated from scratch rather than mutated from a seed.
+FRESH_RATE = 0.25
+MAX_MUTATIONS = 3
+MAX_PARTS = 12
+# Pipeline parts of seeds kept for splicing.
+MAX_FRAGMENTS = 5000
+# Fresh attempts at a candidate that has not run before.
+MAX_RETRIES = 10
+PROGRESS_INTERVAL = 5.0
+
+_SPLIT = re.compile(r' (\|\||&&|\||;) ')
+_QUOTED = re.compile(r"'[^']*'|\"[^\"]*\"|`[^']*'")
+_NUMBER = re.compile(r'\d+')
+_WORD_BREAK = re.compile(r'[\s|&;<>()"\']+')
+
+_GCDA_MAGIC = 0x67636461
+_TAG_FUNCTION = 0x01000000
+_TAG_ARCS = 0x01a10000
+
+
+def _hit_class(count: int) -> int:
+    """Hit-count class (1, 2, 3, 4-7, 8-15, ... 128+), so a loop running more often is new behaviour."""
+    return count if count <= 3 else min(count.bit_length() + 1, 9)
+
+
+def read_gcda(path: Path) -> Iterator[Tuple[int, int, int]]:
+    """``(function ident, arc index, hit-count class)`` for every arc a .gcda file records as taken."""
+    data = path.read_bytes()
+    if len(data) < 12:
+        return
+    for order in '<>':
+        if struct.unpack_from(order + 'I', data)[0] == _GCDA_MAGIC:
+            break
+    else:
+        return
+    version = struct.unpack_from(order + 'I', data, 4)[0].to_bytes(4, 'big')
+    major = ((version[0] - ord('A')) * 10 + version[1] - ord('0') if version[0] >= ord('A')
+             else version[0] - ord('0'))
+    # GCC 12 added a checksum to the header and counts record lengths in bytes instead of words.
+    unit, pos = (1, 16) if major >= 12 else (4, 12)
+    ident = None
+    while pos + 8 <= len(data):
+        tag, length = struct.unpack_from(order + 'Ii', data, pos)
+        pos += 8
+        if length < 0:
+            # Counters that are all zero are stored as their negated length alone.
+            continue
+        size = length * unit
+        if tag == _TAG_FUNCTION and size >= 4:
+            ident = struct.unpack_from(order + 'I', data, pos)[0]
+        elif tag == _TAG_ARCS and ident is not None:
+            for i, (lo, hi) in enumerate(struct.iter_unpack(order + 'II', data[pos:pos + size - size % 8])):
+                if lo or hi:
+                    yield ident, i, _hit_class(lo | hi << 32)
+        pos += size
+
+
+@dataclass
+class CoveredOutcome(CaseOutcome):
+    """A CaseOutcome with the coverage features Minishell produced."""
+    features: FrozenSet[int] = frozenset()
+
+
+class _CoverageWorker(_Worker):
+    """Sends Minishell's gcov output to a private directory and reads it back after every case."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gcov_dir = self.scratch / 'gcov'
+        self.minishell.env = dict(os.environ, GCOV_PREFIX=str(self.gcov_dir))
+
+    def run(self, cmd: Command) -> CoveredOutcome:
+        outcome = super().run(cmd)
+        features = set()
+        for path in self.gcov_dir.rglob('*.gcda'):
+            key = str(path.relative_to(self.gcov_dir))
+            features.update(hash((key,) + arc) for arc in read_gcda(path))
+            path.unlink()
+        return CoveredOutcome(outcome.cmd, outcome.bash, outcome.minishell, frozenset(features))
+
+
+class CoverageRunner(ParallelRunner):
+    """ParallelRunner whose outcomes carry Minishell's gcov features (one process per case)."""
+    worker_class = _CoverageWorker
+
+
+def _words(text: str) -> Set[str]:
+    return set(_WORD_BREAK.split(text)) - {''}
+
+
+def _shape(text: str, words: Set[str]) -> str:
+    """First line of ``text`` with quotes, numbers and the command's own words masked."""
+    line = _QUOTED.sub('Q', text.strip().split('\n', 1)[0])
+    line = ' '.join('W' + tok[len(tok.rstrip(':')):] if tok.rstrip(':') in words else tok
+                    for tok in line.split(' '))
+    return _NUMBER.sub('N', line)
+
+
+def mismatch_signature(outcome: CaseOutcome) -> Optional[str]:
+    """What differs between the shells on a failing case (None when it passed)."""
+    if outcome.passed:
+        return None
+    bash, mini = outcome.bash, outcome.minishell
+    parts = []
+    if bash.exit_code != mini.exit_code:
+        parts.append(f'exit {bash.exit_code}/{mini.exit_code}')
+    if (bash.stdout_length, bash.stdout_digest) != (mini.stdout_length, mini.stdout_digest):
+        parts.append('stdout')
+    if mini.timed_out:
+        parts.append('timeout')
+    parts.append(f'stderr {_shape(mini.stderr, _words(outcome.cmd.text))!r}')
+    return ' '.join(parts)
+
+
+def signal_features(outcome: CaseOutcome, signature: Optional[str]) -> Set[int]:
+    """Features that need no coverage: Bash's error shape and the mismatch signature."""
+    words = _words(outcome.cmd.text)
+    features = {hash(('bash', outcome.bash.exit_code, _shape(outcome.bash.stderr, words)))}
+    if signature is not None:
+        features.add(hash(('mismatch', signature)))
+    return features
+
+
+@dataclass
+class Seed:
+    text: str
+    found: int
+    picks: int = 0
+
+
+@dataclass
+class _Mutation:
+    uses: int = 0
+    hits: int = 0
+
+    @property
+    def weight(self) -> float:
+        return (self.hits + 1) / (self.uses + 2)
+
+
+def _wrapped(text: str) -> bool:
+    """True when ``text`` is one parenthesized group."""
+    if not (text.startswith('(') and text.endswith(')')):
+        return False
+    depth = 0
+    for i, c in enumerate(text):
+        depth += (c == '(') - (c == ')')
+        if depth == 0:
+            return i == len(text) - 1
+    return False
+
+
+def _split(text: str) -> Tuple[List[str], List[str], bool]:
+    """Top-level parts and operators of a command, and whether it is wrapped in a subshell."""
+    wrapped = _wrapped(text)
+    inner = text[1:-1] if wrapped else text
+    parts, ops = [], []
+    start = pos = depth = 0
+    for m in _SPLIT.finditer(inner):
+        depth += inner.count('(', pos, m.start()) - inner.count(')', pos, m.start())
+        pos = m.start()
+        if depth == 0:
+            parts.append(inner[start:m.start()])
+            ops.append(m.group(1))
+            start = m.end()
+    parts.append(inner[start:])
+    return parts, ops, wrapped
+
+
+def _join(parts: List[str], ops: List[str], wrapped: bool) -> str:
+    text = parts[0] + ''.join(f' {op} {part}' for op, part in zip(ops, parts[1:]))
+    return f'({text})' if wrapped else text
+
+
+class GuidedGenerator:
+    """Produces candidates from a corpus of seeds, falling back to ``gen_command``."""
+
+    MUTATIONS = ('replace', 'splice', 'operator', 'insert', 'drop', 'group', 'redirect', 'crossover')
+
+    def __init__(self, sample_files: List[Path], generated_dir: Path, rng: random.Random):
+        self.sample_files = sample_files
+        self.generated_dir = generated_dir
+        self.rng = rng
+        self.seeds: List[Seed] = []
+        self.fragments: List[str] = []
+        self.stats: Dict[str, _Mutation] = {name: _Mutation() for name in self.MUTATIONS}
+
+    def fresh(self) -> str:
+        return gen_command(self.sample_files, self.generated_dir)
+
+    def _part(self) -> str:
+        return attach_redirection(gen_simple_command(self.sample_files), self.sample_files, self.generated_dir)
+
+    def add_seed(self, text: str, found: int) -> None:
+        self.seeds.append(Seed(text, found))
+        for part in _split(text)[0]:
+            if len(self.fragments) < MAX_FRAGMENTS:
+                self.fragments.append(part)
+            else:
+                self.fragments[self.rng.randrange(MAX_FRAGMENTS)] = part
+
+    def credit(self, mutations: Tuple[str, ...], found: int) -> None:
+        for name in mutations:
+            self.stats[name].uses += 1
+            self.stats[name].hits += found > 0
+
+    def candidate(self) -> Tuple[str, Tuple[str, ...]]:
+        """A command and the mutations that made it (none for a fresh one)."""
+        rng = self.rng
+        if not self.seeds or rng.random() < FRESH_RATE:
+            return self.fresh(), ()
+        seed = rng.choices(self.seeds, [(1 + s.found) / (1 + s.picks) for s in self.seeds])[0]
+        seed.picks += 1
+        parts, ops, wrapped = _split(seed.text)
+        names = rng.choices(self.MUTATIONS, [self.stats[n].weight for n in self.MUTATIONS],
+                            k=rng.randint(1, MAX_MUTATIONS))
+        for name in names:
+            parts, ops, wrapped = getattr(self, '_' + name)(parts, ops, wrapped)
+        return _join(parts, ops, wrapped), tuple(names)
+
+    def _replace(self, parts, ops, wrapped):
+        parts[self.rng.randrange(len(parts))] = self._part()
+        return parts, ops, wrapped
+
+    def _splice(self, parts, ops, wrapped):
+        if self.fragments:
+            parts[self.rng.randrange(len(parts))] = self.rng.choice(self.fragments)
+        return parts, ops, wrapped
+
+    def _operator(self, parts, ops, wrapped):
+        if ops:
+            ops[self.rng.randrange(len(ops))] = self.rng.choice(OPERATORS)
+        return parts, ops, wrapped
+
+    def _insert(self, parts, ops, wrapped):
+        if len(parts) >= MAX_PARTS:
+            return self._drop(parts, ops, wrapped)
+        i = self.rng.randint(0, len(parts))
+        parts.insert(i, self.rng.choice(self.fragments) if self.fragments and self.rng.random() < 0.5
+                     else self._part())
+        ops.insert(max(i - 1, 0), self.rng.choice(OPERATORS))
+        return parts, ops, wrapped
+
+    def _drop(self, parts, ops, wrapped):
+        if len(parts) > 1:
+            i = self.rng.randrange(len(parts))
+            del parts[i]
+            del ops[max(i - 1, 0)]
+        return parts, ops, wrapped
+
+    def _group(self, parts, ops, wrapped):
+        a = self.rng.randrange(len(parts))
+        b = self.rng.randint(a + 1, len(parts))
+        if a == 0 and b == len(parts):
+            return parts, ops, not wrapped
+        group = _join(parts[a:b], ops[a:b - 1], True)
+        return parts[:a] + [group] + parts[b:], ops[:a] + ops[b - 1:], wrapped
+
+    def _redirect(self, parts, ops, wrapped):
+        i = self.rng.randrange(len(parts))
+        op = self.rng.choice(REDIRECTIONS)
+        if op == '<':
+            target = self.rng.choice(self.sample_files)
+        else:
+            target = Path('generated') / f'{"err" if op.startswith("2") else "out"}_{self.rng.randint(0, 99)}.txt'
+        parts[i] = f'{parts[i]} {op} {target}'
+        return parts, ops, wrapped
+
+    def _crossover(self, parts, ops, wrapped):
+        other, other_ops, _ = _split(self.rng.choice(self.seeds).text)
+        a = self.rng.randint(1, len(parts))
+        b = self.rng.randrange(len(other))
+        parts = (parts[:a] + other[b:])[:MAX_PARTS]
+        ops = (ops[:a - 1] + [self.rng.choice(OPERATORS)] + other_ops[b:])[:len(parts) - 1]
+        return parts, ops, wrapped
+
+
+@dataclass
+class FuzzStats:
+    cases: int = 0
+    failed: int = 0
+    coverage: Set[int] = field(default_factory=set)
+    features: Set[int] = field(default_factory=set)
+    signatures: Dict[str, int] = field(default_factory=dict)
+
+    def line(self, seeds: int, elapsed: float) -> str:
+        return (f'{self.cases} cases ({self.cases / elapsed if elapsed else 0:.0f}/s), {self.failed} failed, '
+                f'{len(self.signatures)} signatures, {len(self.coverage)} coverage features, {seeds} seeds')
+
+
+def sample_fixtures(base: Path, sample_files: List[Path]) -> FixtureSet:
+    """Gives every ``generated`` case its own copy of the sample files, at the relative paths it names.
+
+    Cases run in a scratch workspace, not in ``base``; the copy also holds
+    the (empty) directory redirections write into.
+    """
+    entries: Dict[str, Optional[str]] = {f'{path.parent.as_posix()}/': None for path in sample_files}
+    entries.update((path.as_posix(), (base / path).read_text(encoding='utf-8')) for path in sample_files)
+    return FixtureSet({GENERATED_KIND: FixtureTemplate(GENERATED_KIND, entries)}, {GENERATED_KIND: GENERATED_KIND})
+
+
+def _cpu_time() -> float:
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def fuzz(runner: ParallelRunner, generator: GuidedGenerator, count: int, duration: float, log_path: Path,
+         corpus: Optional[Path] = None, guided: bool = True, queue_size: int = 0) -> FuzzStats:
+    """Run candidates until ``count`` cases or ``duration`` seconds (0: no limit), feeding results back."""
+    stats = FuzzStats()
+    origin: Dict[int, Tuple[str, ...]] = {}
+    tried: Set[int] = set()
+    replay = [c.text for c in CaseLoader(corpus)] if corpus is not None and corpus.is_file() else []
+    started = last = time.perf_counter()
+    cpu_started = _cpu_time()
+
+    def candidates() -> Iterator[Command]:
+        for i in itertools.count(1):
+            if (count and i > count) or (duration and time.perf_counter() - started > duration):
+                return
+            if i <= len(replay):
+                text, mutations = replay[i - 1], ()
+            else:
+                for _ in range(MAX_RETRIES):
+                    text, mutations = generator.candidate() if guided else (generator.fresh(), ())
+                    if hash(text) not in tried:
+                        break
+            tried.add(hash(text))
+            origin[i] = mutations
+            yield Command(i, text, GENERATED_KIND)
+
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    outcomes = runner.stream(candidates(), queue_size)
+    with contextlib.ExitStack() as files:
+        log = files.enter_context(log_path.open('w', encoding='utf-8'))
+        seeds = None
+        if corpus is not None:
+            corpus.parent.mkdir(parents=True, exist_ok=True)
+            header = not corpus.is_file()
+            seeds = csv.writer(files.enter_context(corpus.open('a', newline='', encoding='utf-8')), delimiter=';')
+            if header:
+                seeds.writerow(['id', 'kind', 'test'])
+        try:
+            for outcome in outcomes:
+                stats.cases += 1
+                cmd = outcome.cmd
+                signature = mismatch_signature(outcome)
+                if signature is not None:
+                    stats.failed += 1
+                    if signature not in stats.signatures:
+                        stats.signatures[signature] = cmd.id
+                        log.write(DiffGenerator.report(cmd, outcome.bash, outcome.minishell) + '\n')
+                covered = getattr(outcome, 'features', frozenset())
+                stats.coverage |= covered
+                features = signal_features(outcome, signature) | covered
+                found = len(features - stats.features)
+                stats.features |= features
+                generator.credit(origin.pop(cmd.id, ()), found)
+                if found and guided:
+                    generator.add_seed(cmd.text, found)
+                if found and seeds is not None and cmd.id > len(replay):
+                    seeds.writerow([cmd.id, cmd.kind, cmd.text])
+                now = time.perf_counter()
+                if now - last >= PROGRESS_INTERVAL:
+                    last = now
+                    print(stats.line(len(generator.seeds), now - started), file=sys.stderr)
+        except KeyboardInterrupt:
+            print('interrupted', file=sys.stderr)
+        finally:
+            outcomes.close()
+    elapsed = time.perf_counter() - started
+    cpu_hours = (_cpu_time() - cpu_started) / 3600
+    print(stats.line(len(generator.seeds), elapsed))
+    if cpu_hours:
+        print(f'{len(stats.signatures) / cpu_hours:.1f} signatures per CPU-hour '
+              f'({cpu_hours * 3600:.1f} CPU-s, {"guided" if guided else "random"})')
+    return stats
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--count', '-n', type=int, default=1000, help='cases to run (0 = no limit)')
+    p.add_argument('--duration', type=float, default=0, help='stop after this many seconds (0 = no limit)')
+    p.add_argument('--seed', type=int, default=None)
+    p.add_argument('--minishell', default=None, help='Minishell binary; build it with --coverage for gcov feedback')
+    p.add_argument('--corpus', default=None,
+                   help='case CSV of seeds: replayed first, and new seeds are appended to it')
+    p.add_argument('--log', default=TEST_LOG, help='first failure report of each signature (default: logs/test.log)')
+    p.add_argument('--random', action='store_true', help='no feedback: fresh commands only (baseline)')
+    p.add_argument('--queue', type=int, default=0, help='cases pulled ahead of the workers (default: 4 per worker)')
+    p.add_argument('--jobs', '-j', type=int, default=1, help='parallel workers (0 = one per CPU)')
+    p.add_argument('--oracle-cache', action='store_true', help='cache bash results (grows with every case)')
+    p.add_argument('--normalizers', default=NORMALIZERS,
+                   help='output normalizers by kind (default: cases/normalizers.json)')
+    p.add_argument('--timeout', type=int, default=None, help='hard ceiling per shell and case, in seconds')
+    args = p.parse_args()
+
+    timeout = args.timeout if args.timeout is not None else int(TEST_TIMEOUT)
+    if args.seed is not None:
+        random.seed(args.seed)
+    generated_dir = Path(GENERATED_DIR)
+    sample_files = [f.relative_to(generated_dir.parent) for f in make_sample_files(generated_dir)]
+    generator = GuidedGenerator(sample_files, generated_dir, random.Random(args.seed))
+    runner = CoverageRunner(Path(args.minishell) if args.minishell else Path(MINISHELL), jobs=args.jobs,
+                            timeout=timeout,
+                            oracle=OracleCache(Path(ORACLE_CACHE_DIR)) if args.oracle_cache else None,
+                            deadlines=DeadlinePolicy(timeout, TEST_TIMEOUT_FLOOR, TEST_TIMEOUT_MULTIPLIER),
+                            fixtures=sample_fixtures(generated_dir.parent, sample_files),
+                            normalizers=NormalizerSet.load(Path(args.normalizers)))
+    fuzz(runner, generator, args.count, args.duration, Path(args.log),
+         Path(args.corpus) if args.corpus else None, guided=not args.random, queue_size=args.queue)
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""Declarative command grammar and sharded, de-duplicated generation.
+
+The grammar lives in ``cases/grammar.json``: ``kinds`` maps each case kind
+to its start symbol and relative weight, and ``rules`` maps each symbol to
+one of:
+
+- a list of alternatives: templates, or ``[weight, template]`` pairs;
+- ``{"alts": [...], "max_depth": N}``, the same with a nesting limit;
+- ``{"chars": "abc", "min": 1, "max": 8}``, a random string;
+- ``{"int": [lo, hi]}``, a random integer.
+
+Templates are literal text with ``{symbol}`` references and
+``{symbol*lo-hi}`` repetitions (joined by spaces); ``{{`` and ``}}`` are
+literal braces. Past the grammar's ``max_depth`` (or a rule's own, counted
+in nested uses of that rule) the first alternative is taken, so it should
+be the one that does not recurse. Templates are compiled once, when the
+grammar is loaded.
+
+``CaseStream`` draws from one RNG stream per shard, seeded from the seed and
+the shard number, and keeps a command only when its hash falls in the
+shard's slice and is not among the ``MAX_SEEN`` it produced last. Shards
+are picked by the command text alone, so N shards produce N deterministic,
+disjoint corpora whose union has no duplicates (within that window). Every shard
+still expands the candidates of the others before discarding them, so
+sharding buys disjoint corpora rather than generation speed; one process
+already generates far faster than shells can run the cases.
+"""
+
+from __future__ import annotations
+
+import bisect
+import copy
+import hashlib
+import itertools
+import json
+import random
+import re
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from minishell_tester.tests.core import Command
+
+_REFERENCE = re.compile(r'\{\{|\}\}|\{(\w+)(?:\*(\d+)-(\d+))?\}')
+# Consecutive rejected candidates after which a shard's slice is taken as exhausted.
+MAX_STALE = 100_000
+# Case hashes a stream remembers for de-duplication (about 60 MB at most).
+MAX_SEEN = 1 << 20
+
+# A compiled template: literal strings and (symbol, min, max) references; the
+# symbol becomes its rule once the grammar is linked.
+Piece = Union[str, Tuple[Union[str, '_Rule'], int, int]]
+
+
+def _compile(template: str) -> List[Piece]:
+    pieces: List[Piece] = []
+    pos = 0
+    for m in _REFERENCE.finditer(template):
+        pieces.append(template[pos:m.start()])
+        if m.group(1):
+            lo = int(m.group(2)) if m.group(2) else 1
+            hi = int(m.group(3)) if m.group(3) else lo
+            pieces.append((m.group(1), lo, hi))
+        else:
+            pieces.append(m.group(0)[0])
+        pos = m.end()
+    pieces.append(template[pos:])
+    return [p for p in pieces if p != '']
+
+
+class _Rule:
+    def __init__(self, name: str, spec):
+        self.name = name
+        self.max_depth: Optional[int] = None
+        self.chars: Optional[Tuple[str, int, int]] = None
+        self.ints: Optional[Tuple[int, int]] = None
+        self.alts: List[List[Piece]] = []
+        self.weights: List[float] = []
+        if isinstance(spec, dict) and 'chars' in spec:
+            self.chars = (spec['chars'], int(spec.get('min', 1)), int(spec.get('max', 8)))
+            return
+        if isinstance(spec, dict) and 'int' in spec:
+            self.ints = (int(spec['int'][0]), int(spec['int'][1]))
+            return
+        if isinstance(spec, dict):
+            self.max_depth = spec.get('max_depth')
+            spec = spec.get('alts', [])
+        if not isinstance(spec, list) or not spec:
+            raise ValueError(f'grammar rule {name!r} needs at least one alternative')
+        for alt in spec:
+            weight, template = (alt[0], alt[1]) if isinstance(alt, list) else (1, alt)
+            self.alts.append(_compile(template))
+            self.weights.append(float(weight))
+        self.cumulative = list(itertools.accumulate(self.weights))
+        # Equal weights (the common case) pick by index, without a bisection.
+        self.uniform = len(set(self.weights)) == 1
+
+    def references(self) -> Iterator[str]:
+        for alt in self.alts:
+            for piece in alt:
+                if not isinstance(piece, str):
+                    yield piece[0]
+
+    def link(self, rules: Dict[str, '_Rule']) -> None:
+        """Replace symbol names in the compiled templates by their rules."""
+        self.alts = [[p if isinstance(p, str) else (rules[p[0]], p[1], p[2]) for p in alt] for alt in self.alts]
+
+    def pick(self, r: float) -> List[Piece]:
+        """The alternative at ``r`` in [0, 1) of the weight distribution."""
+        if self.uniform:
+            return self.alts[int(r * len(self.alts))]
+        return self.alts[bisect.bisect(self.cumulative, r * self.cumulative[-1])]
+
+
+class Grammar:
+    """Compiled rules and per-kind start symbols of a grammar file."""
+
+    def __init__(self, rules: Dict[str, object], kinds: Dict[str, dict], max_depth: int = 8):
+        self.rules = {name: _Rule(name, spec) for name, spec in rules.items()}
+        self.max_depth = max_depth
+        for rule in self.rules.values():
+            for ref in rule.references():
+                if ref not in self.rules:
+                    raise ValueError(f'grammar rule {rule.name!r} uses unknown symbol {ref!r}')
+        for rule in self.rules.values():
+            rule.link(self.rules)
+        self.kinds: List[str] = []
+        self.starts: List[str] = []
+        self.weights: List[float] = []
+        for kind, spec in kinds.items():
+            if spec['start'] not in self.rules:
+                raise ValueError(f'grammar: kind {kind!r} starts from unknown symbol {spec["start"]!r}')
+            self.kinds.append(kind)
+            self.starts.append(spec['start'])
+            self.weights.append(float(spec.get('weight', 1)))
+        self.cumulative = list(itertools.accumulate(self.weights))
+
+    @classmethod
+    def load(cls, path: Path) -> 'Grammar':
+        data = json.loads(Path(path).read_text(encoding='utf-8'))
+        return cls(data['rules'], data['kinds'], int(data.get('max_depth', 8)))
+
+    def only(self, kinds: Sequence[str]) -> 'Grammar':
+        """A view of this grammar restricted to ``kinds``."""
+        unknown = set(kinds) - set(self.kinds)
+        if unknown:
+            raise ValueError(f'grammar has no kind {sorted(unknown)[0]!r}')
+        picked = [i for i, kind in enumerate(self.kinds) if kind in kinds]
+        view = copy.copy(self)
+        view.kinds = [self.kinds[i] for i in picked]
+        view.starts = [self.starts[i] for i in picked]
+        view.cumulative = list(itertools.accumulate(self.weights[i] for i in picked))
+        view.weights = [self.weights[i] for i in picked]
+        return view
+
+    def expand(self, symbol: str, rng: random.Random) -> str:
+        out: List[str] = []
+        self._expand(self.rules[symbol], rng.random, out, 0, {})
+        return ''.join(out)
+
+    def _expand(self, rule: _Rule, random01, out: List[str], depth: int, nesting: Dict[str, int]) -> None:
+        if rule.chars is not None:
+            chars, lo, hi = rule.chars
+            out.append(''.join(chars[int(random01() * len(chars))]
+                               for _ in range(lo + int(random01() * (hi - lo + 1)))))
+            return
+        if rule.ints is not None:
+            lo, hi = rule.ints
+            out.append(str(lo + int(random01() * (hi - lo + 1))))
+            return
+        nested = nesting.get(rule.name, 0)
+        if len(rule.alts) == 1 or depth >= self.max_depth or (rule.max_depth is not None and nested >= rule.max_depth):
+            alt = rule.alts[0]
+        else:
+            alt = rule.pick(random01())
+        nesting[rule.name] = nested + 1
+        for piece in alt:
+            if type(piece) is str:
+                out.append(piece)
+                continue
+            sub, lo, hi = piece
+            for n in range(lo + int(random01() * (hi - lo + 1)) if hi > lo else lo):
+                if n:
+                    out.append(' ')
+                self._expand(sub, random01, out, depth + 1, nesting)
+        nesting[rule.name] = nested
+
+    def case(self, rng: random.Random) -> Tuple[str, str]:
+        """``(kind, command)`` for a kind drawn by weight."""
+        i = bisect.bisect(self.cumulative, rng.random() * self.cumulative[-1])
+        return self.kinds[i], self.expand(self.starts[i], rng)
+
+
+def shard_rng(seed: Optional[int], shard: int) -> random.Random:
+    """The RNG stream of ``shard``; independent of every other shard's for the same seed."""
+    material = f'{seed if seed is not None else random.SystemRandom().getrandbits(64)}/{shard}'
+    return random.Random(int.from_bytes(hashlib.sha256(material.encode()).digest()[:8], 'big'))
+
+
+def command_hash(text: str) -> int:
+    """Stable 64-bit hash of a command's text (not Python's per-process ``hash``).
+
+    The kind is left out: the same text drawn under two kinds is one case,
+    and must land in one shard.
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8', 'surrogateescape'), digest_size=8).digest(), 'big')
+
+
+class CaseStream:
+    """Yields the unique Commands of one shard.
+
+    ``produced``, ``duplicates`` and ``elapsed`` (seconds spent generating,
+    not waiting for the consumer) describe the run. Only the hashes of the
+    last ``MAX_SEEN`` cases or so are kept, so memory stays flat on an
+    endless stream; past that window a case may come round again. Ids are ``shard + 1``, ``shard + 1 + shards``, ... so shards never share
+    one either. ``count`` of None never stops (short of exhausting the slice).
+    """
+
+    def __init__(self, grammar: Grammar, count: Optional[int], seed: Optional[int] = None,
+                 shard: int = 0, shards: int = 1):
+        if not 0 <= shard < shards:
+            raise ValueError(f'shard {shard} is not in 0..{shards - 1}')
+        self.grammar = grammar
+        self.count = count
+        self.rng = shard_rng(seed, shard)
+        self.shard, self.shards = shard, shards
+        # Hashes of the latest cases, in two generations of up to MAX_SEEN / 2.
+        self.seen: Set[int] = set()
+        self.older: Set[int] = set()
+        self.produced = self.duplicates = self.foreign = 0
+        self.exhausted = False
+        self.elapsed = 0.0
+
+    def __iter__(self) -> Iterator[Command]:
+        stale = 0
+        started = time.perf_counter()
+        while self.count is None or self.produced < self.count:
+            kind, text = self.grammar.case(self.rng)
+            h = command_hash(text)
+            if h % self.shards != self.shard:
+                self.foreign += 1
+                stale += 1
+            elif h in self.seen or h in self.older:
+                self.duplicates += 1
+                stale += 1
+            else:
+                self.seen.add(h)
+                if len(self.seen) >= MAX_SEEN // 2:
+                    self.older, self.seen = self.seen, set()
+                stale = 0
+                self.produced += 1
+                # Only time spent generating counts, not the consumer's between two cases.
+                self.elapsed += time.perf_counter() - started
+                yield Command(self.shard + 1 + (self.produced - 1) * self.shards, text, kind)
+                started = time.perf_counter()
+                continue
+            if stale >= MAX_STALE * self.shards:
+                self.exhausted = True
+                break
+        self.elapsed += time.perf_counter() - started
+
+    def summary(self) -> str:
+        rate = self.produced / self.elapsed if self.elapsed else 0.0
+        line = (f'{self.produced} unique cases in {self.elapsed:.2f}s ({rate:.0f} unique/s), '
+                f'{self.duplicates} duplicates dropped')
+        if self.shards > 1:
+            line += f', shard {self.shard + 1}/{self.shards}'
+        if self.exhausted:
+            line += ' (grammar exhausted)'
+        return line
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Measure the start-up and per-case overhead of the pytest and native front ends.
+
+Both front ends are timed end to end as subprocesses:
+
+* start-up: a run that selects no case at all;
+* per-case: ``--incremental`` runs that replay verdicts already recorded
+  against the current binary, so no shell is started and what is left is
+  collection, set-up and reporting. (start-up is subtracted, then divided
+  by the number of cases.)
+
+A warm-up run through the native runner records the verdicts first.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+MAIN = Path(__file__).resolve().parent.parent / 'main.py'
+NO_CASE = 'cmd00000000'
+
+FRONT_ENDS = {
+    'pytest': [],
+    'native': ['run'],
+}
+
+
+def timed(args, env) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, str(MAIN)] + args, env=env, cwd=str(MAIN.parent.parent),
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def count_cases(keyword, env) -> int:
+    args = ['run', '--collect-only'] + (['-k', keyword] if keyword else [])
+    out = subprocess.run([sys.executable, str(MAIN)] + args, env=env, cwd=str(MAIN.parent.parent),
+                         stdout=subprocess.PIPE, text=True).stdout
+    return int(out.split()[0]) if out.strip() else 0
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('-k', dest='keyword', default=None, help="case selection, e.g. 'cmd1 or cmd2'")
+    p.add_argument('--kind', default=None, help='only cases of this kind (TEST_KIND)')
+    p.add_argument('--repeat', type=int, default=3, help='runs per measurement; the median is reported')
+    p.add_argument('--jobs', '-J', type=int, default=1, help='workers for the warm-up run')
+    args = p.parse_args()
+
+    env = dict(os.environ)
+    if args.kind:
+        env['TEST_KIND'] = args.kind
+    selection = ['-k', args.keyword] if args.keyword else []
+    n = count_cases(args.keyword, env)
+    if not n:
+        print('No cases selected')
+        sys.exit(5)
+
+    print(f'warm-up: recording verdicts for {n} cases')
+    timed(['run', '--jobs', str(args.jobs)] + selection, env)
+
+    print(f"{'front end':<10} {'start-up':>10} {'per case':>12} {'total':>10}")
+    for name, prefix in FRONT_ENDS.items():
+        startup = statistics.median(timed(prefix + ['-k', NO_CASE], env) for _ in range(args.repeat))
+        total = statistics.median(timed(prefix + ['--incremental'] + selection, env) for _ in range(args.repeat))
+        per_case = max(0.0, total - startup) / n
+        print(f'{name:<10} {startup:>9.3f}s {per_case * 1e3:>10.3f}ms {total:>9.3f}s')
+
+
+if __name__ == '__main__':
+    main()
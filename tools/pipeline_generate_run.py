@@ -1,39 +1,140 @@
 #!/usr/bin/env python3
-"""Generate tests using the generator then run them and write a map CSV.
+"""Generate tests and run them as they are generated, keeping only what failed.
 
-This pipeline composes the generator and the run-from-csv pipeline.
+Generated commands flow straight into the runner's workers through a bounded
+window (``--queue`` tasks ahead of the workers), so the generator only runs
+as fast as cases finish and nothing is held for the whole corpus. Failures
+are written to the failure log (the ``logs/test.log`` format) and, with a
+fraction ``--sample-passes`` of the passes, to the map CSV and, with
+``--out``, to a case CSV that ``pipeline_run_csv --csv`` can replay. Memory
+and disk use therefore do not grow with ``--count``; ``--count 0`` runs
+until interrupted. The oracle cache is off unless ``--oracle-cache`` is
+given, since every generated command would add an entry.
 """
 
 from __future__ import annotations
 
 import argparse
-from pathlib import Path
+import contextlib
+import csv
+import itertools
+import random
 import sys
+import time
+from pathlib import Path
+
+from minishell_tester import (FIXTURES, GRAMMAR, MINISHELL, NORMALIZERS, ORACLE_CACHE_DIR, TEST_LOG,
+                              TEST_MAX_OUTPUT, TEST_OUTPUT_WINDOW, TEST_TIMEOUT, TEST_TIMEOUT_FLOOR,
+                              TEST_TIMEOUT_MULTIPLIER)
+from minishell_tester.tests.core import CaptureLimits, DeadlinePolicy, DiffGenerator
+from minishell_tester.tests.fixtures import FixtureSet
+from minishell_tester.tests.normalize import NormalizerSet
+from minishell_tester.tests.oracle_cache import OracleCache
+from minishell_tester.tests.runner import RESOURCE_COLUMNS, ParallelRunner, resource_fields
+from minishell_tester.tests.sharding import parse_shard
+from minishell_tester.tools.test_generator import iter_commands
+
+# Seconds between progress lines on stderr.
+PROGRESS_INTERVAL = 5.0
 
-from minishell_tester import TEST_CSV
-from minishell_tester.tools.test_generator import generate_csv
-from minishell_tester.tools.pipeline_run_csv import run_tests
+
+def run_generated(runner: ParallelRunner, commands, out_map: Path, log_path: Path, out_csv: Path = None,
+                  sample_passes: float = 0.0, queue_size: int = 0, seed: int = None) -> int:
+    """Stream ``commands`` through ``runner``; persist failures and sampled passes."""
+    sampler = random.Random(seed)
+    resource_columns = [f'{name}_{col}' for name in ('bash', 'minishell') for col in RESOURCE_COLUMNS]
+    for path in (out_map, log_path, out_csv):
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+    total = failed = kept = 0
+    started = last = time.perf_counter()
+    outcomes = runner.stream(commands, queue_size)
+    with contextlib.ExitStack() as files:
+        writer = csv.writer(files.enter_context(out_map.open('w', newline='', encoding='utf-8')))
+        writer.writerow(['id', 'command', 'bash_exit', 'minishell_exit', 'match'] + resource_columns)
+        log = files.enter_context(log_path.open('w', encoding='utf-8'))
+        cases = None
+        if out_csv is not None:
+            cases = csv.writer(files.enter_context(out_csv.open('w', newline='', encoding='utf-8')), delimiter=';')
+            cases.writerow(['id', 'kind', 'test'])
+        try:
+            for outcome in outcomes:
+                total += 1
+                now = time.perf_counter()
+                if now - last >= PROGRESS_INTERVAL:
+                    last = now
+                    print(f'{total} cases, {failed} failed, {total / (now - started):.0f}/s', file=sys.stderr)
+                if not outcome.passed:
+                    failed += 1
+                    log.write(DiffGenerator.report(outcome.cmd, outcome.bash, outcome.minishell) + '\n')
+                elif not (sample_passes and sampler.random() < sample_passes):
+                    continue
+                kept += 1
+                tc = outcome.cmd
+                fields = resource_fields(outcome.bash, outcome.minishell)
+                writer.writerow([tc.id, tc.text, outcome.bash.exit_code, outcome.minishell.exit_code,
+                                 int(outcome.passed)] + [fields[c] for c in resource_columns])
+                if cases is not None:
+                    cases.writerow([tc.id, tc.kind, tc.text])
+        except KeyboardInterrupt:
+            print('interrupted', file=sys.stderr)
+        finally:
+            outcomes.close()
+    elapsed = time.perf_counter() - started
+    print(f'{total} cases in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f}/s), '
+          f'{failed} failed, {kept} kept in {out_map}')
+    return 0
 
 
 def main():
     p = argparse.ArgumentParser()
-    p.add_argument('--count', '-n', type=int, default=200)
-    p.add_argument('--out', default=None, help='CSV output path (overrides package TEST_CSV)')
-    p.add_argument('--map', default='minishell_tester/minishell_test_map.csv')
+    p.add_argument('--count', '-n', type=int, default=200, help='cases to generate (0 = until interrupted)')
     p.add_argument('--seed', type=int, default=None)
-    p.add_argument('--max', type=int, default=0)
+    p.add_argument('--max', type=int, default=0, help='stop after this many cases (0 = --count)')
+    p.add_argument('--shard', type=parse_shard, default=(0, 1), metavar='I/N',
+                   help='generate shard I of N (1-based); shards of one seed are disjoint')
+    p.add_argument('--kind', action='append', default=[], help='only this case kind (repeatable)')
+    p.add_argument('--grammar', default=GRAMMAR, help='grammar file (default: cases/grammar.json)')
+    p.add_argument('--minishell', default=None)
+    p.add_argument('--map', default='minishell_tester/minishell_test_map.csv',
+                   help='map CSV of the failures and sampled passes')
+    p.add_argument('--out', default=None, help='also write the kept cases to this case CSV')
+    p.add_argument('--log', default=TEST_LOG, help='failure reports (default: logs/test.log)')
+    p.add_argument('--sample-passes', type=float, default=0.0, metavar='FRACTION',
+                   help='fraction of passing cases kept alongside the failures')
+    p.add_argument('--queue', type=int, default=0, help='tasks pulled ahead of the workers (default: 4 per worker)')
+    p.add_argument('--jobs', '-j', type=int, default=1, help='parallel workers (0 = one per CPU)')
+    p.add_argument('--session-batch', type=int, default=0, help='feed up to N independent cases to one shell process')
+    p.add_argument('--concurrent', action='store_true', help='run bash and minishell for a case at the same time')
+    p.add_argument('--oracle-cache', action='store_true', help='cache bash results (grows with every case)')
+    p.add_argument('--fixtures', default=FIXTURES, help='fixture templates by kind (default: cases/fixtures.json)')
+    p.add_argument('--normalizers', default=NORMALIZERS,
+                   help='output normalizers by kind (default: cases/normalizers.json)')
+    p.add_argument('--timeout', type=int, default=None, help='hard ceiling per shell and case, in seconds')
+    p.add_argument('--timeout-floor', type=float, default=TEST_TIMEOUT_FLOOR,
+                   help='minimum minishell deadline, in seconds')
+    p.add_argument('--timeout-multiplier', type=float, default=TEST_TIMEOUT_MULTIPLIER,
+                   help='minishell deadline as a multiple of the bash time')
+    p.add_argument('--output-window', type=int, default=TEST_OUTPUT_WINDOW,
+                   help='bytes kept from the start and the end of each output stream')
+    p.add_argument('--max-output', type=int, default=TEST_MAX_OUTPUT,
+                   help='stop a shell once one of its output streams exceeds this many bytes')
     args = p.parse_args()
 
-    scripts_dir = Path(__file__).resolve().parent
-    out_csv = Path(args.out) if args.out else Path(TEST_CSV)
-    # ensure parent exists
-    out_csv.parent.mkdir(parents=True, exist_ok=True)
-
-    # generate CSV
-    generate_csv(out_csv, args.count, args.seed)
-
-    # run tests and write map
-    rc = run_tests(out_csv, None, Path(args.map), max_count=args.max)
+    timeout = args.timeout if args.timeout is not None else int(TEST_TIMEOUT)
+    runner = ParallelRunner(Path(args.minishell) if args.minishell else Path(MINISHELL), jobs=args.jobs,
+                            timeout=timeout, concurrent=args.concurrent, session_batch=args.session_batch,
+                            oracle=OracleCache(Path(ORACLE_CACHE_DIR)) if args.oracle_cache else None,
+                            deadlines=DeadlinePolicy(timeout, args.timeout_floor, args.timeout_multiplier),
+                            limits=CaptureLimits(args.output_window, args.max_output),
+                            fixtures=FixtureSet.load(Path(args.fixtures)),
+                            normalizers=NormalizerSet.load(Path(args.normalizers)))
+    shard, shards = args.shard
+    stream = iter_commands(args.count or None, args.seed, shard, shards, Path(args.grammar), args.kind)
+    commands = itertools.islice(stream, args.max) if args.max else stream
+    rc = run_generated(runner, commands, Path(args.map), Path(args.log), Path(args.out) if args.out else None,
+                       args.sample_passes, args.queue, args.seed)
+    print(stream.summary(), file=sys.stderr)
     sys.exit(rc)
 
 
@@ -1,47 +1,115 @@
 #!/usr/bin/env python3
 """Read a CSV of tests and run them under Bash and Minishell, writing a map CSV.
 
-Output CSV columns: id,command,bash_exit,minishell_exit,match
+Output CSV columns: id,command,bash_exit,minishell_exit,match, then wall time,
+user and system CPU, peak RSS (KiB) and child count for each shell
+(bash_wall,...,minishell_children; empty for replayed verdicts and for figures
+that were not measured: peak RSS and child counts need ``--measure-resources``). With ``--shard`` a last column, plan, holds the
+shard plan's fingerprint.
 """
 
 from __future__ import annotations
 
 import argparse
 import csv
-import tempfile
 from pathlib import Path
 import sys
-
-from minishell_tester import TEST_CSV, GENERATED_DIR, TEST_TIMEOUT, MINISHELL
-from minishell_tester.core import TestCaseLoader, Bash, Minishell
-
-
-def run_tests(csv_path: Path, minishell_path: Path, out_map: Path, timeout: int = 5, max_count: int = 0):
-    tests = TestCaseLoader(csv_path).load()
+from typing import Dict, Tuple
+
+from minishell_tester import (FIXTURES, NORMALIZERS, TEST_CSV, TEST_TIMEOUT, TEST_TIMEOUT_FLOOR, TEST_TIMEOUT_MULTIPLIER, MINISHELL,
+                              ORACLE_CACHE_DIR, OUTCOME_STORE, RESULTS_DB, TEST_OUTPUT_WINDOW, TEST_MAX_OUTPUT)
+from minishell_tester.tests.core import Bash, CaptureLimits, CaseLoader, DeadlinePolicy, DiffGenerator
+from minishell_tester.tests.fixtures import FixtureSet
+from minishell_tester.tests.normalize import NormalizerSet
+from minishell_tester.tests.oracle_cache import OracleCache
+from minishell_tester.tests.outcome_store import OutcomeStore, binary_fingerprint
+from minishell_tester.tests.results_db import ResultsDB
+from minishell_tester.tests.runner import RESOURCE_COLUMNS, ParallelRunner, overhead_summary, resource_fields
+from minishell_tester.tests.schedule import load_durations
+from minishell_tester.tests.sharding import durations_file, parse_shard, select_shard
+
+
+def run_tests(csv_path: Path, minishell_path: Path, out_map: Path, timeout: int = 5, max_count: int = 0,
+              jobs: int = 1, oracle: OracleCache = None, concurrent: bool = False, session_batch: int = 0,
+              store: OutcomeStore = None, incremental: bool = False, last_failures: bool = False,
+              failures_first: bool = False, deadlines: DeadlinePolicy = None, limits: CaptureLimits = None,
+              results: ResultsDB = None, overhead_top: int = 0, fixtures: FixtureSet = None,
+              normalizers: NormalizerSet = None, shard: Tuple[int, int] = None, shard_durations: Path = None,
+              durations: Dict[str, float] = None, measure: bool = False):
+    tests = CaseLoader(csv_path).load()
     if not tests:
         print('No tests found in', csv_path)
         return 2
-
-    # prepare shells
-    bash = Bash(timeout=timeout)
-    mini = Minishell(minishell_path, timeout=timeout)
-
-    with tempfile.TemporaryDirectory() as td:
-        mini.prepare_binary(Path(td))
-
-        out_map.parent.mkdir(parents=True, exist_ok=True)
-        with out_map.open('w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['id', 'command', 'bash_exit', 'minishell_exit', 'match'])
-            for i, tc in enumerate(tests, start=1):
-                if max_count and i > max_count:
-                    break
-                work_dir = Path(GENERATED_DIR) if GENERATED_DIR else None
-                bash_res = bash.execute(tc, work_dir)
-                mini_res = mini.execute(tc, work_dir)
-                match = int(bash_res.exit_code == mini_res.exit_code and bash_res.stdout == mini_res.stdout)
-                writer.writerow([tc.id, tc.text, bash_res.exit_code, mini_res.exit_code, match])
-
+    if max_count:
+        tests = tests[:max_count]
+    plan = None
+    if shard is not None:
+        tests, plan = select_shard(tests, *shard, shard_durations)
+        print(plan.describe(shard[0]))
+
+    fixtures = fixtures or FixtureSet()
+    normalizers = normalizers or NormalizerSet()
+    replayed = {}
+    if store is not None:
+        if last_failures:
+            tests = store.only_failures(tests)
+        elif failures_first:
+            tests = store.failures_first(tests)
+        binary_hash = binary_fingerprint(minishell_path)
+        keys = {tc: OutcomeStore.key(binary_hash, tc, fixtures.fingerprint(tc), normalizers.fingerprint(tc))
+                for tc in tests}
+        if incremental:
+            replayed = {tc: store.get(keys[tc]) for tc in tests if store.get(keys[tc]) is not None}
+
+    if results is not None:
+        results.begin_run('pipeline', binary_fingerprint(minishell_path), Bash().version, sys.argv[1:])
+    runner = ParallelRunner(minishell_path, jobs=jobs, timeout=timeout, oracle=oracle, concurrent=concurrent,
+                            session_batch=session_batch, deadlines=deadlines, limits=limits, fixtures=fixtures,
+                            normalizers=normalizers, durations=durations, measure=measure or overhead_top > 0)
+    outcomes = {o.cmd: o for o in runner.run([tc for tc in tests if tc not in replayed])}
+    if runner.schedule is not None:
+        print(runner.schedule.line())
+    if oracle is not None:
+        print(oracle.summary())
+
+    out_map.parent.mkdir(parents=True, exist_ok=True)
+    with out_map.open('w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        resource_columns = [f'{name}_{col}' for name in ('bash', 'minishell') for col in RESOURCE_COLUMNS]
+        # Sharded maps carry the plan fingerprint, for merge_shards.py to compare.
+        plan_column = [] if plan is None else [plan.fingerprint()]
+        writer.writerow(['id', 'command', 'bash_exit', 'minishell_exit', 'match'] + resource_columns
+                        + ['plan'] * len(plan_column))
+        resources = []
+        for tc in tests:
+            if tc in replayed:
+                rec = replayed[tc]
+                writer.writerow([tc.id, tc.text, rec['bash_exit'], rec['minishell_exit'], int(rec['passed'])]
+                                + [''] * len(resource_columns) + plan_column)
+                if results is not None:
+                    results.record(tc, rec['passed'], bash_exit=rec['bash_exit'], minishell_exit=rec['minishell_exit'])
+                continue
+            outcome = outcomes[tc]
+            fields = resource_fields(outcome.bash, outcome.minishell)
+            resources.append((tc, fields))
+            writer.writerow([tc.id, tc.text, outcome.bash.exit_code, outcome.minishell.exit_code,
+                             int(outcome.passed)] + [fields[c] for c in resource_columns] + plan_column)
+            if store is not None:
+                report = '' if outcome.passed else DiffGenerator.report(tc, outcome.bash, outcome.minishell)
+                store.record(keys[tc], tc, outcome.passed, report,
+                             outcome.bash.exit_code, outcome.minishell.exit_code, binary_hash)
+            if results is not None:
+                results.record(tc, outcome.passed, outcome.bash, outcome.minishell)
+
+    if overhead_top > 0 and resources:
+        print(f'top {overhead_top} minishell overhead vs bash:')
+        for line in overhead_summary(resources, overhead_top):
+            print(line)
+    if store is not None:
+        store.save()
+        store.close()
+    if results is not None:
+        results.close()
     return 0
 
 
@@ -49,9 +117,41 @@ def main():
     p = argparse.ArgumentParser()
     p.add_argument('--csv', default=None)
     p.add_argument('--minishell', default=None)
+    p.add_argument('--fixtures', default=FIXTURES, help='fixture templates by kind (default: cases/fixtures.json)')
+    p.add_argument('--normalizers', default=NORMALIZERS,
+                   help='output normalizers by kind (default: cases/normalizers.json)')
     p.add_argument('--out', default='minishell_tester/minishell_test_map.csv')
-    p.add_argument('--timeout', type=int, default=None)
+    p.add_argument('--timeout', type=int, default=None, help='hard ceiling per shell and case, in seconds')
+    p.add_argument('--timeout-floor', type=float, default=TEST_TIMEOUT_FLOOR,
+                   help='minimum minishell deadline, in seconds')
+    p.add_argument('--timeout-multiplier', type=float, default=TEST_TIMEOUT_MULTIPLIER,
+                   help='minishell deadline as a multiple of the bash time')
+    p.add_argument('--output-window', type=int, default=TEST_OUTPUT_WINDOW,
+                   help='bytes kept from the start and the end of each output stream')
+    p.add_argument('--max-output', type=int, default=TEST_MAX_OUTPUT,
+                   help='stop a shell once one of its output streams exceeds this many bytes')
     p.add_argument('--max', type=int, default=0)
+    p.add_argument('--jobs', '-j', type=int, default=1, help='parallel workers (0 = one per CPU)')
+    p.add_argument('--refresh-oracle', action='store_true', help='re-run bash and overwrite cached results')
+    p.add_argument('--no-oracle-cache', action='store_true', help='always run bash, bypassing the cache')
+    p.add_argument('--concurrent', action='store_true', help='run bash and minishell for a case at the same time')
+    p.add_argument('--session-batch', type=int, default=0, help='feed up to N independent cases to one shell process')
+    p.add_argument('--incremental', action='store_true', help='replay verdicts recorded against this exact binary')
+    p.add_argument('--last-failures', action='store_true', help='only run cases that failed on their last run')
+    p.add_argument('--failures-first', action='store_true', help='run cases that failed on their last run first')
+    p.add_argument('--no-results-db', action='store_true', help='do not record this run in the results database')
+    p.add_argument('--overhead-top', type=int, default=0, metavar='N',
+                   help='list the N cases where minishell spends the most CPU beyond bash (implies --measure-resources)')
+    p.add_argument('--measure-resources', action='store_true',
+                   help='also record peak RSS and child counts of both shells (slower: every shell runs through '
+                        'a tracing launcher)')
+    p.add_argument('--no-longest-first', action='store_true',
+                   help='run cases in file order instead of by recorded duration, longest first')
+    p.add_argument('--shard', type=parse_shard, default=None, metavar='I/N',
+                   help='only run shard I of N (1-based) of the cases')
+    p.add_argument('--shard-durations', type=durations_file, default=None, metavar='DB',
+                   help='balance shards on the case durations recorded in this results database '
+                        '(give every machine the same file; default: split by stable hash)')
     args = p.parse_args()
 
     csv_path = Path(args.csv) if args.csv else Path(TEST_CSV)
@@ -59,7 +159,20 @@ def main():
     out_map = Path(args.out)
     timeout = args.timeout if args.timeout is not None else int(TEST_TIMEOUT)
 
-    code = run_tests(csv_path, minishell_path, out_map, timeout=timeout, max_count=args.max)
+    oracle = None if args.no_oracle_cache else OracleCache(Path(ORACLE_CACHE_DIR), refresh=args.refresh_oracle)
+
+    code = run_tests(csv_path, minishell_path, out_map, timeout=timeout, max_count=args.max, jobs=args.jobs,
+                     oracle=oracle, concurrent=args.concurrent, session_batch=args.session_batch,
+                     store=OutcomeStore(Path(OUTCOME_STORE)), incremental=args.incremental,
+                     last_failures=args.last_failures, failures_first=args.failures_first,
+                     deadlines=DeadlinePolicy(timeout, args.timeout_floor, args.timeout_multiplier),
+                     limits=CaptureLimits(args.output_window, args.max_output),
+                     results=None if args.no_results_db else ResultsDB(Path(RESULTS_DB)),
+                     overhead_top=args.overhead_top, fixtures=FixtureSet.load(Path(args.fixtures)),
+                     normalizers=NormalizerSet.load(Path(args.normalizers)), shard=args.shard,
+                     shard_durations=args.shard_durations,
+                     durations=None if args.no_longest_first else load_durations(Path(RESULTS_DB)),
+                     measure=args.measure_resources)
     sys.exit(code)
 
 
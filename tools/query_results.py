@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Query the results database written by every test run.
+
+    query_results.py runs                    # recent runs
+    query_results.py regressions 12          # passed in run 12, failing in the latest run
+    query_results.py regressions 12 --to 15
+    query_results.py slowest -n 50           # slowest cases of the latest run
+    query_results.py overhead -n 20          # most minishell CPU beyond bash, latest run
+    query_results.py pass-rate --kind 'PIPES'  # pass rate per kind, run by run
+"""
+
+from __future__ import annotations
+
+import argparse
+from datetime import datetime
+from pathlib import Path
+import sys
+
+from minishell_tester import RESULTS_DB
+from minishell_tester.tests.results_db import ResultsDB
+
+
+def _when(ts) -> str:
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') if ts else '-'
+
+
+def _short(text: str, width: int = 60) -> str:
+    text = text.replace('\n', '\\n')
+    return text if len(text) <= width else text[:width - 3] + '...'
+
+
+def _measured(value) -> str:
+    """A peak RSS or child count, or '-' where it was not measured (NULL)."""
+    return '-' if value is None else str(value)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--db', default=RESULTS_DB)
+    sub = p.add_subparsers(dest='query', required=True)
+    runs = sub.add_parser('runs', help='list recent runs')
+    runs.add_argument('-n', type=int, default=20)
+    reg = sub.add_parser('regressions', help='cases that passed in a run and fail in a later one')
+    reg.add_argument('since', type=int, help='run id the cases passed in')
+    reg.add_argument('--to', type=int, default=None, help='run id to compare with (default: latest)')
+    slow = sub.add_parser('slowest', help='slowest cases by minishell wall time')
+    slow.add_argument('-n', type=int, default=50)
+    slow.add_argument('--run', type=int, default=None, help='run id (default: latest)')
+    over = sub.add_parser('overhead', help='cases by minishell CPU time beyond bash')
+    over.add_argument('-n', type=int, default=20)
+    over.add_argument('--run', type=int, default=None, help='run id (default: latest)')
+    rate = sub.add_parser('pass-rate', help='pass rate by kind over the last runs')
+    rate.add_argument('--kind', default=None)
+    rate.add_argument('-n', type=int, default=20, help='number of runs')
+    args = p.parse_args()
+
+    if not Path(args.db).exists():
+        print(f'No results database at {args.db}')
+        sys.exit(2)
+    db = ResultsDB(Path(args.db))
+
+    if args.query == 'runs':
+        print(f"{'run':>5}  {'started':<19}  {'front end':<9}  {'binary':<12}  {'passed':>13}")
+        for r in db.runs(args.n):
+            total = r['total'] if r['total'] is not None else '?'
+            passed = r['passed'] if r['passed'] is not None else '?'
+            print(f"{r['id']:>5}  {_when(r['started']):<19}  {r['front_end']:<9}  "
+                  f"{r['binary_hash'][:12]:<12}  {f'{passed}/{total}':>13}")
+    elif args.query == 'regressions':
+        rows = db.regressions(args.since, args.to)
+        for r in rows:
+            print(f"cmd{r['case_id']:<6} [{r['kind']}] exit {r['bash_exit']}/{r['minishell_exit']}  "
+                  f"{_short(r['command'])}")
+        print(f'{len(rows)} regressions')
+    elif args.query == 'slowest':
+        for r in db.slowest(args.n, args.run):
+            bash = f"{r['bash_duration']:.3f}s" if r['bash_duration'] is not None else '-'
+            print(f"{r['minishell_duration']:>8.3f}s (bash {bash:>7})  cmd{r['case_id']:<6} "
+                  f"{'PASS' if r['passed'] else 'FAIL'}  {_short(r['command'])}")
+    elif args.query == 'overhead':
+        for r in db.overhead(args.n, args.run):
+            print(f"{r['extra_cpu'] * 1000:+8.1f}ms cpu  wall {r['minishell_duration']:.3f}s/{r['bash_duration']:.3f}s  "
+                  f"rss {_measured(r['minishell_max_rss'])}/{_measured(r['bash_max_rss'])} KiB  "
+                  f"children {_measured(r['minishell_children'])}/{_measured(r['bash_children'])}  cmd{r['case_id']:<6} "
+                  f"{'PASS' if r['passed'] else 'FAIL'}  {_short(r['command'])}")
+    else:
+        for r in db.pass_rate_by_kind(args.kind, args.n):
+            print(f"run {r['run_id']:>4}  {_when(r['started'])}  {r['rate']:>5}%  "
+                  f"{r['passed']:>4}/{r['total']:<4}  {r['kind']}")
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,15 @@
 #!/usr/bin/env python3
-"""Grammar-based test generator (moved under tools).
+"""Grammar-based test generator.
 
-This is the same generator as before, now placed in `tools` to separate
-test-generation helpers from test execution code.
+Cases are expanded from the declarative grammar in ``cases/grammar.json``
+(see ``tools/grammar.py``), one kind at a time, with the real case kinds of
+``minishell_tests.csv``. Each shard draws from its own RNG stream, so
+``--shard 1/4`` ... ``--shard 4/4`` run as four processes give four
+deterministic, disjoint case files; within a shard, commands are
+de-duplicated by hash. The unique cases per second are reported on stderr.
+
+The pipeline-part helpers below (``gen_command`` and friends) predate the
+grammar; ``coverage_fuzz`` still builds its mutations from them.
 """
 
 from __future__ import annotations
@@ -11,8 +18,13 @@ import argparse
 import csv
 import random
 import string
+import sys
 from pathlib import Path
-from typing import List
+from typing import Optional, Sequence
+
+from minishell_tester import GRAMMAR
+from minishell_tester.tests.sharding import parse_shard
+from minishell_tester.tools.grammar import CaseStream, Grammar
 
 
 SIMPLE_COMMANDS = [
@@ -102,23 +114,29 @@ def gen_command(sample_files, generated_dir: Path, max_parts=4):
     return cmd
 
 
-def generate_csv(out_path: Path, count: int, seed: int = None):
-    if seed is not None:
-        random.seed(seed)
-    # Keep generated files next to the output CSV for portability
-    generated_dir = out_path.parent / 'generated'
-    sample_files = make_sample_files(generated_dir)
-    # store sample file paths relative to the CSV parent so commands are portable
-    sample_files = [p.relative_to(out_path.parent) for p in sample_files]
+def iter_commands(count: Optional[int], seed: int = None, shard: int = 0, shards: int = 1,
+                  grammar: Path = None, kinds: Sequence[str] = ()) -> CaseStream:
+    """Unique grammar cases of one shard, as Commands with their kind; nothing is kept but their hashes.
+
+    A ``count`` of None never stops. The returned stream reports its
+    throughput through ``summary()``.
+    """
+    g = Grammar.load(Path(grammar or GRAMMAR))
+    if kinds:
+        g = g.only(kinds)
+    return CaseStream(g, count, seed, shard, shards)
+
 
+def generate_csv(out_path: Path, count: int, seed: int = None, shard: int = 0, shards: int = 1,
+                 grammar: Path = None, kinds: Sequence[str] = ()) -> CaseStream:
     out_path.parent.mkdir(parents=True, exist_ok=True)
+    stream = iter_commands(count, seed, shard, shards, grammar, kinds)
     with out_path.open('w', newline='', encoding='utf-8') as f:
         writer = csv.writer(f, delimiter=';')
         writer.writerow(['id', 'kind', 'test'])
-        for i in range(count):
-            cmd = gen_command(sample_files, generated_dir)
-            writer.writerow([i + 1, 'generated', cmd])
-    return out_path
+        for cmd in stream:
+            writer.writerow([cmd.id, cmd.kind, cmd.text])
+    return stream
 
 
 def main():
@@ -126,18 +144,23 @@ def main():
     p.add_argument('--count', '-n', type=int, default=10)
     p.add_argument('--out', '-o', default=None, help='Write CSV to this path (relative to scripts dir)')
     p.add_argument('--seed', type=int, default=None)
+    p.add_argument('--shard', type=parse_shard, default=(0, 1), metavar='I/N',
+                   help='generate shard I of N (1-based); shards of one seed are disjoint')
+    p.add_argument('--kind', action='append', default=[], help='only this case kind (repeatable)')
+    p.add_argument('--grammar', default=GRAMMAR, help='grammar file (default: cases/grammar.json)')
     args = p.parse_args()
 
+    shard, shards = args.shard
     scripts_dir = Path(__file__).resolve().parent
     if args.out:
         out = (scripts_dir / args.out).resolve()
-        path = generate_csv(out, args.count, args.seed)
-        print(f'Wrote {args.count} cases to {path}')
+        stream = generate_csv(out, args.count, args.seed, shard, shards, Path(args.grammar), args.kind)
+        print(f'Wrote {stream.produced} cases to {out}')
     else:
-        generated_dir = scripts_dir.joinpath('..', 'generated').resolve()
-        sample_files = make_sample_files(generated_dir)
-        for i in range(args.count):
-            print(gen_command(sample_files, generated_dir))
+        stream = iter_commands(args.count, args.seed, shard, shards, Path(args.grammar), args.kind)
+        for cmd in stream:
+            print(f'{cmd.kind}: {cmd.text!r}')
+    print(stream.summary(), file=sys.stderr)
 
 
 if __name__ == '__main__':